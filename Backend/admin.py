@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 
@@ -6,48 +6,46 @@ from models import (
     db,
     Persona,
     Asistente,
-    Rol,
     AsistenteMedico,
     Evento,
-    Registro,
     BuzonComentario,
-    Asistencia,
     InvitadoULM,
 )
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
-from io import BytesIO
-from flask import send_file, current_app
-import qrcode
-from PIL import Image, ImageDraw, ImageFont
-import csv             
-import io                     
+from flask import send_file
+import json
 import os    
 
-def _parse_qr_code_to_id_asistente(code: str):
-    """
-    Recibe el texto leído del QR o lo que se tecleó.
-    Soporta:
-    - 'AGFI-123'
-    - 'agfi-123'
-    - '123' (solo número)
-    Devuelve id_asistente (int) o None si no se puede parsear.
-    """
-    if not code:
-        return None
-    s = str(code).strip()
-    if not s:
-        return None
-
-    # Si viene con prefijo AGFI-
-    if s.upper().startswith("AGFI-"):
-        s = s.split("-", 1)[1].strip()
-
-    try:
-        return int(s)
-    except ValueError:
-        return None
-
+from checkin import (
+    MAX_SCANS_LOTE,
+    contadores_upsert,
+    parse_qr_code_to_id_asistente as _parse_qr_code_to_id_asistente,
+    registrar_checkins,
+    registrar_checkins_lote,
+    publicar_checkins,
+)
+import bitacora
+import consulta_logs
+import credenciales
+import credenciales_pdf
+import estadisticas
+import exportacion
+from invitaciones import invitar_asistentes, invitar_y_contar, resolver_roles
+from importacion import (
+    guardar_para_job,
+    importar_pase_lista,
+    importar_pase_lista_archivo,
+    inspeccionar_csv,
+    parse_bool,
+    pedido_dry_run,
+    validar_pase_lista,
+)
+import jobs
+import pase_lista
+import retencion_logs
+import roles_cache
+import roster_cache
 
 # =====================================
 # 1) Verificar token y rol (admin/staff)
@@ -139,7 +137,7 @@ def crear_asistente_formal():
     db.session.flush()  # para tener persona.id_persona
 
     # Rol en BD (ingeniero/becario/estudiante)
-    rol_obj = Rol.query.filter_by(nombre_rol=rol_front).first()
+    rol_obj = roles_cache.por_nombre(rol_front)
     if not rol_obj:
         db.session.rollback()
         return jsonify({"ok": False, "message": "Rol de asistente no encontrado en la base."}), 500
@@ -220,22 +218,24 @@ def listar_asistentes_formales():
             "message": "Solo admin o staff pueden ver la lista de asistentes."
         }), 403
 
+    # El nombre del rol sale de roles_cache (sin JOIN a roles)
     asistentes = (
-        db.session.query(Asistente, Persona, Rol)
+        db.session.query(Asistente, Persona)
         .join(Persona, Asistente.id_asistente == Persona.id_persona)
-        .join(Rol, Asistente.id_rol == Rol.id_rol)
+        .filter(Asistente.id_rol.isnot(None))
         .order_by(Persona.nombre_completo.asc())
         .all()
     )
 
     data = []
-    for asistente, persona, rol in asistentes:
+    for asistente, persona in asistentes:
+        rol = roles_cache.por_id(asistente.id_rol)
         data.append({
             "id_asistente": asistente.id_asistente,
             "nombre": persona.nombre_completo,
             "correo": persona.correo,
             "empresa": persona.empresa,
-            "rol": rol.nombre_rol  # ingeniero / becario / estudiante
+            "rol": rol.nombre_rol if rol else None  # ingeniero / becario / estudiante
         })
 
     return jsonify({
@@ -248,73 +248,29 @@ def listar_asistentes_formales():
 # =====================================
 @admin_bp.route("/credencial/<int:id_asistente>.png", methods=["GET"])
 def credencial_asistente(id_asistente):
+    # ?format=png (default) | png8 | webp | jpeg
+    try:
+        formato = credenciales.parse_formato(request.args)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+
     # Buscar asistente + persona
     asistente = Asistente.query.filter_by(id_asistente=id_asistente).first()
     if not asistente or not asistente.persona:
         return jsonify({"ok": False, "message": "Asistente no encontrado."}), 404
 
-    persona = asistente.persona
-
-    # Texto del QR: AGFI-<id_asistente>
-    qr_text = f"AGFI-{id_asistente}"
-
-    # Generar imagen de QR
-    qr_img = qrcode.make(qr_text).resize((300, 300))
-
-    # Crear credencial base
-    # Tamaño aproximado tipo gafete
-    width, height = 600, 900
-    card = Image.new("RGB", (width, height), "white")
-    draw = ImageDraw.Draw(card)
-
-    # Intentar cargar logo
-    logo = None
-    try:
-        logo_path = os.path.join(current_app.root_path, "logo_AGFI.png")      
-        logo = Image.open(logo_path).convert("RGBA")
-        logo.thumbnail((180, 180))
-        card.paste(logo, (40, 40), logo)
-    except Exception as e:
-        # Si no hay logo, no truena, solo sigue sin él
-        print(f"[WARN] No se pudo cargar logo_AGFI.png: {e}")
-
-    # Tipografías (usamos la default del sistema)
-    font_big = ImageFont.load_default()
-    font_small = ImageFont.load_default()
-
-    # Nombre
-    nombre_text = persona.nombre_completo or ""
-    draw.text((40, 250), f"Nombre:", font=font_small, fill="black")
-    draw.text((40, 280), nombre_text, font=font_big, fill="black")
-
-    # Generación
-    gen_text = asistente.generacion or ""
-    draw.text((40, 330), f"Generación:", font=font_small, fill="black")
-    draw.text((40, 360), gen_text, font=font_big, fill="black")
-
-    # Carrera
-    carrera_text = persona.carrera or ""
-    draw.text((40, 410), f"Carrera:", font=font_small, fill="black")
-    draw.text((40, 440), carrera_text, font=font_big, fill="black")
-
-    # Colocar QR en la parte baja
-    qr_x = (width - qr_img.width) // 2
-    qr_y = height - qr_img.height - 80
-    card.paste(qr_img, (qr_x, qr_y))
-
-    # Texto pequeño debajo del QR con el código
-    draw.text((qr_x, qr_y + qr_img.height + 10), qr_text, font=font_small, fill="black")
-
-    # Devolver como PNG
-    buffer = BytesIO()
-    card.save(buffer, format="PNG")
-    buffer.seek(0)
-
-    return send_file(
-        buffer,
-        mimetype="image/png",
-        as_attachment=False,
-        download_name=f"credencial_{id_asistente}.png"
+    # El ETag es el hash de los datos: si el navegador ya lo tiene, 304 sin render
+    datos = credenciales.datos_credencial(asistente, asistente.persona)
+    etag = credenciales.clave("gafete", datos, formato)
+    no_modificado = credenciales.no_modificado(request, etag)
+    if no_modificado:
+        return no_modificado
+
+    return credenciales.enviar(
+        credenciales.imagen("gafete", datos, formato),
+        etag,
+        mimetype=credenciales.FORMATOS[formato]["mimetype"],
+        download_name=credenciales.nombre_archivo("gafete", id_asistente, formato)
     )
 
 # =====================================
@@ -339,14 +295,38 @@ def crear_evento():
     pais = data.get("pais")
     notas = data.get("notas")
 
+    # Filtros opcionales para a quién se invita
+    solo_activos = data.get("solo_activos", False)
+    roles = data.get("roles")          # ["ingeniero", "becario"] o ids
+
     if not nombre or not fecha or not lugar:
         return jsonify({"ok": False, "message": "Faltan campos obligatorios."}), 400
 
+    # bool() convertiría "false" en True: sólo booleano real o texto reconocible
+    if solo_activos is None:
+        solo_activos = False
+    elif not isinstance(solo_activos, bool):
+        solo_activos = parse_bool(solo_activos) if isinstance(solo_activos, str) else None
+        if solo_activos is None:
+            return jsonify({"ok": False, "message": "solo_activos debe ser true o false."}), 400
+
     try:
         fecha_dt = datetime.strptime(fecha, "%Y-%m-%d")
     except Exception:
         return jsonify({"ok": False, "message": "Fecha inválida."}), 400
 
+    # ?async=1: responde 202 y el fan-out corre como job
+    en_segundo_plano = jobs.pedido_async(request)
+
+    ids_roles = None
+    if roles is not None:
+        if not isinstance(roles, list):
+            return jsonify({"ok": False, "message": "roles debe ser una lista."}), 400
+        try:
+            ids_roles = resolver_roles(roles)
+        except ValueError as e:
+            return jsonify({"ok": False, "message": str(e)}), 400
+
     # Código único simple
     codigo = f"EV-{int(datetime.utcnow().timestamp())}"
 
@@ -369,27 +349,22 @@ def crear_evento():
         db.session.add(evento)
         db.session.flush()  # ya tenemos evento.id_evento
 
-        # 2) Obtener todos los asistentes formales
-        asistentes = Asistente.query.all()
-
-        registros_nuevos = []
-        for a in asistentes:
-            reg = Registro(
-                id_evento=evento.id_evento,
-                id_asistente=a.id_asistente,
-                asistencia="desconocido",
-                invitados=0,
-                confirmado=None,
-                fecha_confirmacion=None,
-                comentarios=None,
-                creado_en=ahora
+        if en_segundo_plano:
+            # El evento se guarda ya; el fan-out corre como job (abajo)
+            db.session.commit()
+        else:
+            # 2) Un registro por asistente, con un solo INSERT ... SELECT
+            registros_creados = invitar_asistentes(
+                evento.id_evento,
+                solo_activos=solo_activos,
+                ids_roles=ids_roles,
+                ahora=ahora
             )
-            registros_nuevos.append(reg)
 
-        if registros_nuevos:
-            db.session.add_all(registros_nuevos)
+            # Renglón de evento_stats del evento nuevo
+            estadisticas.recalcular_eventos([evento.id_evento])
 
-        db.session.commit()
+            db.session.commit()
 
     except Exception as e:
         db.session.rollback()
@@ -401,22 +376,35 @@ def crear_evento():
             "error": str(e)
         }), 500
 
+    evento_json = {
+        "id_evento": evento.id_evento,
+        "codigo": evento.codigo,
+        "nombre": evento.nombre,
+        "fecha": fecha,
+        "lugar": evento.sede,
+        "direccion": evento.direccion,
+        "ciudad": evento.ciudad,
+        "estado": evento.estado,
+        "pais": evento.pais,
+        "notas": evento.notas,
+    }
+
+    if en_segundo_plano:
+        id_job = jobs.encolar(
+            "crear_evento",
+            invitar_y_contar,
+            evento.id_evento,
+            solo_activos=solo_activos,
+            ids_roles=ids_roles,
+            creado_por=identidad.get("correo")
+        )
+        return jobs.respuesta_job(id_job, "Evento creado; los registros se están generando.", evento=evento_json)
+
     return jsonify({
         "ok": True,
         "message": "Evento creado correctamente.",
-        "evento": {
-            "id_evento": evento.id_evento,
-            "codigo": evento.codigo,
-            "nombre": evento.nombre,
-            "fecha": fecha,
-            "lugar": evento.sede,
-            "direccion": evento.direccion,
-            "ciudad": evento.ciudad,
-            "estado": evento.estado,
-            "pais": evento.pais,
-            "notas": evento.notas,
-        },
-        "registros_creados": len(registros_nuevos)
+        "evento": evento_json,
+        "registros_creados": registros_creados
     }), 201
 
 # =====================================
@@ -431,35 +419,19 @@ def listar_eventos():
     if identidad.get("rol") not in ("admin", "staff"):
         return jsonify({"ok": False, "message": "No autorizado."}), 403
 
-    eventos = Evento.query.order_by(Evento.fecha_inicio.desc()).all()
+    # Sin ?limit= regresa todos; con ?limit= pagina con ?after=<siguiente>
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit < 1:
+        return jsonify({"ok": False, "message": "limit debe ser mayor que 0."}), 400
+    if limit:
+        limit = min(limit, estadisticas.MAX_LIMIT_EVENTOS)
 
-    # Total de asistentes oficiales (asistentes formales)
-    total_oficiales = Asistente.query.count()
-
-    data = []
-    for ev in eventos:
-        # Confirmados por evento (en tabla registros)
-        confirmados = Registro.query.filter_by(
-            id_evento=ev.id_evento,
-            confirmado=True
-        ).count()
-
-        data.append({
-            "id_evento": ev.id_evento,
-            "codigo": ev.codigo,
-            "nombre": ev.nombre,
-            "fecha": ev.fecha_inicio.strftime("%Y-%m-%d"),
-            "lugar": ev.sede,
-            "direccion": ev.direccion,
-            "ciudad": ev.ciudad,
-            "estado": ev.estado,
-            "pais": ev.pais,
-            "notas": ev.notas,
-            "invitados": total_oficiales,
-            "confirmados": confirmados
-        })
+    try:
+        data, siguiente = estadisticas.listar_eventos(limit, request.args.get("after"))
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
 
-    return jsonify({"ok": True, "eventos": data}), 200
+    return jsonify({"ok": True, "eventos": data, "siguiente": siguiente}), 200
 
 # =====================================
 # 8) Listar comentarios del buzón
@@ -511,6 +483,9 @@ def pase_lista_evento():
     """
     Devuelve la lista de asistentes relacionados a un evento,
     incluyendo si tenían confirmación de asistencia.
+
+    Con ?since=<cursor> (el "cursor" de la respuesta anterior) sólo devuelve
+    los registros que cambiaron y los id_registro eliminados desde entonces.
     """
     identidad = get_jwt_identity() or {}
     if identidad.get("rol") not in ("admin", "staff"):
@@ -525,120 +500,73 @@ def pase_lista_evento():
     if not evento:
         return jsonify({"ok": False, "message": "Evento no encontrado"}), 404
 
-    # Traer registros + persona + rol + asistencia física (si existe)
-    registros = (
-        db.session.query(Registro, Asistente, Persona, Rol, Asistencia)
-        .join(Asistente, Registro.id_asistente == Asistente.id_asistente)
-        .join(Persona, Asistente.id_asistente == Persona.id_persona)
-        .join(Rol, Asistente.id_rol == Rol.id_rol)
-        .outerjoin(Asistencia, Asistencia.id_registro == Registro.id_registro)
-        .filter(Registro.id_evento == id_evento)
-        .order_by(Persona.nombre_completo.asc())
-        .all()
-    )
-
-    data = []
-    for reg, asist, persona, rol, asistencia_fisica in registros:
-        data.append({
-            "id_registro": reg.id_registro,
-            "id_asistente": asist.id_asistente,
-            "nombre": persona.nombre_completo,
-            "correo": persona.correo,
-            "empresa": persona.empresa,
-            "rol": rol.nombre_rol,
-            "asistencia_estado": reg.asistencia,          # si / no / tal_vez / desconocido
-            "confirmado": reg.confirmado,                 # True / False / None
-            "invitados": reg.invitados,
-            "comentarios": reg.comentarios,
-            "check_in": True if asistencia_fisica and asistencia_fisica.hora_entrada else False
-        })
+    # Completo, o sólo lo que cambió desde el cursor del cliente (?since=)
+    try:
+        lista = pase_lista.obtener(id_evento, request.args.get("since"))
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
 
     return jsonify({"ok": True, "evento": {
                         "id_evento": evento.id_evento,
                         "nombre": evento.nombre,
                         "fecha": evento.fecha_inicio.strftime("%Y-%m-%d"),
                     },
-                    "registros": data}), 200
+                    "registros": lista["registros"],
+                    "eliminados": lista["eliminados"],
+                    "cursor": lista["cursor"],
+                    "delta": lista["delta"]}), 200
 
 # =====================================
-# 10) Exportar pase de lista a CSV
+# 10) Exportar pase de lista a CSV / XLSX
 # =====================================
-@admin_bp.route("/pase_lista_csv", methods=["GET"])
-@jwt_required()
-def exportar_pase_lista_csv():
+def _exportar_pase_lista(formato):
     identidad = get_jwt_identity() or {}
     if identidad.get("rol") not in ("admin", "staff"):
         return jsonify({"ok": False, "message": "No autorizado."}), 403
 
-    id_evento = request.args.get("id_evento", type=int)
-    if not id_evento:
+    try:
+        ids_eventos = exportacion.parse_ids_eventos(request.args)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    if not ids_eventos:
         return jsonify({"ok": False, "message": "id_evento es requerido"}), 400
 
-    evento = Evento.query.get(id_evento)
-    if not evento:
-        return jsonify({"ok": False, "message": "Evento no encontrado"}), 404
-
-    registros = (
-        db.session.query(Registro, Asistente, Persona, Rol, Asistencia)
-        .join(Asistente, Registro.id_asistente == Asistente.id_asistente)
-        .join(Persona, Asistente.id_asistente == Persona.id_persona)
-        .join(Rol, Asistente.id_rol == Rol.id_rol)
-        .outerjoin(Asistencia, Asistencia.id_registro == Registro.id_registro)
-        .filter(Registro.id_evento == id_evento)
-        .order_by(Persona.nombre_completo.asc())
-        .all()
+    eventos = exportacion.buscar_eventos(ids_eventos)
+    faltan = [i for i in ids_eventos if i not in eventos]
+    if faltan:
+        return jsonify({
+            "ok": False,
+            "message": f"Evento no encontrado: {', '.join(str(i) for i in faltan)}"
+        }), 404
+
+    filename = exportacion.nombre_archivo(ids_eventos, formato)
+    if formato == "xlsx":
+        # Una hoja por evento, escrita desde el cursor en modo write_only
+        generador = exportacion.generar_xlsx(ids_eventos, eventos)
+        mimetype = exportacion.MIMETYPE_XLSX
+    else:
+        # Se escribe conforme se lee del cursor: memoria plana y primer byte inmediato
+        generador = exportacion.generar_csv(ids_eventos)
+        mimetype = "text/csv"
+
+    return Response(
+        stream_with_context(generador),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Encabezados
-    writer.writerow([
-        "id_evento",
-        "codigo_evento",
-        "nombre_evento",
-        "fecha_evento",
-        "id_registro",
-        "id_asistente",
-        "nombre",
-        "correo",
-        "empresa",
-        "rol",
-        "asistencia_estado",
-        "confirmado",
-        "invitados",
-        "comentarios",
-        "check_in",
-    ])
-
-    for reg, asist, persona, rol, asistencia_fisica in registros:
-        writer.writerow([
-            evento.id_evento,
-            evento.codigo,
-            evento.nombre,
-            evento.fecha_inicio.strftime("%Y-%m-%d"),
-            reg.id_registro,
-            asist.id_asistente,
-            persona.nombre_completo or "",
-            persona.correo or "",
-            persona.empresa or "",
-            rol.nombre_rol or "",
-            reg.asistencia or "",
-            "" if reg.confirmado is None else ("1" if reg.confirmado else "0"),
-            reg.invitados or 0,
-            (reg.comentarios or "").replace("\n", " ").replace("\r", " "),
-            "1" if (asistencia_fisica and asistencia_fisica.hora_entrada) else "0",
-        ])
-
-    output.seek(0)
-    filename = f"pase_lista_evento_{evento.id_evento}.csv"
-
-    return send_file(
-        io.BytesIO(output.getvalue().encode("utf-8-sig")),
-        mimetype="text/csv",
-        as_attachment=True,
-        download_name=filename
-    )
+
+@admin_bp.route("/pase_lista_csv", methods=["GET"])
+@jwt_required()
+def exportar_pase_lista_csv():
+    return _exportar_pase_lista("csv")
+
+
+@admin_bp.route("/pase_lista_xlsx", methods=["GET"])
+@jwt_required()
+def exportar_pase_lista_xlsx():
+    return _exportar_pase_lista("xlsx")
+
 
 # =====================================
 # 11) Importar pase de lista desde CSV
@@ -652,6 +580,7 @@ def importar_pase_lista_csv():
     - confirmado         (1/0, true/false, sí/no)
     - invitados          (entero)
     Actualiza o crea registros en la tabla 'registros' para el evento.
+    Con ?dry_run=1 sólo valida y regresa el diff por renglón, sin escribir.
     """
     identidad = get_jwt_identity() or {}
     if identidad.get("rol") not in ("admin", "staff"):
@@ -672,101 +601,41 @@ def importar_pase_lista_csv():
     if file.filename == "":
         return jsonify({"ok": False, "message": "Nombre de archivo vacío"}), 400
 
+    # Sólo una muestra: codificación, separador y que venga 'correo'
     try:
-        content = file.read().decode("utf-8-sig")
-    except Exception:
-        return jsonify({"ok": False, "message": "No se pudo leer el archivo como UTF-8"}), 400
-
-    reader = csv.DictReader(io.StringIO(content))
-
-    total = 0
-    actualizados = 0
-    creados = 0
-    no_encontrados = []
-
-    def parse_bool(val):
-        if val is None:
-            return None
-        s = str(val).strip().lower()
-        if s in ("1", "true", "t", "sí", "si", "yes", "y"):
-            return True
-        if s in ("0", "false", "f", "no", "n"):
-            return False
-        return None
-
-    ahora = datetime.utcnow()
-
-    for row in reader:
-        total += 1
-        correo = (row.get("correo") or "").strip()
-
-        if not correo:
-            no_encontrados.append({"motivo": "sin_correo", "row": row})
-            continue
+        inspeccionar_csv(file.stream)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
 
-        persona = Persona.query.filter_by(correo=correo).first()
-        if not persona or not persona.asistente:
-            no_encontrados.append({"motivo": "persona_o_asistente_no_encontrado", "correo": correo})
-            continue
-
-        asistente = persona.asistente
-
-        # Buscar registro existente
-        reg = Registro.query.filter_by(
-            id_evento=id_evento,
-            id_asistente=asistente.id_asistente
-        ).first()
-
-        if not reg:
-            # Crear si no existe
-            reg = Registro(
-                id_evento=id_evento,
-                id_asistente=asistente.id_asistente,
-                asistencia="desconocido",
-                invitados=0,
-                confirmado=None,
-                fecha_confirmacion=None,
-                comentarios=None,
-                creado_en=ahora
-            )
-            db.session.add(reg)
-            creados += 1
-        else:
-            actualizados += 1
-
-        asistencia_estado = (row.get("asistencia_estado") or row.get("asistencia") or "").strip().lower()
-        if asistencia_estado in ("si", "sí", "no", "tal_vez", "desconocido"):
-            reg.asistencia = asistencia_estado
-
-        confirmado_val = row.get("confirmado") or ""
-        confirmado_bool = parse_bool(confirmado_val)
-        if confirmado_bool is not None:
-            reg.confirmado = confirmado_bool
-            reg.fecha_confirmacion = ahora
-
-        invitados_val = row.get("invitados") or ""
-        try:
-            reg.invitados = int(invitados_val) if invitados_val != "" else reg.invitados
-        except ValueError:
-            pass
-
-        comentarios_val = row.get("comentarios") or ""
-        if comentarios_val:
-            reg.comentarios = comentarios_val
+    # ?dry_run=1: sólo reporta qué cambiaría, no escribe nada
+    if pedido_dry_run(request):
+        reporte = validar_pase_lista(id_evento, file.stream)
+        return jsonify({
+            "ok": True,
+            "message": "Validación completada; no se guardó ningún cambio.",
+            "resumen": reporte
+        }), 200
+
+    # ?async=1: responde 202 y la importación corre como job
+    if jobs.pedido_async(request):
+        id_job = jobs.encolar(
+            "importar_pase_lista",
+            importar_pase_lista_archivo,
+            id_evento,
+            guardar_para_job(file),
+            creado_por=identidad.get("correo")
+        )
+        return jobs.respuesta_job(id_job, "Importación en proceso.")
 
-    db.session.commit()
+    resumen = importar_pase_lista(id_evento, file.stream)
 
     return jsonify({
         "ok": True,
         "message": "Importación completada.",
-        "resumen": {
-            "filas_totales": total,
-            "registros_creados": creados,
-            "registros_actualizados": actualizados,
-            "no_encontrados": no_encontrados
-        }
+        "resumen": resumen
     }), 200
 
+
 # =====================================
 # 12) Buscar asistente por QR + evento (incluye datos médicos)
 # =====================================
@@ -792,73 +661,17 @@ def qr_lookup():
     if not id_asistente:
         return jsonify({"ok": False, "message": "Código QR inválido."}), 400
 
-    asistente = Asistente.query.get(id_asistente)
-    if not asistente or not asistente.persona:
+    # Roster del evento en caché: sin SQL una vez que el evento está "caliente"
+    entrada = roster_cache.obtener(id_evento, id_asistente)
+    if not entrada:
         return jsonify({"ok": False, "message": "Asistente no encontrado."}), 404
 
-    persona = asistente.persona
-    rol = asistente.rol
-
-    # 🔹 Datos médicos
-    medico = AsistenteMedico.query.get(id_asistente)
-
-    # Buscar registro para ese evento
-    registro = Registro.query.filter_by(
-        id_evento=id_evento,
-        id_asistente=id_asistente
-    ).first()
-
-    asistencia_fisica = registro.asistencia_registro if registro else None
-
-    asist_json = {
-        "id_asistente": id_asistente,
-        "codigo_qr": f"AGFI-{id_asistente}",
-        "nombre": persona.nombre_completo,
-        "correo": persona.correo,
-        "empresa": persona.empresa,
-        "telefono": persona.telefono,
-        "carrera": persona.carrera,
-        "generacion": asistente.generacion,
-        "rol": rol.nombre_rol if rol else None,
-    }
-
-    # Si hay datos médicos, los agregamos
-    if medico:
-        asist_json.update({
-            "tipo_sangre": medico.tipo_sangre,
-            "alergias": medico.alergias,
-            "medicamentos_actuales": medico.medicamentos_actuales,
-            "padecimientos": medico.padecimientos,
-            "contacto_emergencia_nombre": medico.contacto_emergencia_nombre,
-            "contacto_emergencia_telefono": medico.contacto_emergencia_telefono,
-        })
-
-    response = {
+    return jsonify({
         "ok": True,
-        "asistente": asist_json,
-        "registro": None,
-        "asistencia": None
-    }
-
-    if registro:
-        response["registro"] = {
-            "id_registro": registro.id_registro,
-            "asistencia_estado": registro.asistencia,
-            "confirmado": registro.confirmado,
-            "invitados": registro.invitados,
-            "comentarios": registro.comentarios,
-        }
-
-    if asistencia_fisica:
-        response["asistencia"] = {
-            "id_asistencia": asistencia_fisica.id_asistencia,
-            "hora_entrada": asistencia_fisica.hora_entrada.isoformat() if asistencia_fisica.hora_entrada else None,
-            "numero_mesa": asistencia_fisica.numero_mesa,
-            "numero_asiento": asistencia_fisica.numero_asiento,
-            "codigo_gafete": asistencia_fisica.codigo_gafete,
-        }
-
-    return jsonify(response), 200
+        "asistente": entrada["asistente"],
+        "registro": entrada["registro"],
+        "asistencia": entrada["asistencia"]
+    }), 200
 
 # =====================================
 # 13) Actualizar datos básicos y marcar asistencia
@@ -959,7 +772,7 @@ def qr_checkin():
 
     # ---- 6) Actualizar Asistente (rol, generación, experiencia) ----
     if rol_front:
-        rol_obj = Rol.query.filter_by(nombre_rol=rol_front).first()
+        rol_obj = roles_cache.por_nombre(rol_front)
         if not rol_obj:
             return jsonify({"ok": False, "message": "Rol de asistente no válido."}), 400
         asistente.id_rol = rol_obj.id_rol
@@ -988,52 +801,25 @@ def qr_checkin():
     if contacto_emergencia_telefono is not None:
         medico.contacto_emergencia_telefono = contacto_emergencia_telefono
 
-    # ---- 8) Registro en el evento ----
+    # ---- 8) Registro + asistencia física (upsert idempotente) ----
     ahora = datetime.utcnow()
-    registro = Registro.query.filter_by(
-        id_evento=id_evento,
-        id_asistente=id_asistente
-    ).first()
-
-    creado_registro = False
-    if not registro:
-        registro = Registro(
-            id_evento=id_evento,
-            id_asistente=id_asistente,
-            asistencia="desconocido",
-            invitados=0,
-            confirmado=None,
-            fecha_confirmacion=None,
-            comentarios=None,
-            creado_en=ahora
-        )
-        db.session.add(registro)
-        creado_registro = True
-
-    # Marcamos asistencia lógica
-    registro.asistencia = "si"
-    if registro.confirmado is None:
-        registro.confirmado = True
-        registro.fecha_confirmacion = ahora
-
-    # ---- 9) Asistencia física (hora_entrada en tabla asistencia) ----
-    asistencia_obj = Asistencia.query.filter_by(id_registro=registro.id_registro).first()
-    created_asistencia = False
-
-    if not asistencia_obj:
-        asistencia_obj = Asistencia(
-            id_registro=registro.id_registro,
-            hora_entrada=ahora,
-            codigo_gafete=f"AGFI-{id_asistente}",
-            creado_en=ahora
-        )
-        db.session.add(asistencia_obj)
-        created_asistencia = True
-    else:
-        if not asistencia_obj.hora_entrada:
-            asistencia_obj.hora_entrada = ahora
+    try:
+        det = registrar_checkins([(id_evento, id_asistente, ahora)], ahora)[(id_evento, id_asistente)]
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "ok": False,
+            "message": "Error al registrar asistencia",
+            "error": str(e)
+        }), 500
 
-    db.session.commit()
+    roster_cache.invalidar_asistente(id_asistente)
+    publicar_checkins(
+        {(id_evento, id_asistente): det},
+        origen="qr",
+        nombre=persona.nombre_completo
+    )
 
     return jsonify({
         "ok": True,
@@ -1041,11 +827,11 @@ def qr_checkin():
         "detalles": {
             "id_asistente": id_asistente,
             "id_evento": id_evento,
-            "id_registro": registro.id_registro,
-            "id_asistencia": asistencia_obj.id_asistencia,
-            "hora_entrada": asistencia_obj.hora_entrada.isoformat() if asistencia_obj.hora_entrada else None,
-            "registro_creado": creado_registro,
-            "asistencia_creada": created_asistencia
+            "id_registro": det["id_registro"],
+            "id_asistencia": det["id_asistencia"],
+            "hora_entrada": det["hora_entrada"].isoformat() if det["hora_entrada"] else None,
+            "registro_creado": det["registro_creado"],
+            "asistencia_creada": det["asistencia_creada"]
         }
     }), 200
 
@@ -1087,7 +873,7 @@ def alta_express_admin():
     if not evento:
         return jsonify({"ok": False, "message": "Evento no encontrado."}), 404
 
-    rol_obj = Rol.query.filter_by(nombre_rol=rol_front).first()
+    rol_obj = roles_cache.por_nombre(rol_front)
     if not rol_obj:
         return jsonify({"ok": False, "message": "Rol de asistente no válido."}), 400
 
@@ -1154,54 +940,32 @@ def alta_express_admin():
         db.session.add(invitado_ulm)
         invitado_creado = True
 
-    # 3) Registro (relación con evento)
-    registro = Registro.query.filter_by(
-        id_evento=id_evento,
-        id_asistente=asistente.id_asistente
-    ).first()
-    registro_creado = False
-
-    if not registro:
-        registro = Registro(
-            id_evento=id_evento,
-            id_asistente=asistente.id_asistente,
-            asistencia="si",       # ya está presente
-            invitados=0,
-            confirmado=True,
-            fecha_confirmacion=ahora,
-            comentarios="Alta express (invitado último momento).",
-            creado_en=ahora
-        )
-        db.session.add(registro)
-        registro_creado = True
-    else:
-        registro.asistencia = "si"
-        if registro.confirmado is None:
-            registro.confirmado = True
-            registro.fecha_confirmacion = ahora
-
-    # 4) Asistencia física (check-in)
-    asistencia_obj = Asistencia.query.filter_by(
-        id_registro=registro.id_registro
-    ).first()
-    asistencia_creada = False
-
-    if not asistencia_obj:
-        asistencia_obj = Asistencia(
-            id_registro=registro.id_registro,
-            hora_entrada=ahora,
-            codigo_gafete=f"AGFI-{asistente.id_asistente}",
-            creado_en=ahora
-        )
-        db.session.add(asistencia_obj)
-        asistencia_creada = True
-    else:
-        if not asistencia_obj.hora_entrada:
-            asistencia_obj.hora_entrada = ahora
-        if not asistencia_obj.codigo_gafete:
-            asistencia_obj.codigo_gafete = f"AGFI-{asistente.id_asistente}"
+    # 4) Registro + asistencia física (upsert idempotente)
+    try:
+        det = registrar_checkins(
+            [(id_evento, asistente.id_asistente, ahora)],
+            ahora,
+            comentarios="Alta express (invitado último momento)."
+        )[(id_evento, asistente.id_asistente)]
+        if invitado_creado:
+            estadisticas.aplicar_deltas({id_evento: {"walk_in": 1}})
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "ok": False,
+            "message": "Error al registrar asistencia",
+            "error": str(e)
+        }), 500
 
-    db.session.commit()
+    roster_cache.invalidar_asistente(asistente.id_asistente)
+    publicar_checkins(
+        {(id_evento, asistente.id_asistente): det},
+        origen="alta_express",
+        nombre=persona.nombre_completo,
+        empresa=persona.empresa,
+        rol=rol_obj.nombre_rol
+    )
 
     return jsonify({
         "ok": True,
@@ -1210,79 +974,412 @@ def alta_express_admin():
             "id_persona": persona.id_persona,
             "id_asistente": asistente.id_asistente,
             "id_evento": evento.id_evento,
-            "id_registro": registro.id_registro,
-            "id_asistencia": asistencia_obj.id_asistencia,
+            "id_registro": det["id_registro"],
+            "id_asistencia": det["id_asistencia"],
             "codigo_qr": f"AGFI-{asistente.id_asistente}",
             "persona_creada": persona_creada,
             "asistente_creado": asistente_creado,
             "invitado_ulm_creado": invitado_creado,
-            "registro_creado": registro_creado,
-            "asistencia_creada": asistencia_creada
+            "registro_creado": det["registro_creado"],
+            "asistencia_creada": det["asistencia_creada"]
         }
     }), 200
 
+# =====================================
+# 15) Check-in en lote (escáneres que estuvieron sin red)
+# =====================================
+@admin_bp.route("/qr_checkin_lote", methods=["POST"])
+@jwt_required()
+def qr_checkin_lote():
+    """
+    Recibe los escaneos que un teléfono acumuló sin conexión y los
+    registra en una sola transacción.
 
-@admin_bp.route("/credencial_zip/<int:id_asistente>", methods=["GET"])
-def generar_credencial_completa(id_asistente):
-    asistente = Asistente.query.get(id_asistente)
-    if not asistente or not asistente.persona:
-        return jsonify({"ok": False, "message": "Asistente no encontrado."}), 404
+    Espera JSON con:
+    - scans: lista de {"id_evento": 1, "code": "AGFI-123", "ts": "2025-11-20T19:05:00Z"}
 
-    persona = asistente.persona
+    Devuelve un resultado por escaneo (mismo orden) y un resumen.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    data = request.get_json() or {}
+    scans = data.get("scans")
+
+    if not isinstance(scans, list) or not scans:
+        return jsonify({"ok": False, "message": "scans debe ser una lista con al menos un escaneo."}), 400
+
+    if len(scans) > MAX_SCANS_LOTE:
+        return jsonify({
+            "ok": False,
+            "message": f"Máximo {MAX_SCANS_LOTE} escaneos por lote."
+        }), 413
+
+    try:
+        lote = registrar_checkins_lote(scans)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "ok": False,
+            "message": "Error al registrar el lote de asistencias",
+            "error": str(e)
+        }), 500
+
+    return jsonify({
+        "ok": True,
+        "message": "Lote procesado.",
+        "resumen": lote["resumen"],
+        "resultados": lote["resultados"]
+    }), 200
+
+
+# =====================================
+# 16) Contadores de conflictos del check-in
+# =====================================
+@admin_bp.route("/checkin_stats", methods=["GET"])
+@jwt_required()
+def checkin_stats():
+    """
+    Cuántos upserts de check-in insertaron filas nuevas y cuántos cayeron
+    sobre un Registro / Asistencia que ya existía (escaneo repetido o dos
+    puertas a la vez). Los contadores son por proceso.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    return jsonify({"ok": True, "contadores": contadores_upsert()}), 200
+
+
+# =====================================
+# 17) Contadores de un evento (evento_stats)
+# =====================================
+@admin_bp.route("/eventos/<int:id_evento>/stats", methods=["GET"])
+@jwt_required()
+def stats_evento(id_evento):
+    """
+    invitados, confirmados, rsvp_si / rsvp_no / rsvp_tal_vez, check_in y
+    walk_in del evento, leídos de evento_stats por llave primaria.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    stats = estadisticas.obtener(id_evento)
+    if stats is None:
+        return jsonify({"ok": False, "message": "Evento no encontrado o sin estadísticas."}), 404
 
-    # Rutas de las plantillas PNG
-    front_path = "1.png"
-    back_path  = "2.png"
+    return jsonify({"ok": True, "id_evento": id_evento, "stats": stats}), 200
 
-    front = Image.open(front_path).convert("RGBA")
-    back  = Image.open(back_path).convert("RGBA")
 
-    draw_f = ImageDraw.Draw(front)
-    draw_b = ImageDraw.Draw(back)
+# =====================================
+# 18) Jobs en segundo plano (avance y resultado)
+# =====================================
+@admin_bp.route("/jobs/<id_job>", methods=["GET"])
+@jwt_required()
+def estado_job(id_job):
+    """
+    Estado de un job lanzado con ?async=1:
+    pendiente / en_proceso / terminado / error, avance y resultado.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    job = jobs.obtener(id_job)
+    if not job:
+        return jsonify({"ok": False, "message": "Job no encontrado."}), 404
+
+    return jsonify({"ok": True, "job": jobs.job_json(job)}), 200
+
+
+@admin_bp.route("/jobs/<id_job>/resultado", methods=["GET"])
+@jwt_required()
+def resultado_job(id_job):
+    """
+    Resultado de un job terminado. Si el job dejó un archivo (ZIP, PDF...)
+    se descarga; si no, se devuelve el resultado en JSON.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
 
-    #              font = ImageFont.truetype("arial.ttf", 15)
-    font = ImageFont.truetype("dejavu-sans.book.ttf", 15)
+    job = jobs.obtener(id_job)
+    if not job:
+        return jsonify({"ok": False, "message": "Job no encontrado."}), 404
 
-    # =============================
-    #  FRENTE — posiciones exactas
-    # =============================
-    draw_f.text((600, 280), persona.nombre_completo or "", fill="black", font=font)
-    draw_f.text((600, 350), asistente.generacion or "", fill="black", font=font)
+    if job.estado != "terminado":
+        return jsonify({
+            "ok": False,
+            "message": f"El job no ha terminado (estado: {job.estado}).",
+            "job": jobs.job_json(job)
+        }), 409
 
-    miembro_desde = persona.creado_en.strftime("%Y") if persona.creado_en else ""
-    draw_f.text((830, 350), miembro_desde, fill="black", font=font)
+    resultado = jobs.job_json(job)["resultado"] or {}
+    archivo = resultado.get("archivo") if isinstance(resultado, dict) else None
+    if archivo:
+        ruta = jobs.ruta_archivo(archivo)
+        if not os.path.exists(ruta):
+            return jsonify({"ok": False, "message": "El archivo del job ya no existe."}), 410
+        return send_file(
+            ruta,
+            mimetype=resultado.get("mimetype") or "application/octet-stream",
+            as_attachment=True,
+            download_name=archivo
+        )
 
-    draw_f.text((600, 425), persona.carrera or "", fill="black", font=font)
+    return jsonify({"ok": True, "resultado": resultado}), 200
 
-    # =============================
-    #  REVERSO — QR centrado
-    # =============================
-    qr_text = f"AGFI-{id_asistente}"
-    qr_img = qrcode.make(qr_text).resize((300, 300))
 
-    # pegar QR
-    back.paste(qr_img, (355, 80))
+# =====================================
+# 19) Credenciales de todo un evento (ZIP, como job)
+# =====================================
+@admin_bp.route("/eventos/<int:id_evento>/credenciales.zip", methods=["POST"])
+@jwt_required()
+def credenciales_evento_zip(id_evento):
+    """
+    Lanza un job que genera frente y reverso de cada registrado del evento
+    en un pool de procesos. Responde 202; el avance está en /admin/jobs/<id>
+    y el ZIP se descarga de /admin/jobs/<id>/resultado.
+    Sólo POST: cada llamada renderiza el evento completo (minutos), y un GET
+    lo dispararía un refresco, un prefetch o un crawler.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
 
+    try:
+        formato = credenciales.parse_formato(request.args)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
 
-    # =============================
-    #  CREAR ZIP CON AMBAS IMÁGENES
-    # =============================
-    buffer_zip = BytesIO()
-    import zipfile
+    if not db.session.get(Evento, id_evento):
+        return jsonify({"ok": False, "message": "Evento no encontrado"}), 404
 
-    with zipfile.ZipFile(buffer_zip, "w") as z:
-        fb = BytesIO()
-        front.save(fb, format="PNG")
-        z.writestr(f"credencial_front_{id_asistente}.png", fb.getvalue())
+    id_job = jobs.encolar(
+        "credenciales_evento",
+        credenciales.zip_evento,
+        id_evento,
+        formato,
+        creado_por=identidad.get("correo")
+    )
+    return jobs.respuesta_job(
+        id_job,
+        "Generando credenciales.",
+        resultado_url=f"/admin/jobs/{id_job}/resultado"
+    )
 
-        bb = BytesIO()
-        back.save(bb, format="PNG")
-        z.writestr(f"credencial_back_{id_asistente}.png", bb.getvalue())
 
-    buffer_zip.seek(0)
+# =====================================
+# 20) Credenciales de un evento en PDF para imprenta
+# =====================================
+@admin_bp.route("/eventos/<int:id_evento>/credenciales.pdf", methods=["GET"])
+@jwt_required()
+def credenciales_evento_pdf(id_evento):
+    """
+    Hojas con varias credenciales (CR80) y marcas de corte; cada hoja de
+    frentes va seguida de sus reversos alineados para dúplex.
+    Query: papel=a4|carta, reverso=0 (sin reversos), marcas=0 (sin marcas),
+    async=1 (como job, se descarga de /admin/jobs/<id>/resultado).
+
+    Sólo eventos de hasta PDF_SINCRONO_MAX registrados se generan en la
+    petición; los más grandes siempre corren como job y responden 202.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    if not db.session.get(Evento, id_evento):
+        return jsonify({"ok": False, "message": "Evento no encontrado"}), 404
+
+    try:
+        papel = credenciales_pdf.parse_papel(request.args.get("papel"))
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    reverso = request.args.get("reverso", "1") not in ("0", "false", "no")
+    marcas = request.args.get("marcas", "1") not in ("0", "false", "no")
+
+    total = credenciales.contar_evento(id_evento)
+    if not total:
+        return jsonify({"ok": False, "message": "El evento no tiene registrados."}), 404
+
+    if jobs.pedido_async(request) or total > credenciales_pdf.PDF_SINCRONO_MAX:
+        id_job = jobs.encolar(
+            "credenciales_pdf",
+            credenciales_pdf.pdf_evento,
+            id_evento,
+            papel=papel,
+            reverso=reverso,
+            marcas=marcas,
+            creado_por=identidad.get("correo")
+        )
+        return jobs.respuesta_job(
+            id_job,
+            "Generando PDF de credenciales.",
+            resultado_url=f"/admin/jobs/{id_job}/resultado"
+        )
+
+    lista_datos = credenciales.datos_evento(id_evento)
+
+    # Cada hoja se envía en cuanto se arma
+    return Response(
+        credenciales_pdf.generar_pdf(lista_datos, papel, reverso, marcas),
+        mimetype="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename=credenciales_evento_{id_evento}.pdf"}
+    )
+
+
+# =====================================
+# 21) Estado del escritor de logs (bitacora.py)
+# =====================================
+@admin_bp.route("/logs/escritor", methods=["GET"])
+@jwt_required()
+def estado_escritor_logs():
+    """
+    Registros encolados / escritos / descartados (cola llena) / fallidos
+    y pendientes en la cola. Los contadores son por proceso.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    return jsonify({"ok": True, "escritor": bitacora.estadisticas()}), 200
+
+
+# =====================================
+# 22) Bitácora por mes (tabla o archivo, transparente)
+# =====================================
+LOGS_MES_MAX = 5000
+
+
+@admin_bp.route("/logs/meses", methods=["GET"])
+@jwt_required()
+def logs_meses():
+    """Meses ya archivados y el corte de retención actual."""
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    anio, mes = retencion_logs.mes_corte()
+    return jsonify({
+        "ok": True,
+        "archivados": retencion_logs.meses_archivados(),
+        "en_tabla_desde": f"{anio:04d}-{mes:02d}",
+        "meses_vivos": retencion_logs.LOGS_MESES_VIVOS
+    }), 200
+
+
+@admin_bp.route("/logs/mes/<mes>", methods=["GET"])
+@jwt_required()
+def logs_de_mes(mes):
+    """
+    Logs de un mes (YYYY-MM), sigan en la tabla o ya archivados.
+    Filtros opcionales: ?codigo= &actor= &id_evento= &id_asistente= &limit=
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    try:
+        anio, num_mes = retencion_logs.parse_mes(mes)
+        filtros = {
+            "codigo_accion": request.args.get("codigo") or None,
+            "actor": request.args.get("actor") or None,
+            "id_evento": request.args.get("id_evento", type=int),
+            "id_asistente": request.args.get("id_asistente", type=int),
+        }
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+
+    limite = request.args.get("limit", LOGS_MES_MAX, type=int)
+    if limite < 1:
+        return jsonify({"ok": False, "message": "limit debe ser mayor que 0."}), 400
+    limite = min(limite, LOGS_MES_MAX)
+
+    logs = []
+    truncado = False
+    for fila in retencion_logs.leer_mes(anio, num_mes, filtros):
+        if len(logs) == limite:
+            truncado = True
+            break
+        logs.append(fila)
+
+    return jsonify({
+        "ok": True,
+        "mes": mes,
+        "archivado": mes in retencion_logs.meses_archivados(),
+        "total": len(logs),
+        "truncado": truncado,
+        "logs": logs
+    }), 200
+
+
+# =====================================
+# 23) Bitácora: consulta paginada / NDJSON
+# =====================================
+@admin_bp.route("/logs", methods=["GET"])
+@jwt_required()
+def listar_logs():
+    """
+    Logs del más nuevo al más viejo, por keyset (?limit= y ?after=<siguiente>).
+    Filtros: ?actor= &id_actor= &id_evento= &id_asistente= &codigo= &ip=
+    &desde= &hasta= (fechas ISO, [desde, hasta)).
+    Con ?format=ndjson se envían todos los que cumplan, uno por línea.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("admin", "staff"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    try:
+        filtros = consulta_logs.parse_filtros(request.args)
+        after = request.args.get("after")
+        if after:
+            consulta_logs.parse_cursor_log(after)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+
+    if request.args.get("format") == "ndjson":
+        def generador():
+            for log in consulta_logs.iterar(filtros, after):
+                yield json.dumps(log, ensure_ascii=False) + "\n"
+
+        return Response(
+            stream_with_context(generador()),
+            mimetype="application/x-ndjson",
+            headers={"Content-Disposition": "attachment; filename=logs.ndjson"}
+        )
+
+    limit = request.args.get("limit", consulta_logs.LIMIT_DEFAULT, type=int)
+    if limit < 1:
+        return jsonify({"ok": False, "message": "limit debe ser mayor que 0."}), 400
+    limit = min(limit, consulta_logs.MAX_LIMIT)
+
+    logs, siguiente = consulta_logs.listar(filtros, limit, after)
+    return jsonify({"ok": True, "logs": logs, "siguiente": siguiente}), 200
+
+
+@admin_bp.route("/credencial_zip/<int:id_asistente>", methods=["GET"])
+def generar_credencial_completa(id_asistente):
+    try:
+        formato = credenciales.parse_formato(request.args)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+
+    asistente = Asistente.query.get(id_asistente)
+    if not asistente or not asistente.persona:
+        return jsonify({"ok": False, "message": "Asistente no encontrado."}), 404
+
+    # Frente y reverso salen del caché en disco (o se renderizan una vez)
+    datos = credenciales.datos_credencial(asistente, asistente.persona)
+    etag = credenciales.etag_zip(datos, formato)
+    no_modificado = credenciales.no_modificado(request, etag)
+    if no_modificado:
+        return no_modificado
 
-    return send_file(
-        buffer_zip,
+    return credenciales.enviar(
+        credenciales.zip_credencial(datos, formato),
+        etag,
         mimetype="application/zip",
         as_attachment=True,
         download_name=f"credencial_{id_asistente}.zip"
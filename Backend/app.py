@@ -8,6 +8,8 @@ from auth import auth_bp
 from admin import admin_bp
 from perfil import perfil_bp
 from staff import staff_bp
+from comandos import register_commands
+import roles_cache
 
 def create_app():
     app = Flask(__name__)
@@ -33,12 +35,27 @@ def create_app():
     db.init_app(app)
     JWTManager(app)
 
+    # Catálogo de roles en memoria (roles_cache.py). Si la base todavía no
+    # responde, se carga solo con la primera consulta.
+    with app.app_context():
+        try:
+            roles_cache.precargar()
+        except Exception as e:
+            print(f"[WARN] No se pudieron precargar los roles: {e}")
+        finally:
+            db.session.remove()
+            # Que ningún worker herede esta conexión
+            db.engine.dispose()
+
     # Registrar blueprint de auth
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(perfil_bp)
     app.register_blueprint(staff_bp)
 
+    # Comandos de mantenimiento (flask --app app ...)
+    register_commands(app)
+
     #============================ PRUEBAS ============================#
     # Ruta de prueba
     @app.route("/ping")
@@ -5,11 +5,27 @@ from datetime import timedelta
 from flask_cors import CORS
 from datetime import datetime
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Persona, Asistente, Rol
+from sqlalchemy import select
+
+from models import db, Persona, Asistente
+import bitacora
+import roles_cache
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
 
+def datos_cliente():
+    """ip y user_agent de la petición actual, para registrar_log(**datos_cliente())."""
+    # X-Real-IP lo pone nginx ($remote_addr) y reemplaza lo que mande el cliente.
+    # X-Forwarded-For no sirve: nginx sólo agrega al final y el primer salto
+    # lo escribe el cliente, así que logs.ip se podría falsificar.
+    ip = (request.headers.get("X-Real-IP") or request.remote_addr or "").strip()
+    return {
+        "ip": ip[:45] or None,
+        "user_agent": (request.headers.get("User-Agent") or "")[:255] or None
+    }
+
+
 def registrar_log(
     id_asistente=None,
     accion="",
@@ -17,24 +33,30 @@ def registrar_log(
     id_evento=None,
     id_registro=None,
     id_invitado_ulm=None,
-    actor=None
+    actor=None,
+    codigo=None,
+    ip=None,
+    user_agent=None,
+    id_actor=None
 ):
-    from models import Log  # import local para evitar problemas de import circular
+    # Sólo se encola: el INSERT lo hace el escritor de bitacora.py en lote,
+    # fuera de la petición (y sin hacer commit de la sesión de la ruta)
     try:
-        log = Log(
-            actor=actor,
-            accion=accion,
-            descripcion=descripcion,
-            id_evento=id_evento,
-            id_asistente=id_asistente,
-            id_registro=id_registro,
-            id_invitado_ulm=id_invitado_ulm,
-            creado_en=datetime.utcnow()  # 🔥 AQUÍ LE DAMOS VALOR SIEMPRE
-        )
-        db.session.add(log)
-        db.session.commit()
+        bitacora.registrar({
+            "actor": actor,
+            "accion": accion,
+            "descripcion": descripcion,
+            "id_evento": id_evento,
+            "id_asistente": id_asistente,
+            "id_registro": id_registro,
+            "id_invitado_ulm": id_invitado_ulm,
+            "codigo_accion": codigo or "otro",  # bitacora.ACCIONES
+            "ip": ip,
+            "user_agent": user_agent,
+            "id_actor": id_actor,
+            "creado_en": datetime.utcnow()  # hora del evento, no de la escritura
+        })
     except Exception as e:
-        db.session.rollback()
         print(f"[ERROR LOG] No se pudo registrar el log: {e}")
 
 
@@ -55,39 +77,40 @@ def login():
             "message": "Correo y contraseña son obligatorios."
         }), 400
 
-    persona = Persona.query.filter_by(correo=correo).first()
-    if not persona:
+    # Una sola consulta: persona + su asistente (si tiene); el rol sale de roles_cache
+    fila = db.session.execute(
+        select(
+            Persona.id_persona,
+            Persona.correo,
+            Persona.nombre_completo,
+            Persona.password_hash,
+            Asistente.id_asistente,
+            Asistente.id_rol,
+        )
+        .outerjoin(Asistente, Asistente.id_asistente == Persona.id_persona)
+        .where(Persona.correo == correo)
+    ).first()
+    if not fila:
         return jsonify({
             "ok": False,
             "message": "Usuario incorrectos."
         }), 401
 
-    #if not persona.password_hash or not check_password_hash(persona.password_hash, password):
-    if persona.password_hash != password:        
+    #if not fila.password_hash or not check_password_hash(fila.password_hash, password):
+    if fila.password_hash != password:        
         return jsonify({
             "ok": False,
             "message": "Contraseña incorrectos."
         }), 401
 
-    # Buscar rol a través de Asistente
-    asistente = Asistente.query.filter_by(id_asistente=persona.id_persona).first()
-    rol_nombre = "user"
-    if asistente and asistente.id_rol:
-        rol = Rol.query.get(asistente.id_rol)
-        if rol:
-            # mapeamos el enum de la tabla
-            if rol.nombre_rol == "administrador":
-                rol_nombre = "admin"
-            elif rol.nombre_rol == "staff":
-                rol_nombre = "staff"
-            else:
-                rol_nombre = "user"
+    # admin / staff / user según el rol del asistente
+    rol_nombre = roles_cache.rol_sesion(fila.id_rol)
 
     # Payload del JWT
     identidad = {
-        "id_persona": int(persona.id_persona),
-        "correo": persona.correo,
-        "nombre": persona.nombre_completo,
+        "id_persona": int(fila.id_persona),
+        "correo": fila.correo,
+        "nombre": fila.nombre_completo,
         "rol": rol_nombre
     }
 
@@ -97,12 +120,14 @@ def login():
     )
 
      # Log de éxito
-    id_asistente_log = asistente.id_asistente if asistente else None
     registrar_log(
-        id_asistente=id_asistente_log,
-        accion=f"Login EXITOSO desde IP {ip}. Usuario: {persona.correo}, Rol: {rol_nombre}",
+        id_asistente=fila.id_asistente,
+        accion=f"Login EXITOSO desde IP {ip}. Usuario: {fila.correo}, Rol: {rol_nombre}",
         descripcion=f"User-Agent: {request.headers.get('User-Agent', '')}",
-        actor=persona.correo
+        actor=fila.correo,
+        codigo="login_ok",
+        id_actor=fila.id_persona,
+        **datos_cliente()
     )
 
     return jsonify({
@@ -132,7 +157,10 @@ def logout():
         id_asistente=id_asistente_log,
         accion=f"Logout EXITOSO desde IP {ip}. Usuario: {correo}",
         descripcion=f"User-Agent: {request.headers.get('User-Agent', '')}",
-        actor=correo
+        actor=correo,
+        codigo="logout",
+        id_actor=id_persona,
+        **datos_cliente()
     )
 
     return jsonify({
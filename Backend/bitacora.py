@@ -0,0 +1,220 @@
+"""
+Escritor asíncrono de la bitácora (tabla `logs`).
+
+Antes registrar_log hacía su propio db.session.commit() por cada línea:
+login, logout, cambios de perfil, RSVP y buzón pagaban una escritura más
+dentro de la petición. Ahora la petición sólo mete un dict en una cola
+acotada del proceso y regresa; un hilo escritor la vacía con INSERT de
+varios renglones cada LOG_INTERVALO_MS o cada LOG_LOTE_MAX registros (lo
+que pase primero), en su propia conexión (no toca db.session).
+
+- Contrapresión: si la cola está llena, registrar() espera hasta
+  LOG_ESPERA_MS a que haya lugar; si no, el registro se descarta y se
+  cuenta (estadisticas()["descartados"]). La petición nunca se queda
+  esperando a la base.
+- Si un INSERT de lote falla, se reintenta renglón por renglón para que
+  un registro malo (p. ej. una FK que ya no existe) no tire a los demás.
+- Al salir el proceso (atexit) se escribe lo pendiente.
+- LOG_ASINCRONO=0 escribe en línea, como antes (útil en scripts).
+
+Los registros que estén en la cola si el proceso muere de golpe se
+pierden; es bitácora, no datos del negocio.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import insert
+
+from models import db, Log
+
+LOG_COLA_MAX = int(os.environ.get("LOG_COLA_MAX", "10000"))
+LOG_LOTE_MAX = int(os.environ.get("LOG_LOTE_MAX", "200"))
+LOG_INTERVALO_MS = int(os.environ.get("LOG_INTERVALO_MS", "500"))
+LOG_ESPERA_MS = int(os.environ.get("LOG_ESPERA_MS", "50"))
+LOG_ASINCRONO = os.environ.get("LOG_ASINCRONO", "1") != "0"
+
+# Valores de logs.codigo_accion. `accion` sigue siendo texto libre para
+# leerlo; los reportes (por hora, por IP...) agrupan por el código
+ACCIONES = {
+    "login_ok": "Login exitoso",
+    "logout": "Logout",
+    "perfil_datos": "Actualización de datos personales",
+    "perfil_medico": "Actualización de datos médicos",
+    "rsvp": "Actualización de RSVP",
+    "buzon": "Buzón de comentarios (anónimo)",
+    "otro": "Sin código (logs anteriores a la migración 005)",
+}
+
+# Al apagar, cuánto se espera al escritor (segundos)
+_ESPERA_CIERRE = 5.0
+
+_ALTO = object()
+
+_contadores = {
+    "encolados": 0,
+    "escritos": 0,
+    "descartados": 0,
+    "fallidos": 0,
+    "lotes": 0,
+}
+_contadores_lock = threading.Lock()
+
+
+def _sumar(nombre, n=1):
+    with _contadores_lock:
+        _contadores[nombre] += n
+
+
+def _escribir(engine, filas):
+    """INSERT multi-renglón; si falla, uno por uno. Devuelve cuántos se escribieron."""
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(Log.__table__), filas)
+        return len(filas)
+    except Exception as e:
+        if len(filas) == 1:
+            print(f"[ERROR LOG] No se pudo registrar el log: {e}")
+            return 0
+
+    escritos = 0
+    for fila in filas:
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(Log.__table__), [fila])
+            escritos += 1
+        except Exception as e:
+            print(f"[ERROR LOG] No se pudo registrar el log: {e}")
+    return escritos
+
+
+class _Escritor:
+    """Cola + hilo escritor de un proceso."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.pid = os.getpid()
+        self.cola = queue.Queue(maxsize=LOG_COLA_MAX)
+        self.hilo = threading.Thread(target=self._bucle, name="agfi-bitacora", daemon=True)
+        self.hilo.start()
+
+    def _vaciar_lote(self, lote):
+        if not lote:
+            return
+        escritos = _escribir(self.engine, lote)
+        with _contadores_lock:
+            _contadores["lotes"] += 1
+            _contadores["escritos"] += escritos
+            _contadores["fallidos"] += len(lote) - escritos
+        lote.clear()
+
+    def _bucle(self):
+        lote = []
+        limite = 0.0
+        while True:
+            # Sin nada pendiente se duerme hasta que llegue algo
+            espera = max(0.0, limite - time.monotonic()) if lote else None
+            try:
+                item = self.cola.get(timeout=espera)
+            except queue.Empty:
+                item = None
+
+            if item is _ALTO:
+                self._vaciar_lote(lote)
+                return
+            if isinstance(item, threading.Event):
+                # vaciar(): escribir ya lo que haya y avisar
+                self._vaciar_lote(lote)
+                item.set()
+                continue
+            if item is not None:
+                if not lote:
+                    limite = time.monotonic() + LOG_INTERVALO_MS / 1000
+                lote.append(item)
+
+            if lote and (len(lote) >= LOG_LOTE_MAX or time.monotonic() >= limite):
+                self._vaciar_lote(lote)
+
+    def detener(self):
+        try:
+            self.cola.put(_ALTO, timeout=_ESPERA_CIERRE)
+        except queue.Full:
+            pass
+        self.hilo.join(_ESPERA_CIERRE)
+
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+
+def _obtener_escritor():
+    """El escritor de este proceso (se arranca con el primer log, ya dentro del worker)."""
+    global _escritor
+    escritor = _escritor
+    # pid distinto: somos un proceso hijo (fork) y el hilo no vino con nosotros
+    if escritor is None or escritor.pid != os.getpid():
+        with _escritor_lock:
+            escritor = _escritor
+            if escritor is None or escritor.pid != os.getpid():
+                # db.engine necesita app context: la primera llamada viene de una petición
+                escritor = _escritor = _Escritor(db.engine)
+    return escritor
+
+
+# =====================================
+# API pública
+# =====================================
+def registrar(fila):
+    """
+    Encola un renglón de `logs` (dict con las columnas de Log). No lanza
+    excepción ni espera a la base.
+    """
+    if not LOG_ASINCRONO:
+        escritos = _escribir(db.engine, [fila])
+        _sumar("escritos", escritos)
+        _sumar("fallidos", 1 - escritos)
+        return
+
+    try:
+        _obtener_escritor().cola.put(fila, timeout=LOG_ESPERA_MS / 1000)
+    except queue.Full:
+        _sumar("descartados")
+        with _contadores_lock:
+            descartados = _contadores["descartados"]
+        # No inundar la salida: avisar al primero y luego cada 1000
+        if descartados == 1 or descartados % 1000 == 0:
+            print(f"[WARN] Cola de logs llena ({LOG_COLA_MAX}); {descartados} registro(s) descartado(s).")
+        return
+    _sumar("encolados")
+
+
+def vaciar(timeout=_ESPERA_CIERRE):
+    """Espera a que lo encolado hasta ahora quede escrito. True si alcanzó."""
+    escritor = _escritor
+    if escritor is None or escritor.pid != os.getpid() or not escritor.hilo.is_alive():
+        return True
+    listo = threading.Event()
+    try:
+        escritor.cola.put(listo, timeout=timeout)
+    except queue.Full:
+        return False
+    return listo.wait(timeout)
+
+
+def estadisticas():
+    """Contadores de este proceso + registros que siguen en la cola."""
+    with _contadores_lock:
+        datos = dict(_contadores)
+    escritor = _escritor
+    datos["pendientes"] = escritor.cola.qsize() if escritor is not None and escritor.pid == os.getpid() else 0
+    datos["asincrono"] = LOG_ASINCRONO
+    return datos
+
+
+@atexit.register
+def _al_salir():
+    escritor = _escritor
+    if escritor is not None and escritor.pid == os.getpid() and escritor.hilo.is_alive():
+        escritor.detener()
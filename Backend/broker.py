@@ -0,0 +1,146 @@
+"""
+Broker de avisos en vivo por evento (para el stream SSE del pase de lista).
+
+Las rutas que escriben (qr_checkin, alta_express, check-in en lote, RSVP)
+publican un mensaje pequeño DESPUÉS del commit y cada panel abierto lo
+recibe por /staff/eventos/<id>/stream, sin volver a consultar la base.
+
+- Sin REDIS_URL las colas viven en memoria del proceso (un solo worker).
+- Con REDIS_URL (y el paquete redis instalado) se usa pub/sub, para que
+  un check-in hecho en un worker llegue a los paneles conectados a otro.
+- En cualquier caso cada panel conectado ocupa un hilo del servidor
+  mientras el stream está abierto (hasta staff.SSE_DURACION_MAX, 15 min;
+  luego el navegador reconecta). Hay que contar un hilo por panel al
+  dimensionar los workers.
+
+Publicar nunca lanza excepción: si el aviso se pierde, el panel se pone
+al día con pase_lista?since=<cursor> al reconectar.
+"""
+import json
+import os
+import queue
+import threading
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+# Mensajes que se guardan por suscriptor antes de descartar (cliente lento)
+MAX_PENDIENTES = 500
+
+
+# =====================================
+# Backend en memoria
+# =====================================
+class _MemoriaSuscripcion:
+    def __init__(self, broker, id_evento):
+        self._broker = broker
+        self.id_evento = id_evento
+        self.cola = queue.Queue(maxsize=MAX_PENDIENTES)
+
+    def siguiente(self, timeout):
+        """Siguiente mensaje (dict) o None si no llegó nada en `timeout` segundos."""
+        try:
+            return self.cola.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def cerrar(self):
+        self._broker.desuscribir(self)
+
+
+class _MemoriaBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscriptores = {}   # id_evento -> set(_MemoriaSuscripcion)
+
+    def suscribir(self, id_evento):
+        sub = _MemoriaSuscripcion(self, id_evento)
+        with self._lock:
+            self._suscriptores.setdefault(id_evento, set()).add(sub)
+        return sub
+
+    def desuscribir(self, sub):
+        with self._lock:
+            subs = self._suscriptores.get(sub.id_evento)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    self._suscriptores.pop(sub.id_evento, None)
+
+    def publicar(self, id_evento, mensaje):
+        with self._lock:
+            subs = list(self._suscriptores.get(id_evento, ()))
+        for sub in subs:
+            try:
+                sub.cola.put_nowait(mensaje)
+            except queue.Full:
+                # Panel que no está leyendo: no detenemos al resto por él
+                pass
+
+
+# =====================================
+# Backend Redis (pub/sub)
+# =====================================
+class _RedisSuscripcion:
+    def __init__(self, r, canal):
+        self.pubsub = r.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(canal)
+
+    def siguiente(self, timeout):
+        msg = self.pubsub.get_message(timeout=timeout)
+        if not msg:
+            return None
+        return json.loads(msg["data"])
+
+    def cerrar(self):
+        try:
+            self.pubsub.close()
+        except Exception:
+            pass
+
+
+class _RedisBroker:
+    PREFIJO = "agfi:eventos"
+
+    def __init__(self, url):
+        import redis
+        self.r = redis.Redis.from_url(url)
+
+    def _canal(self, id_evento):
+        return f"{self.PREFIJO}:{id_evento}"
+
+    def suscribir(self, id_evento):
+        return _RedisSuscripcion(self.r, self._canal(id_evento))
+
+    def publicar(self, id_evento, mensaje):
+        self.r.publish(self._canal(id_evento), json.dumps(mensaje))
+
+
+def _crear_broker():
+    if REDIS_URL:
+        try:
+            return _RedisBroker(REDIS_URL)
+        except Exception as e:
+            print(f"[WARN] No se pudo usar Redis para los avisos en vivo, se usa memoria: {e}")
+    return _MemoriaBroker()
+
+
+_broker = _crear_broker()
+
+
+# =====================================
+# API pública
+# =====================================
+def suscribir(id_evento):
+    """
+    Devuelve una suscripción con .siguiente(timeout) y .cerrar().
+    Quien la abre debe cerrarla (p. ej. en el finally del stream).
+    """
+    return _broker.suscribir(int(id_evento))
+
+
+def publicar(id_evento, mensaje):
+    """Envía `mensaje` (dict serializable a JSON) a los paneles del evento."""
+    try:
+        _broker.publicar(int(id_evento), mensaje)
+    except Exception as e:
+        print(f"[WARN] No se pudo publicar el aviso del evento {id_evento}: {e}")
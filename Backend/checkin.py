@@ -0,0 +1,517 @@
+from datetime import datetime, timedelta
+import threading
+
+from sqlalchemy import String, DateTime, Integer, case, cast, func, literal, select, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import (
+    db,
+    Persona,
+    Asistente,
+    Evento,
+    Registro,
+    Asistencia,
+)
+import broker
+import estadisticas
+import pase_lista
+import roster_cache
+
+# Máximo de escaneos aceptados en un solo POST de sincronización
+MAX_SCANS_LOTE = 1000
+
+# Un escaneo offline más viejo que esto (o anterior al día del evento)
+# se toma como reloj del teléfono mal puesto y se usa la hora del servidor
+MAX_ANTIGUEDAD_SCAN = timedelta(days=3)
+
+
+# =====================================
+# Helper: parsear código de QR
+# =====================================
+def parse_qr_code_to_id_asistente(code: str):
+    """
+    Recibe el texto leído del QR o lo que se tecleó.
+    Soporta:
+    - 'AGFI-123'
+    - 'agfi-123'
+    - '123' (solo número)
+    Devuelve id_asistente (int) o None si no se puede parsear.
+    """
+    if not code:
+        return None
+    s = str(code).strip()
+    if not s:
+        return None
+
+    # Si viene con prefijo AGFI-
+    if s.upper().startswith("AGFI-"):
+        s = s.split("-", 1)[1].strip()
+
+    try:
+        return int(s)
+    except ValueError:
+        return None
+
+
+def _parse_client_ts(valor, ahora):
+    """
+    Convierte la hora en que el teléfono leyó el QR.
+    Acepta ISO 8601 ('2025-11-20T19:05:00', con o sin 'Z')
+    o epoch en segundos / milisegundos.
+    Si no viene, no se entiende, está en el futuro o es más viejo que
+    MAX_ANTIGUEDAD_SCAN, se usa la hora del servidor.
+    """
+    if valor in (None, "") or isinstance(valor, bool):
+        return ahora
+
+    ts = None
+    if isinstance(valor, (int, float)):
+        segundos = valor / 1000 if valor > 1e11 else valor
+        try:
+            ts = datetime.utcfromtimestamp(segundos)
+        except (OverflowError, OSError, ValueError):
+            ts = None
+    else:
+        s = str(valor).strip()
+        if s.endswith("Z"):
+            s = s[:-1] + "+00:00"
+        try:
+            ts = datetime.fromisoformat(s)
+        except ValueError:
+            ts = None
+        if ts is not None and ts.tzinfo is not None:
+            ts = datetime.utcfromtimestamp(ts.timestamp())
+
+    if ts is None or ts > ahora or ts < ahora - MAX_ANTIGUEDAD_SCAN:
+        return ahora
+    return ts
+
+
+def _resultado(indice, scan, estado, ok, message, **extra):
+    res = {
+        "indice": indice,
+        "id_evento": scan.get("id_evento") if isinstance(scan, dict) else None,
+        "code": scan.get("code") if isinstance(scan, dict) else None,
+        "ok": ok,
+        "estado": estado,
+        "message": message,
+    }
+    res.update(extra)
+    return res
+
+
+# =====================================
+# Check-in en lote (sincronización offline de los escáneres)
+# =====================================
+def registrar_checkins_lote(scans, ahora=None):
+    """
+    Registra de una sola vez los escaneos que un teléfono guardó sin red.
+
+    Cada scan es un dict con:
+    - id_evento (obligatorio)
+    - code (AGFI-123 o '123') o id_asistente
+    - ts (hora del escaneo en el cliente, opcional)
+
+    Los eventos y asistentes se validan con consultas por conjunto (IN),
+    no una por escaneo, y todos los check-ins se escriben con los mismos
+    dos upserts de registrar_checkins, en una sola transacción.
+
+    Devuelve {"resumen": {...}, "resultados": [...]}, con un resultado por
+    scan en el mismo orden en que llegaron.
+    """
+    ahora = ahora or datetime.utcnow()
+    resultados = [None] * len(scans)
+
+    # ---- 1) Normalizar escaneos ----
+    validos = []   # (indice, scan, id_evento, id_asistente, ts)
+    for i, scan in enumerate(scans):
+        if not isinstance(scan, dict):
+            resultados[i] = _resultado(i, scan, "invalido", False, "Formato de escaneo inválido.")
+            continue
+
+        try:
+            id_evento = int(scan.get("id_evento"))
+        except (TypeError, ValueError):
+            resultados[i] = _resultado(i, scan, "invalido", False, "id_evento inválido.")
+            continue
+
+        id_asistente = scan.get("id_asistente")
+        if id_asistente is None:
+            id_asistente = parse_qr_code_to_id_asistente(scan.get("code"))
+        try:
+            id_asistente = int(id_asistente)
+        except (TypeError, ValueError):
+            resultados[i] = _resultado(i, scan, "codigo_invalido", False, "Código QR inválido.")
+            continue
+
+        ts = _parse_client_ts(scan.get("ts"), ahora)
+        validos.append((i, scan, id_evento, id_asistente, ts))
+
+    if not validos:
+        return {"resumen": _resumir(resultados), "resultados": resultados}
+
+    ids_eventos = {v[2] for v in validos}
+    ids_asistentes = {v[3] for v in validos}
+
+    # ---- 2) Eventos y asistentes existentes (una consulta cada uno) ----
+    eventos_existentes = {
+        row[0]: row[1] for row in
+        db.session.query(Evento.id_evento, Evento.fecha_inicio)
+        .filter(Evento.id_evento.in_(ids_eventos))
+    }
+    asistentes_existentes = {
+        row[0] for row in
+        db.session.query(Asistente.id_asistente)
+        .join(Persona, Asistente.id_asistente == Persona.id_persona)
+        .filter(Asistente.id_asistente.in_(ids_asistentes))
+    }
+
+    # Antes del día del evento no pudo haber check-in: reloj del teléfono mal puesto
+    for n, (i, scan, id_evento, id_asistente, ts) in enumerate(validos):
+        fecha_inicio = eventos_existentes.get(id_evento)
+        if fecha_inicio is not None and ts.date() < fecha_inicio.date() - timedelta(days=1):
+            validos[n] = (i, scan, id_evento, id_asistente, ahora)
+
+    # ---- 3) Filtrar inválidos y duplicados dentro del lote ----
+    # Si la misma persona viene varias veces, gana el escaneo más antiguo.
+    pendientes = {}   # (id_evento, id_asistente) -> (indice, scan, ts)
+    for i, scan, id_evento, id_asistente, ts in sorted(validos, key=lambda v: v[4]):
+        if id_evento not in eventos_existentes:
+            resultados[i] = _resultado(i, scan, "evento_no_encontrado", False, "Evento no encontrado.")
+            continue
+        if id_asistente not in asistentes_existentes:
+            resultados[i] = _resultado(i, scan, "asistente_no_encontrado", False,
+                                       "Asistente no encontrado.", id_asistente=id_asistente)
+            continue
+
+        clave = (id_evento, id_asistente)
+        if clave in pendientes:
+            resultados[i] = _resultado(i, scan, "duplicado_en_lote", True,
+                                       "Escaneo repetido dentro del mismo lote.",
+                                       id_asistente=id_asistente)
+            continue
+        pendientes[clave] = (i, scan, ts)
+
+    if pendientes:
+        detalles = registrar_checkins(
+            [(e, a, ts) for (e, a), (_i, _scan, ts) in pendientes.items()],
+            ahora
+        )
+        for clave, (i, scan, _ts) in pendientes.items():
+            det = detalles[clave]
+            if det["asistencia_creada"]:
+                estado, message = "registrado", "Asistencia registrada."
+            else:
+                estado, message = "ya_registrado", "El asistente ya tenía asistencia registrada."
+            resultados[i] = _resultado(
+                i, scan, estado, True, message,
+                id_asistente=clave[1],
+                id_registro=det["id_registro"],
+                hora_entrada=det["hora_entrada"].isoformat() if det["hora_entrada"] else None,
+                registro_creado=det["registro_creado"],
+            )
+
+    db.session.commit()
+
+    # Los escaneos cambiaron el estado de esas personas en el roster en caché
+    for id_evento, id_asistente in pendientes:
+        roster_cache.invalidar_asistente(id_asistente, id_evento)
+    if pendientes:
+        publicar_checkins(detalles, origen="lote")
+
+    return {"resumen": _resumir(resultados), "resultados": resultados}
+
+
+# =====================================
+# Upserts de Registro + Asistencia
+# =====================================
+def _al_segundo(dt):
+    # MySQL guarda TIMESTAMP/DATETIME sin fracciones: normalizamos para poder comparar
+    return dt.replace(microsecond=0)
+
+
+def insert_upsert(tabla):
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto in ("mysql", "mariadb"):
+        return mysql_insert(tabla)
+    if dialecto == "sqlite":
+        return sqlite_insert(tabla)
+    raise NotImplementedError(f"Upsert no soportado para el dialecto {dialecto}")
+
+
+def on_conflict(stmt, claves, actualizar):
+    """
+    Si el INSERT choca con la llave única `claves`, actualiza en vez de fallar:
+    - MySQL:  INSERT ... ON DUPLICATE KEY UPDATE
+    - SQLite: INSERT ... ON CONFLICT (...) DO UPDATE   (pruebas locales)
+
+    `actualizar` recibe el namespace con los valores que se intentaron insertar
+    y devuelve una lista (columna, expresión). En MySQL las asignaciones se
+    aplican en ese orden y cada una ve el valor ya actualizado de las anteriores.
+    """
+    if hasattr(stmt, "on_duplicate_key_update"):
+        return stmt.on_duplicate_key_update(actualizar(stmt.inserted))
+    return stmt.on_conflict_do_update(
+        index_elements=claves,
+        set_=dict(actualizar(stmt.excluded))
+    )
+
+
+# Contadores por proceso de los upserts que cayeron sobre una fila ya existente
+_contadores = {
+    "registros_insertados": 0,
+    "registros_conflicto": 0,
+    "asistencias_insertadas": 0,
+    "asistencias_conflicto": 0,
+}
+_contadores_lock = threading.Lock()
+
+
+def contadores_upsert():
+    """Copia de los contadores de inserciones / conflictos de este proceso."""
+    with _contadores_lock:
+        return dict(_contadores)
+
+
+def registrar_checkins(filas, ahora=None, comentarios=None):
+    """
+    Marca asistencia para una o muchas personas de forma idempotente.
+
+    filas: lista de (id_evento, id_asistente, hora_entrada o None)
+
+    Las escrituras son dos sentencias sin importar cuántas filas sean:
+    1) INSERT registros ... ON DUPLICATE KEY UPDATE  (asistencia='si', confirmado)
+    2) INSERT asistencia ... SELECT FROM registros ... ON DUPLICATE KEY UPDATE
+    asistencia.escaneos cuenta cuántas veces se ha escaneado a la persona; es
+    lo que permite saber si esta llamada insertó la fila o chocó con una
+    existente, y con eso se cuenta el check_in.
+
+    No es un límite de dos sentencias en total. Una llamada hace además:
+    el flush de cambios ORM pendientes, una lectura de qué registros ya
+    existen, un SELECT ... FOR UPDATE de esos registros (sólo si hay) para
+    el RSVP previo, la lectura del estado final y el UPDATE de evento_stats.
+    MySQL no tiene RETURNING en el upsert, así que el (asistencia,
+    confirmado) anterior de registros, que evento_stats necesita, no se
+    puede sacar de la escritura misma.
+
+    Como la escritura es un upsert (no depende de esa lectura), dos puertas
+    escaneando a la misma persona al mismo tiempo terminan en el mismo
+    Registro/Asistencia en vez de chocar con uq_reg_evento_asistente /
+    uq_asistencia_registro.
+
+    No hace commit. Devuelve {(id_evento, id_asistente): detalles}.
+    """
+    ahora = _al_segundo(ahora or datetime.utcnow())
+    filas = [(int(e), int(a), _al_segundo(ts or ahora)) for e, a, ts in filas]
+    if not filas:
+        return {}
+    claves = [(e, a) for e, a, _ts in filas]
+
+    # Cambios ORM pendientes (persona nueva, asistente, etc.) van antes que las FKs
+    db.session.flush()
+
+    reg = Registro.__table__
+    asi = Asistencia.__table__
+    en_claves = tuple_(reg.c.id_evento, reg.c.id_asistente).in_(claves)
+
+    # ---- 0) Estado previo, para los contadores de evento_stats ----
+    # Sólo se bloquean (FOR UPDATE) filas que ya existen, por llave primaria:
+    # en InnoDB un FOR UPDATE sobre (id_evento, id_asistente) que todavía no
+    # existe toma un gap lock, y dos puertas con el mismo asistente nuevo (o
+    # un lote que se cruza con escaneos sueltos) terminaban en deadlock 1213
+    # al insertar. Así otra puerta que escanee a una persona ya registrada
+    # espera a que terminemos y los dos no cuentan el mismo cambio.
+    ids_registro = sorted(
+        row[0] for row in db.session.execute(select(reg.c.id_registro).where(en_claves))
+    )
+
+    previos = {}
+    if ids_registro:
+        previos = {
+            (fila.id_evento, fila.id_asistente): fila
+            for fila in db.session.execute(
+                select(
+                    reg.c.id_registro,
+                    reg.c.id_evento,
+                    reg.c.id_asistente,
+                    reg.c.asistencia,
+                    reg.c.confirmado,
+                )
+                .where(reg.c.id_registro.in_(ids_registro))
+                .with_for_update()
+            )
+        }
+
+    # ---- 1) Registro ----
+    # Con fracciones y tomada aquí (no en `ahora`), para el cursor delta
+    actualizado_en = pase_lista.marca_cambio()
+    stmt = insert_upsert(reg).values([
+        {
+            "id_evento": e,
+            "id_asistente": a,
+            "asistencia": "si",
+            "invitados": 0,
+            "confirmado": True,
+            "fecha_confirmacion": ts,
+            "comentarios": comentarios,
+            "creado_en": ahora,
+            "actualizado_en": actualizado_en,
+        }
+        for e, a, ts in filas
+    ])
+    stmt = on_conflict(stmt, ["id_evento", "id_asistente"], lambda nuevo: [
+        # fecha antes que confirmado: en MySQL la CASE debe ver el confirmado original
+        ("fecha_confirmacion", case(
+            (reg.c.confirmado.is_(None), nuevo.fecha_confirmacion),
+            else_=reg.c.fecha_confirmacion
+        )),
+        ("confirmado", func.coalesce(reg.c.confirmado, True)),
+        ("asistencia", "si"),
+        ("actualizado_en", actualizado_en),
+    ])
+    db.session.execute(stmt)
+
+    # ---- 2) Asistencia física ----
+    horas = {ts for _e, _a, ts in filas}
+    if len(horas) == 1:
+        hora_entrada = literal(horas.pop(), DateTime)
+    else:
+        hora_entrada = case(*[
+            ((reg.c.id_evento == e) & (reg.c.id_asistente == a), ts)
+            for e, a, ts in filas
+        ])
+
+    origen = (
+        select(
+            reg.c.id_registro,
+            hora_entrada,
+            literal("AGFI-", String) + cast(reg.c.id_asistente, String),
+            literal(1, Integer),
+            literal(ahora, DateTime),
+            literal(actualizado_en, DateTime),
+        )
+        .where(en_claves)
+    )
+    stmt = insert_upsert(asi).from_select(
+        ["id_registro", "hora_entrada", "codigo_gafete", "escaneos", "creado_en", "actualizado_en"],
+        origen
+    )
+    stmt = on_conflict(stmt, ["id_registro"], lambda nuevo: [
+        ("hora_entrada", func.coalesce(asi.c.hora_entrada, nuevo.hora_entrada)),
+        ("codigo_gafete", func.coalesce(asi.c.codigo_gafete, nuevo.codigo_gafete)),
+        ("escaneos", asi.c.escaneos + 1),
+        ("actualizado_en", nuevo.actualizado_en),
+    ])
+    db.session.execute(stmt)
+
+    # ---- Estado final (una lectura) ----
+    estado = db.session.execute(
+        select(
+            reg.c.id_evento,
+            reg.c.id_asistente,
+            reg.c.id_registro,
+            asi.c.id_asistencia,
+            asi.c.hora_entrada,
+            asi.c.escaneos,
+        )
+        .select_from(reg.join(asi, asi.c.id_registro == reg.c.id_registro))
+        .where(en_claves)
+    )
+
+    detalles = {}
+    deltas = {}
+    for fila in estado:
+        clave = (fila.id_evento, fila.id_asistente)
+        previo = previos.get(clave)
+        # escaneos == 1 sólo para quien insertó la Asistencia: cualquier
+        # escaneo posterior (aunque sea en el mismo segundo) pasa por el UPDATE.
+        asistencia_creada = fila.escaneos == 1
+        registro_creado = asistencia_creada and previo is None
+        detalles[clave] = {
+            "id_registro": fila.id_registro,
+            "id_asistencia": fila.id_asistencia,
+            "hora_entrada": fila.hora_entrada,
+            "registro_creado": registro_creado,
+            "asistencia_creada": asistencia_creada,
+            "escaneos": fila.escaneos,
+        }
+
+        # Sin estado previo y sin haberlo creado nosotros: lo creó (y lo
+        # contó) un escaneo concurrente.
+        if previo is not None:
+            confirmado = True if previo.confirmado is None else previo.confirmado
+            delta = estadisticas.delta_rsvp(
+                (previo.asistencia, previo.confirmado), ("si", confirmado)
+            )
+        elif registro_creado:
+            delta = estadisticas.delta_rsvp(None, ("si", True))
+        else:
+            delta = {}
+        # Asistencia sólo se crea al escanear (siempre con hora_entrada):
+        # el check_in lo cuenta quien la insertó
+        if asistencia_creada:
+            delta["check_in"] = delta.get("check_in", 0) + 1
+
+        acumulado = deltas.setdefault(fila.id_evento, {})
+        for campo, n in delta.items():
+            acumulado[campo] = acumulado.get(campo, 0) + n
+
+    estadisticas.aplicar_deltas(deltas)
+
+    with _contadores_lock:
+        for det in detalles.values():
+            if det["registro_creado"]:
+                _contadores["registros_insertados"] += 1
+            else:
+                _contadores["registros_conflicto"] += 1
+            if det["asistencia_creada"]:
+                _contadores["asistencias_insertadas"] += 1
+            else:
+                _contadores["asistencias_conflicto"] += 1
+
+    return detalles
+
+
+def publicar_checkins(detalles, origen, **extra):
+    """
+    Avisa a los paneles en vivo (SSE) de los check-ins nuevos.
+    `detalles` es lo que devuelve registrar_checkins. Llamar DESPUÉS del commit.
+    Los re-escaneos no se publican: no cambian nada en el pase de lista.
+    """
+    for (id_evento, id_asistente), det in detalles.items():
+        if not det["asistencia_creada"]:
+            continue
+        mensaje = {
+            "tipo": "check_in",
+            "origen": origen,                 # qr / alta_express / lote
+            "id_evento": id_evento,
+            "id_registro": det["id_registro"],
+            "id_asistente": id_asistente,
+            "hora_entrada": det["hora_entrada"].isoformat() if det["hora_entrada"] else None,
+            "registro_creado": det["registro_creado"],
+            "asistencia_estado": "si",
+            "check_in": True,
+        }
+        mensaje.update(extra)
+        broker.publicar(id_evento, mensaje)
+
+
+def _resumir(resultados):
+    resumen = {
+        "total": len(resultados),
+        "registrados": 0,
+        "ya_registrados": 0,
+        "duplicados": 0,
+        "errores": 0,
+    }
+    for r in resultados:
+        if r["estado"] == "registrado":
+            resumen["registrados"] += 1
+        elif r["estado"] == "ya_registrado":
+            resumen["ya_registrados"] += 1
+        elif r["estado"] == "duplicado_en_lote":
+            resumen["duplicados"] += 1
+        else:
+            resumen["errores"] += 1
+    return resumen
@@ -0,0 +1,105 @@
+"""
+Códigos QR de las credenciales (AGFI-<id_asistente>).
+
+Antes: qrcode.make(texto).resize((300, 300)) en cada credencial, que
+codifica con los valores por defecto y luego reescala con pérdida (los
+módulos quedan de distinto ancho).
+
+Aquí:
+- Se elige la versión más chica que alcanza para el texto y, en esa
+  versión, el nivel de corrección de errores más alto (nunca menos que
+  QR_NIVEL_MINIMO): módulos lo más grandes posible y más tolerancia a
+  credenciales rayadas, sin costo.
+- La matriz (1 px por módulo, con su zona blanca) se memoriza en un LRU;
+  en un lote o en el .png público sólo se codifica una vez por texto.
+- La imagen final se escala por un factor entero (NEAREST) y se centra en
+  el cuadro pedido, así cada módulo queda del mismo tamaño.
+"""
+import os
+from functools import lru_cache
+
+import qrcode
+from qrcode.constants import ERROR_CORRECT_H, ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q
+from PIL import Image
+
+NIVELES = {
+    "L": ERROR_CORRECT_L,
+    "M": ERROR_CORRECT_M,
+    "Q": ERROR_CORRECT_Q,
+    "H": ERROR_CORRECT_H,
+}
+# Del más fuerte al más débil
+_ORDEN_NIVELES = ("H", "Q", "M", "L")
+
+# Nivel mínimo aceptable (qrcode.make usaba M)
+QR_NIVEL_MINIMO = os.environ.get("QR_NIVEL_MINIMO", "M").strip().upper()
+if QR_NIVEL_MINIMO not in NIVELES:
+    QR_NIVEL_MINIMO = "M"
+
+# Módulos blancos alrededor (el estándar pide 4)
+BORDE = 4
+
+QR_CACHE_SIZE = int(os.environ.get("QR_CACHE_SIZE", "10000"))
+
+
+def _codificar(texto, nivel_minimo):
+    mejor = None
+    for nivel in _ORDEN_NIVELES[:_ORDEN_NIVELES.index(nivel_minimo) + 1]:
+        qr = qrcode.QRCode(error_correction=NIVELES[nivel], box_size=1, border=BORDE)
+        qr.add_data(texto)
+        # best_fit sólo calcula la versión; la matriz (y la búsqueda de
+        # máscara, que es lo caro) se arma una vez, ya con el nivel elegido
+        version = qr.best_fit()
+        # En empate de versión se queda el nivel más alto (se probó primero)
+        if mejor is None or version < mejor[0].version:
+            mejor = (qr, nivel)
+    qr, nivel = mejor
+    qr.make(fit=False)
+    return qr, nivel
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def _matriz(texto, nivel_minimo):
+    qr, nivel = _codificar(texto, nivel_minimo)
+    filas = qr.get_matrix()
+    n = len(filas)
+    img = Image.new("1", (n, n))
+    img.putdata([0 if negro else 255 for fila in filas for negro in fila])
+    return img, qr.version, nivel
+
+
+def matriz(texto, nivel_minimo=None):
+    """
+    Imagen '1' con 1 px por módulo (incluye la zona blanca). Es la copia
+    del caché: no se debe modificar.
+    """
+    return _matriz(texto, nivel_minimo or QR_NIVEL_MINIMO)[0]
+
+
+def info(texto, nivel_minimo=None):
+    """{"version", "nivel", "modulos"} del QR que se genera para el texto."""
+    img, version, nivel = _matriz(texto, nivel_minimo or QR_NIVEL_MINIMO)
+    return {"version": version, "nivel": nivel, "modulos": img.width}
+
+
+def imagen(texto, lado, nivel_minimo=None):
+    """
+    QR de lado x lado px: cada módulo mide lado // módulos px y el código
+    va centrado sobre blanco.
+    """
+    base = matriz(texto, nivel_minimo)
+    caja = lado // base.width
+    if caja < 1:
+        return base.resize((lado, lado), Image.NEAREST)
+
+    qr = base.resize((base.width * caja, base.height * caja), Image.NEAREST)
+    if qr.width == lado:
+        return qr
+    lienzo = Image.new("1", (lado, lado), 255)
+    margen = (lado - qr.width) // 2
+    lienzo.paste(qr, (margen, margen))
+    return lienzo
+
+
+def estadisticas_cache():
+    return _matriz.cache_info()._asdict()
@@ -0,0 +1,176 @@
+"""
+Comandos de mantenimiento (flask --app app <comando>).
+"""
+import time
+from concurrent.futures import wait
+
+import click
+from PIL import Image, ImageDraw, ImageFont, features
+
+from models import db
+import credenciales
+import estadisticas
+import retencion_logs
+
+
+def _medir(funcion, n):
+    """ms promedio por llamada."""
+    inicio = time.perf_counter()
+    for i in range(n):
+        funcion(i)
+    return (time.perf_counter() - inicio) * 1000 / n
+
+
+def _datos_prueba(i):
+    return {
+        "id_asistente": 1000 + i,
+        "nombre_completo": f"Asistente de Prueba {i}",
+        "generacion": "2015",
+        "carrera": "Ingeniería Geofísica",
+        "miembro_desde": "2020",
+    }
+
+
+def _bench_pool(n):
+    """
+    Frente + reverso codificados a PNG de `n` credenciales con el pool de
+    zip_evento, con 1 proceso y con CREDENCIALES_WORKERS. Sin caché en
+    disco, para que la segunda corrida no lea lo que escribió la primera.
+    El arranque del pool (spawn + precargar) se mide aparte: en el servidor
+    se paga una sola vez por proceso.
+    """
+    datos = [_datos_prueba(i) for i in range(n)]
+    n_workers = credenciales.CREDENCIALES_WORKERS
+
+    click.echo(f"{n} credenciales con el pool de procesos (frente + reverso, PNG)")
+    tiempos = {}
+    for workers in sorted({1, n_workers}):
+        inicio = time.perf_counter()
+        pool = credenciales._pool(workers)
+        wait([pool.submit(credenciales.precargar) for _ in range(workers)])
+        arranque = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        hechas = sum(len(lote) for lote in
+                     credenciales.renderizar(datos, workers=workers, usar_cache=False))
+        tiempos[workers] = time.perf_counter() - inicio
+        click.echo(f"  {workers:2} proceso(s): {tiempos[workers]:7.2f} s "
+                   f"({hechas / tiempos[workers]:6.1f} credenciales/s; arranque {arranque:.2f} s)")
+
+    if n_workers > 1:
+        click.echo(f"  mejora con {n_workers} procesos: x{tiempos[1] / tiempos[n_workers]:.1f}")
+
+
+def _frente_sin_cache(datos):
+    """El frente como se hacía antes: abrir plantilla y fuente en cada llamada."""
+    front = Image.open(credenciales._ruta(credenciales.PLANTILLA_FRENTE)).convert("RGBA")
+    draw = ImageDraw.Draw(front)
+    font = ImageFont.truetype(credenciales._ruta(credenciales.FUENTE), credenciales.TAMANO_FUENTE)
+    draw.text((600, 280), datos["nombre_completo"], fill="black", font=font)
+    draw.text((600, 350), datos["generacion"], fill="black", font=font)
+    draw.text((830, 350), datos["miembro_desde"], fill="black", font=font)
+    draw.text((600, 425), datos["carrera"], fill="black", font=font)
+    return front
+
+
+def _reverso_sin_cache(datos):
+    back = Image.open(credenciales._ruta(credenciales.PLANTILLA_REVERSO)).convert("RGBA")
+    back.paste(credenciales.imagen_qr(datos["id_asistente"]), (355, 80))
+    return back
+
+
+def register_commands(app):
+
+    @app.cli.command("reconciliar-stats")
+    @click.option("--evento", "id_evento", type=int, default=None,
+                  help="Sólo este evento (por defecto, todos).")
+    def reconciliar_stats(id_evento):
+        """Reconstruye evento_stats desde registros / asistencia / ULM."""
+        ids = [id_evento] if id_evento is not None else None
+        try:
+            n = estadisticas.recalcular_eventos(ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        click.echo(f"evento_stats reconstruido: {n} evento(s).")
+
+    @app.cli.command("bench-credenciales")
+    @click.option("-n", "n", type=int, default=100, show_default=True,
+                  help="Credenciales a generar en cada prueba.")
+    @click.option("--evento", "n_evento", type=int, default=2000, show_default=True,
+                  help="Credenciales del evento simulado para medir el pool (0 = no medir).")
+    def bench_credenciales(n, n_evento):
+        """Tiempo por credencial antes y después del caché de plantillas, y del pool con 1 vs N procesos."""
+        antes = _medir(lambda i: (_frente_sin_cache(_datos_prueba(i)),
+                                  _reverso_sin_cache(_datos_prueba(i))), n)
+
+        credenciales.precargar()
+        despues = _medir(lambda i: (credenciales.render_frente(_datos_prueba(i)),
+                                    credenciales.render_reverso(_datos_prueba(i))), n)
+
+        click.echo(f"{n} credenciales (frente + reverso, sin codificar a PNG)")
+        click.echo(f"  sin caché de plantillas: {antes:8.2f} ms/credencial")
+        click.echo(f"  con caché de plantillas: {despues:8.2f} ms/credencial")
+        click.echo(f"  mejora: x{antes / despues:.1f}")
+
+        if n_evento:
+            _bench_pool(n_evento)
+
+    @app.cli.command("bench-formatos-credenciales")
+    @click.option("-n", "n", type=int, default=20, show_default=True,
+                  help="Credenciales a codificar por formato.")
+    def bench_formatos_credenciales(n):
+        """Bytes y ms de codificación por formato (?format=) de cada imagen."""
+        credenciales.precargar()
+        formatos = [f for f in credenciales.FORMATOS
+                    if f != "webp" or features.check("webp")]
+
+        for tipo in ("gafete", "frente", "reverso"):
+            # El render no se mide: sólo la codificación
+            imagenes = [credenciales._RENDERS[tipo](_datos_prueba(i)) for i in range(n)]
+            click.echo(f"{tipo} ({imagenes[0].width}x{imagenes[0].height}), {n} imágenes")
+            base = None
+            for formato in formatos:
+                tamanos = []
+                ms = _medir(lambda i: tamanos.append(
+                    len(credenciales.codificar(imagenes[i], formato))), n)
+                promedio = sum(tamanos) / n
+                base = base or promedio
+                click.echo(f"  {formato:5} {promedio / 1024:8.1f} KB  {ms:7.2f} ms"
+                           f"  ({promedio / base:6.1%} del PNG)")
+
+    @app.cli.command("logs-particiones")
+    @click.option("--meses-adelante", type=int, default=3, show_default=True,
+                  help="Meses futuros que deben tener ya su partición.")
+    def logs_particiones(meses_adelante):
+        """Crea las particiones mensuales de `logs` que falten (correr cada mes)."""
+        if not retencion_logs.particiones():
+            click.echo("`logs` no está particionada (ver migración 006); nada que hacer.")
+            return
+        nuevas = retencion_logs.asegurar_particiones(meses_adelante)
+        click.echo(f"Particiones creadas: {', '.join(nuevas) if nuevas else 'ninguna'}")
+
+    @app.cli.command("archivar-logs")
+    @click.option("--meses-vivos", type=int, default=None,
+                  help=f"Meses que se quedan en la tabla (default LOGS_MESES_VIVOS={retencion_logs.LOGS_MESES_VIVOS}).")
+    @click.option("--mes", default=None, help="Sólo este mes (YYYY-MM).")
+    @click.option("--formato", type=click.Choice(retencion_logs.FORMATOS), default="jsonl", show_default=True)
+    def archivar_logs(meses_vivos, mes, formato):
+        """Exporta los meses viejos de `logs` a LOGS_ARCHIVO_DIR (gzip) y los quita de la tabla."""
+        if mes:
+            try:
+                resumen = [retencion_logs.archivar_mes(*retencion_logs.parse_mes(mes), formato)]
+            except ValueError as e:
+                raise click.BadParameter(str(e), param_hint="--mes")
+        else:
+            resumen = retencion_logs.archivar(meses_vivos, formato)
+
+        if not resumen:
+            click.echo("No hay meses por archivar.")
+        for r in resumen:
+            if r["archivo"]:
+                click.echo(f"{r['mes']}: {r['renglones']} renglones -> {r['archivo']} "
+                           f"({r['bytes'] / 1024:.1f} KB, {r['metodo']})")
+            else:
+                click.echo(f"{r['mes']}: sin renglones")
@@ -0,0 +1,171 @@
+"""
+Consulta de la bitácora para /admin/logs.
+
+Paginación por keyset sobre (creado_en DESC, id_log DESC): cada página
+es una búsqueda por rango en un índice que empieza con el filtro y sigue
+con (creado_en, id_log), así cuesta lo mismo la página 1 que la 10,000
+aunque la tabla tenga millones de renglones.
+
+Cada filtro de igualdad tiene su índice (migraciones 005 y 007). Si
+vienen varios, manda el primero de FILTROS_INDICE (el más selectivo) y
+los demás se revisan sobre ese rango. En MySQL se fuerza el índice con
+USE INDEX para que el optimizador no se vaya por otro.
+
+Sólo lee la tabla (los meses vivos); los meses archivados están en
+/admin/logs/mes/<YYYY-MM> (retencion_logs.py).
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select
+
+from models import db, Log
+
+# (parámetro, columna, índice), del más selectivo al menos
+FILTROS_INDICE = (
+    ("id_evento", "id_evento", "idx_logs_evento_creado"),
+    ("id_asistente", "id_asistente", "idx_logs_asistente_creado"),
+    ("id_actor", "id_actor", "idx_logs_actor_creado"),
+    ("actor", "actor", "idx_logs_correo_creado"),
+    ("ip", "ip", "idx_logs_ip_creado"),
+    ("codigo", "codigo_accion", "idx_logs_codigo_creado"),
+)
+INDICE_SIN_FILTRO = "idx_logs_creado"
+
+_ENTEROS = {"id_evento", "id_asistente", "id_actor"}
+
+LIMIT_DEFAULT = 100
+MAX_LIMIT = 1000
+# Renglones por consulta al exportar en NDJSON
+BLOQUE_NDJSON = 1000
+
+
+def cursor_log(creado_en, id_log):
+    return f"{creado_en.isoformat()}|{id_log}"
+
+
+def parse_cursor_log(valor):
+    """'2026-10-01T12:00:00|345' -> (datetime, 345)."""
+    try:
+        fecha, id_log = str(valor).rsplit("|", 1)
+        return _iso_utc(fecha), int(id_log)
+    except ValueError:
+        raise ValueError("Cursor 'after' inválido.")
+
+
+def _iso_utc(valor):
+    """
+    ISO 8601 a datetime naive en UTC, como logs.creado_en.
+    Con zona ('Z', '-06:00') se convierte a UTC, igual que checkin._parse_client_ts.
+    """
+    s = str(valor).strip()
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    fecha = datetime.fromisoformat(s)
+    if fecha.tzinfo is not None:
+        fecha = datetime.utcfromtimestamp(fecha.timestamp())
+    return fecha
+
+
+def _fecha(valor, nombre):
+    try:
+        return _iso_utc(valor)
+    except ValueError:
+        raise ValueError(f"'{nombre}' debe ser fecha ISO (YYYY-MM-DD o YYYY-MM-DDTHH:MM:SS).")
+
+
+def parse_filtros(args):
+    """
+    Filtros de la petición: {columna: valor} de igualdad más 'desde' /
+    'hasta' (datetime, [desde, hasta)). Lanza ValueError si algo no se
+    entiende.
+    """
+    filtros = {}
+    for parametro, columna, _ in FILTROS_INDICE:
+        valor = (args.get(parametro) or "").strip()
+        if not valor:
+            continue
+        if parametro in _ENTEROS:
+            try:
+                valor = int(valor)
+            except ValueError:
+                raise ValueError(f"'{parametro}' debe ser un número.")
+        filtros[columna] = valor
+
+    for nombre in ("desde", "hasta"):
+        if args.get(nombre):
+            filtros[nombre] = _fecha(args.get(nombre).strip(), nombre)
+    return filtros
+
+
+def indice_para(filtros):
+    """Nombre del índice que resuelve la consulta con estos filtros."""
+    for _, columna, indice in FILTROS_INDICE:
+        if columna in filtros:
+            return indice
+    return INDICE_SIN_FILTRO
+
+
+def _consulta(filtros, after=None, limit=None):
+    tabla = Log.__table__
+    query = select(tabla).with_hint(tabla, f"USE INDEX ({indice_para(filtros)})", "mysql")
+
+    for columna, valor in filtros.items():
+        if columna == "desde":
+            query = query.where(tabla.c.creado_en >= valor)
+        elif columna == "hasta":
+            query = query.where(tabla.c.creado_en < valor)
+        else:
+            query = query.where(tabla.c[columna] == valor)
+
+    if after:
+        fecha, id_log = after
+        query = query.where(or_(
+            tabla.c.creado_en < fecha,
+            and_(tabla.c.creado_en == fecha, tabla.c.id_log < id_log),
+        ))
+    query = query.order_by(tabla.c.creado_en.desc(), tabla.c.id_log.desc())
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def log_json(fila):
+    return {
+        columna: valor.isoformat() if isinstance(valor, datetime) else valor
+        for columna, valor in fila.items()
+    }
+
+
+def listar(filtros, limit=LIMIT_DEFAULT, after=None):
+    """
+    (logs, siguiente): una página, del más nuevo al más viejo. `siguiente`
+    es el cursor para ?after= o None si ya no hay más.
+    Lanza ValueError si el cursor no se entiende.
+    """
+    cursor = parse_cursor_log(after) if after else None
+    # Uno de más para saber si hay otra página
+    filas = db.session.execute(_consulta(filtros, cursor, limit + 1)).mappings().all()
+
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = cursor_log(filas[-1]["creado_en"], filas[-1]["id_log"])
+    return [log_json(f) for f in filas], siguiente
+
+
+def iterar(filtros, after=None, bloque=BLOQUE_NDJSON):
+    """
+    Todos los logs que cumplen los filtros, por páginas de `bloque`
+    (cada una es una consulta corta: no se deja abierto un cursor de
+    millones de renglones).
+    """
+    cursor = parse_cursor_log(after) if after else None
+    while True:
+        filas = db.session.execute(_consulta(filtros, cursor, bloque)).mappings().all()
+        for fila in filas:
+            yield log_json(fila)
+        if len(filas) < bloque:
+            return
+        cursor = (filas[-1]["creado_en"], filas[-1]["id_log"])
+        # Suelta la conexión entre páginas
+        db.session.commit()
@@ -0,0 +1,580 @@
+"""
+Render de credenciales (gafete con QR, frente y reverso para imprimir).
+
+Antes cada petición volvía a abrir y decodificar 1.png / 2.png, el logo y
+los 740 KB de dejavu-sans.book.ttf. Aquí se decodifican una sola vez por
+proceso (la primera vez que se usan) y cada render trabaja sobre una copia
+en memoria, que es sólo un memcpy.
+
+Las funciones de render reciben datos planos (datos_credencial) y no
+tocan la base, así se pueden llamar igual desde una ruta, un job o un
+proceso aparte.
+
+Las imágenes ya generadas se guardan en disco con nombre = hash de
+(versión de plantillas, tipo, formato, datos). El mismo hash es el ETag:
+si el cliente ya lo tiene se responde 304 sin leer nada, y si no, basta
+leer el archivo. Cada ruta acepta ?format=png|png8|webp|jpeg. Si
+cambia un dato de la persona cambia el hash, así que nunca hay que
+invalidar; los archivos viejos se van por LRU (mtime) al pasar de
+CREDENCIALES_CACHE_MAX_MB.
+
+Las credenciales de todo un evento se generan como job (zip_evento): el
+render se reparte en un pool de procesos (CREDENCIALES_WORKERS, por
+defecto uno por core) y cada lote se escribe al ZIP en cuanto termina.
+El pool se crea la primera vez que se usa y lo comparten todos los jobs
+del proceso: arrancar procesos con spawn cuesta (con `python app.py` cada
+uno vuelve a importar app.py y corre create_app()), así que se paga una
+vez y no en cada job. `flask bench-credenciales` mide 1 vs N procesos.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from io import BytesIO
+
+from flask import Response, send_file
+from PIL import Image, ImageDraw, ImageFont, features
+from sqlalchemy import func, select
+
+from models import db, Persona, Asistente, Registro
+import codigos_qr
+import jobs
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PLANTILLA_FRENTE = "1.png"
+PLANTILLA_REVERSO = "2.png"
+LOGO = "logo_AGFI.png"
+FUENTE = "dejavu-sans.book.ttf"
+TAMANO_FUENTE = 15
+
+QR_LADO = 300
+
+CACHE_DIR = os.environ.get(
+    "CREDENCIALES_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "agfi_credenciales")
+)
+CACHE_MAX_BYTES = int(os.environ.get("CREDENCIALES_CACHE_MAX_MB", "256")) * 1024 * 1024
+# Subir si cambia el código de render (posiciones, tamaños...) para no
+# servir PNG viejos; los cambios en los archivos de plantilla se detectan solos
+VERSION_RENDER = "2"
+
+# Procesos para las credenciales de un evento completo
+CREDENCIALES_WORKERS = int(os.environ.get("CREDENCIALES_WORKERS", "0")) or os.cpu_count() or 1
+# Credenciales por tarea del pool (menos ida y vuelta entre procesos)
+CREDENCIALES_POR_TAREA = 25
+
+# RLock: el gafete base carga el logo mientras se construye
+_lock = threading.RLock()
+_plantillas = {}
+
+# FreeType no es seguro si dos hilos dibujan a la vez con la misma fuente
+_lock_texto = threading.Lock()
+
+# Pools de procesos de este proceso, por número de workers
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# =====================================
+# Registro de plantillas y fuentes
+# =====================================
+def _ruta(nombre):
+    return os.path.join(BASE_DIR, nombre)
+
+
+def _cargar(nombre, constructor):
+    """Decodifica una vez (thread-safe) y guarda la imagen lista para copiar."""
+    img = _plantillas.get(nombre)
+    if img is None:
+        with _lock:
+            img = _plantillas.get(nombre)
+            if img is None:
+                img = constructor()
+                img.load()
+                _plantillas[nombre] = img
+    return img
+
+
+def _plantilla_compartida(nombre):
+    """La imagen decodificada que comparten todos los hilos: no se modifica."""
+    return _cargar(nombre, lambda: Image.open(_ruta(nombre)).convert("RGBA"))
+
+
+def plantilla(nombre):
+    """Copia RGBA de una plantilla PNG (1.png / 2.png)."""
+    return _plantilla_compartida(nombre).copy()
+
+
+@lru_cache(maxsize=8)
+def fuente(nombre=FUENTE, tamano=TAMANO_FUENTE):
+    return ImageFont.truetype(_ruta(nombre), tamano)
+
+
+@lru_cache(maxsize=1)
+def fuente_default():
+    return ImageFont.load_default()
+
+
+def _logo():
+    """Logo ya reducido a 180x180, o None si no se pudo cargar."""
+    def construir():
+        logo = Image.open(_ruta(LOGO)).convert("RGBA")
+        logo.thumbnail((180, 180))
+        return logo
+
+    try:
+        return _cargar(LOGO, construir)
+    except Exception as e:
+        # Si no hay logo, no truena, solo sigue sin él
+        print(f"[WARN] No se pudo cargar {LOGO}: {e}")
+        return None
+
+
+def _base_gafete():
+    """Fondo blanco del gafete con logo y etiquetas fijas."""
+    def construir():
+        card = Image.new("RGB", (600, 900), "white")
+        logo = _logo()
+        if logo is not None:
+            card.paste(logo, (40, 40), logo)
+        draw = ImageDraw.Draw(card)
+        font = fuente_default()
+        draw.text((40, 250), "Nombre:", font=font, fill="black")
+        draw.text((40, 330), "Generación:", font=font, fill="black")
+        draw.text((40, 410), "Carrera:", font=font, fill="black")
+        return card
+
+    return _cargar("gafete", construir).copy()
+
+
+def precargar():
+    """Decodifica todo de una vez (p. ej. al arrancar un worker)."""
+    plantilla(PLANTILLA_FRENTE)
+    plantilla(PLANTILLA_REVERSO)
+    fuente()
+    fuente_default()
+    _base_gafete()
+
+
+# =====================================
+# Render
+# =====================================
+def datos_credencial(asistente, persona):
+    """Lo único de la base que necesita el render, como dict simple."""
+    return {
+        "id_asistente": int(asistente.id_asistente),
+        "nombre_completo": persona.nombre_completo or "",
+        "generacion": asistente.generacion or "",
+        "carrera": persona.carrera or "",
+        "miembro_desde": persona.creado_en.strftime("%Y") if persona.creado_en else "",
+    }
+
+
+def codigo_qr(id_asistente):
+    return f"AGFI-{id_asistente}"
+
+
+def imagen_qr(id_asistente):
+    """QR de QR_LADO px, sin reescalado con pérdida (ver codigos_qr)."""
+    return codigos_qr.imagen(codigo_qr(id_asistente), QR_LADO)
+
+
+def render_gafete(datos):
+    """Gafete 600x900 (RGB) de /admin/credencial/<id>.png."""
+    card = _base_gafete()
+    width, height = card.size
+    draw = ImageDraw.Draw(card)
+    font = fuente_default()
+
+    # QR en la parte baja, con el código debajo
+    qr_img = imagen_qr(datos["id_asistente"])
+    qr_x = (width - qr_img.width) // 2
+    qr_y = height - qr_img.height - 80
+    card.paste(qr_img, (qr_x, qr_y))
+
+    with _lock_texto:
+        draw.text((40, 280), datos["nombre_completo"], font=font, fill="black")
+        draw.text((40, 360), datos["generacion"], font=font, fill="black")
+        draw.text((40, 440), datos["carrera"], font=font, fill="black")
+        draw.text((qr_x, qr_y + qr_img.height + 10), codigo_qr(datos["id_asistente"]),
+                  font=font, fill="black")
+    return card
+
+
+# Rectángulo (px de 1.png) donde render_frente escribe los datos
+ZONA_DATOS_FRENTE = (590, 270, 1011, 450)
+
+
+def _texto_frente(draw, datos, dx=0, dy=0):
+    font = fuente()
+    with _lock_texto:
+        draw.text((600 + dx, 280 + dy), datos["nombre_completo"], fill="black", font=font)
+        draw.text((600 + dx, 350 + dy), datos["generacion"], fill="black", font=font)
+        draw.text((830 + dx, 350 + dy), datos["miembro_desde"], fill="black", font=font)
+        draw.text((600 + dx, 425 + dy), datos["carrera"], fill="black", font=font)
+
+
+def render_frente(datos):
+    """Frente de la credencial impresa (plantilla 1.png) con los datos."""
+    front = plantilla(PLANTILLA_FRENTE)
+    _texto_frente(ImageDraw.Draw(front), datos)
+    return front
+
+
+def render_zona_frente(datos):
+    """Sólo el recorte ZONA_DATOS_FRENTE del frente ya con los datos."""
+    x0, y0, _, _ = ZONA_DATOS_FRENTE
+    zona = _plantilla_compartida(PLANTILLA_FRENTE).crop(ZONA_DATOS_FRENTE)
+    _texto_frente(ImageDraw.Draw(zona), datos, dx=-x0, dy=-y0)
+    return zona
+
+
+# Esquina superior izquierda (px de 2.png) del QR en el reverso
+QR_POSICION_REVERSO = (355, 80)
+
+
+def render_reverso(datos):
+    """Reverso (plantilla 2.png) con el QR."""
+    back = plantilla(PLANTILLA_REVERSO)
+    back.paste(imagen_qr(datos["id_asistente"]), QR_POSICION_REVERSO)
+    return back
+
+
+_RENDERS = {
+    "gafete": render_gafete,
+    "frente": render_frente,
+    "reverso": render_reverso,
+}
+
+
+# =====================================
+# Formatos de salida (?format=)
+# =====================================
+FORMATO_DEFAULT = "png"
+
+FORMATOS = {
+    # El de siempre: PNG de color completo
+    "png": {"extension": "png", "mimetype": "image/png"},
+    # PNG con paleta de 256 colores: el QR y el texto quedan nítidos
+    "png8": {"extension": "png", "mimetype": "image/png"},
+    "webp": {"extension": "webp", "mimetype": "image/webp"},
+    # Para el arte del frente; el QR aguanta bien pero mejor png8 / webp
+    "jpeg": {"extension": "jpg", "mimetype": "image/jpeg"},
+}
+
+CALIDAD_WEBP = 85
+CALIDAD_JPEG = 85
+
+
+def parse_formato(args):
+    """?format= (o ?formato=) de la petición. Lanza ValueError si no se conoce."""
+    formato = (args.get("format") or args.get("formato") or FORMATO_DEFAULT).strip().lower()
+    if formato == "jpg":
+        formato = "jpeg"
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no válido: {formato}. Usa {', '.join(FORMATOS)}.")
+    if formato == "webp" and not features.check("webp"):
+        raise ValueError("Este servidor no tiene soporte para WebP.")
+    return formato
+
+
+def codificar(img, formato=FORMATO_DEFAULT):
+    """Bytes de la imagen en el formato pedido."""
+    buffer = BytesIO()
+    if formato == "png8":
+        img.convert("RGB").quantize(colors=256, method=Image.Quantize.FASTOCTREE) \
+            .save(buffer, format="PNG", optimize=True)
+    elif formato == "webp":
+        img.save(buffer, format="WEBP", quality=CALIDAD_WEBP, method=4)
+    elif formato == "jpeg":
+        img.convert("RGB").save(buffer, format="JPEG", quality=CALIDAD_JPEG,
+                                optimize=True, progressive=True)
+    else:
+        img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def nombre_archivo(tipo, id_asistente, formato=FORMATO_DEFAULT):
+    nombres = {"gafete": "credencial", "frente": "credencial_front", "reverso": "credencial_back"}
+    return f"{nombres[tipo]}_{id_asistente}.{FORMATOS[formato]['extension']}"
+
+
+# =====================================
+# Caché en disco (direccionado por contenido)
+# =====================================
+_lock_cache = threading.Lock()
+_tamano_cache = None   # bytes en CACHE_DIR según este proceso (se calcula al primer uso)
+
+
+@lru_cache(maxsize=1)
+def version_plantillas():
+    """Hash de VERSION_RENDER + los archivos de plantilla, logo y fuente."""
+    h = hashlib.sha256(VERSION_RENDER.encode())
+    for nombre in (PLANTILLA_FRENTE, PLANTILLA_REVERSO, LOGO, FUENTE):
+        try:
+            with open(_ruta(nombre), "rb") as f:
+                h.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            h.update(b"-")
+    return h.hexdigest()[:16]
+
+
+def clave(tipo, datos, formato=FORMATO_DEFAULT):
+    """Hash de lo único que determina la imagen; sirve de nombre y de ETag."""
+    contenido = json.dumps([version_plantillas(), tipo, formato, datos], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _ruta_cache(clave_img, formato):
+    return os.path.join(CACHE_DIR, clave_img[:2], f"{clave_img}.{FORMATOS[formato]['extension']}")
+
+
+def _archivos_cache():
+    for raiz, _, archivos in os.walk(CACHE_DIR):
+        for nombre in archivos:
+            ruta = os.path.join(raiz, nombre)
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            yield ruta, st.st_size, st.st_mtime
+
+
+def _podar():
+    """Borra los menos usados (mtime más viejo) hasta quedar en 90% del límite."""
+    global _tamano_cache
+    archivos = sorted(_archivos_cache(), key=lambda a: a[2])
+    total = sum(a[1] for a in archivos)
+    objetivo = CACHE_MAX_BYTES * 0.9
+    for ruta, tamano, _ in archivos:
+        if total <= objetivo:
+            break
+        try:
+            os.remove(ruta)
+            total -= tamano
+        except OSError:
+            pass
+    _tamano_cache = total
+
+
+def _leer_cache(clave_img, formato):
+    ruta = _ruta_cache(clave_img, formato)
+    try:
+        with open(ruta, "rb") as f:
+            contenido = f.read()
+    except OSError:
+        return None
+    try:
+        os.utime(ruta)   # marca de uso para el LRU
+    except OSError:
+        pass
+    return contenido
+
+
+def _guardar_cache(clave_img, formato, contenido):
+    global _tamano_cache
+    ruta = _ruta_cache(clave_img, formato)
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: otro worker nunca ve una imagen a medias
+        tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(contenido)
+        os.replace(tmp, ruta)
+    except OSError as e:
+        print(f"[WARN] No se pudo guardar la credencial en caché: {e}")
+        return
+
+    with _lock_cache:
+        if _tamano_cache is None:
+            _tamano_cache = sum(a[1] for a in _archivos_cache())
+        else:
+            _tamano_cache += len(contenido)
+        if _tamano_cache > CACHE_MAX_BYTES:
+            _podar()
+
+
+def imagen(tipo, datos, formato=FORMATO_DEFAULT):
+    """
+    Bytes de 'gafete' / 'frente' / 'reverso' en el formato pedido. Sale del
+    caché si ya existe; si no, se renderiza y se guarda.
+    """
+    clave_img = clave(tipo, datos, formato)
+    contenido = _leer_cache(clave_img, formato)
+    if contenido is None:
+        contenido = codificar(_RENDERS[tipo](datos), formato)
+        _guardar_cache(clave_img, formato, contenido)
+    return contenido
+
+
+# =====================================
+# Respuestas HTTP (ETag / If-None-Match)
+# =====================================
+def etag_zip(datos, formato=FORMATO_DEFAULT):
+    claves = clave("frente", datos, formato) + clave("reverso", datos, formato)
+    return hashlib.sha256(claves.encode()).hexdigest()
+
+
+def zip_credencial(datos, formato=FORMATO_DEFAULT):
+    """ZIP con frente y reverso (imágenes ya comprimidas: se guardan sin recomprimir)."""
+    id_asistente = datos["id_asistente"]
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        z.writestr(nombre_archivo("frente", id_asistente, formato), imagen("frente", datos, formato))
+        z.writestr(nombre_archivo("reverso", id_asistente, formato), imagen("reverso", datos, formato))
+    return buffer.getvalue()
+
+
+def no_modificado(req, etag):
+    """Respuesta 304 si el cliente ya tiene esta versión, o None."""
+    if etag in req.if_none_match:
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        resp.cache_control.no_cache = True
+        return resp
+    return None
+
+
+def enviar(contenido, etag, mimetype, download_name, as_attachment=False):
+    # no-cache: el navegador guarda la copia pero revalida (barato: 304)
+    resp = send_file(
+        BytesIO(contenido),
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        etag=etag,
+        conditional=False
+    )
+    resp.cache_control.no_cache = True
+    return resp
+
+
+# =====================================
+# Credenciales de un evento completo (pool de procesos)
+# =====================================
+def datos_evento(id_evento):
+    """datos_credencial de todos los registrados del evento, por nombre."""
+    filas = db.session.execute(
+        select(
+            Asistente.id_asistente,
+            Asistente.generacion,
+            Persona.nombre_completo,
+            Persona.carrera,
+            Persona.creado_en,
+        )
+        .select_from(Registro)
+        .join(Asistente, Registro.id_asistente == Asistente.id_asistente)
+        .join(Persona, Asistente.id_asistente == Persona.id_persona)
+        .where(Registro.id_evento == id_evento)
+        .order_by(Persona.nombre_completo.asc(), Asistente.id_asistente.asc())
+    )
+    # Cada fila trae los atributos de Asistente y Persona que usa datos_credencial
+    return [datos_credencial(f, f) for f in filas]
+
+
+def contar_evento(id_evento):
+    """Cuántos registrados tiene el evento (sin cargar sus datos)."""
+    return db.session.execute(
+        select(func.count()).select_from(Registro).where(Registro.id_evento == id_evento)
+    ).scalar() or 0
+
+
+def _render_lote(lote, formato, usar_cache=True):
+    """Corre en un proceso del pool: [(id_asistente, frente, reverso)] en bytes."""
+    if usar_cache:
+        return [
+            (d["id_asistente"], imagen("frente", d, formato), imagen("reverso", d, formato))
+            for d in lote
+        ]
+    return [
+        (d["id_asistente"],
+         codificar(_RENDERS["frente"](d), formato),
+         codificar(_RENDERS["reverso"](d), formato))
+        for d in lote
+    ]
+
+
+def _pool(workers):
+    """Pool de `workers` procesos, creado la primera vez y reutilizado."""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # spawn y no fork: el proceso web tiene hilos (y locks) que no deben copiarse
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=precargar,
+            )
+            _pools[workers] = pool
+        return pool
+
+
+def _descartar_pool(workers, pool):
+    """Un worker murió: el pool ya no sirve y el siguiente uso crea otro."""
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False)
+
+
+def renderizar(datos, formato=FORMATO_DEFAULT, workers=None, usar_cache=True):
+    """
+    Reparte `datos` (datos_credencial) en el pool en lotes de
+    CREDENCIALES_POR_TAREA y va devolviendo cada lote
+    [(id_asistente, frente, reverso)] en el orden en que termina.
+    """
+    workers = workers or CREDENCIALES_WORKERS
+    pool = _pool(workers)
+    pendientes = set()
+    try:
+        pendientes = {
+            pool.submit(_render_lote, datos[i:i + CREDENCIALES_POR_TAREA], formato, usar_cache)
+            for i in range(0, len(datos), CREDENCIALES_POR_TAREA)
+        }
+        while pendientes:
+            listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                yield futuro.result()
+    except BrokenProcessPool:
+        _descartar_pool(workers, pool)
+        raise
+    finally:
+        for futuro in pendientes:
+            futuro.cancel()
+
+
+def zip_evento(id_evento, formato=FORMATO_DEFAULT, progreso=None):
+    """
+    Job: ZIP con frente y reverso de cada registrado del evento, en
+    JOBS_DIR. Los lotes se reparten en el pool de CREDENCIALES_WORKERS
+    procesos y se escriben al ZIP en el orden en que terminan (sólo los
+    lotes en vuelo viven en memoria). Devuelve {"archivo", "mimetype", "credenciales"}.
+    """
+    todos = datos_evento(id_evento)
+    # La sesión no se usa en los procesos del pool; se suelta ya
+    db.session.remove()
+
+    total = len(todos)
+    nombre = f"credenciales_evento_{id_evento}_{uuid.uuid4().hex[:8]}.zip"
+    hechas = 0
+
+    with zipfile.ZipFile(jobs.ruta_archivo(nombre), "w") as z:
+        for lote in renderizar(todos, formato):
+            for id_asistente, frente, reverso in lote:
+                z.writestr(nombre_archivo("frente", id_asistente, formato), frente)
+                z.writestr(nombre_archivo("reverso", id_asistente, formato), reverso)
+                hechas += 1
+            if progreso:
+                progreso(hechas, total)
+
+    if progreso and not total:
+        progreso(0, 0)
+    return {"archivo": nombre, "mimetype": "application/zip", "credenciales": hechas}
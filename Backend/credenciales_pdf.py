@@ -0,0 +1,288 @@
+"""
+PDF para imprenta con las credenciales de un evento.
+
+- Varias credenciales por hoja (A4 o Carta), tamaño real CR80
+  (85.6 x 54 mm; las plantillas son de 1011x639 px a 300 dpi).
+- Marcas de corte en cada esquina.
+- Cada hoja de frentes va seguida de su hoja de reversos, con las
+  columnas espejeadas para que al imprimir dúplex (vuelta por el lado
+  largo) cada reverso caiga detrás de su frente.
+
+El PDF se escribe a mano, hoja por hoja, y se va entregando conforme se
+genera: nunca está completo en memoria. Las plantillas 1.png / 2.png se
+incrustan UNA vez y se reutilizan en todas las hojas; por credencial sólo
+se agrega el recorte del frente con los datos (JPEG) y la matriz del QR
+(1 px por módulo, Flate). Así 3,000 credenciales son unas decenas de MB y se
+generan en segundos.
+"""
+import os
+import uuid
+import zlib
+from io import BytesIO
+
+import codigos_qr
+import credenciales
+import jobs
+
+MM = 72 / 25.4   # puntos PDF por milímetro
+
+PAPELES = {
+    "a4": (210.0, 297.0),
+    "carta": (215.9, 279.4),
+}
+PAPEL_DEFAULT = "a4"
+
+ANCHO_MM = 85.6      # CR80
+ALTO_MM = 53.98
+MARGEN_MM = 10.0
+SEPARACION_MM = 6.0  # espacio entre credenciales (ahí van las marcas)
+MARCA_MM = 4.0       # largo de cada marca de corte
+MARCA_SEP_MM = 1.0   # hueco entre la marca y la orilla
+
+CALIDAD_JPEG = 90
+
+# Hasta cuántas credenciales se genera el PDF en la misma petición; arriba
+# de eso la ruta lo lanza como job para no ocupar un worker por minutos
+PDF_SINCRONO_MAX = int(os.environ.get("CREDENCIALES_PDF_SINCRONO_MAX", "100"))
+
+
+def parse_papel(valor):
+    """'a4' / 'carta' (también 'letter'). Lanza ValueError si no se conoce."""
+    papel = (valor or PAPEL_DEFAULT).strip().lower()
+    if papel == "letter":
+        papel = "carta"
+    if papel not in PAPELES:
+        raise ValueError(f"Papel no válido: {valor}. Usa a4 o carta.")
+    return papel
+
+
+# =====================================
+# Acomodo en la hoja
+# =====================================
+def rejilla(papel):
+    """
+    (ancho_pt, alto_pt, posiciones): esquina inferior izquierda en puntos
+    de cada lugar del frente, por renglones de arriba hacia abajo. La
+    rejilla va centrada, así el espejo del reverso cae en el mismo lugar.
+    """
+    ancho_mm, alto_mm = PAPELES[papel]
+    util_x = ancho_mm - 2 * MARGEN_MM
+    util_y = alto_mm - 2 * MARGEN_MM
+    columnas = max(1, int((util_x + SEPARACION_MM) // (ANCHO_MM + SEPARACION_MM)))
+    renglones = max(1, int((util_y + SEPARACION_MM) // (ALTO_MM + SEPARACION_MM)))
+
+    total_x = columnas * ANCHO_MM + (columnas - 1) * SEPARACION_MM
+    total_y = renglones * ALTO_MM + (renglones - 1) * SEPARACION_MM
+    x0 = (ancho_mm - total_x) / 2
+    y_arriba = alto_mm - (alto_mm - total_y) / 2
+
+    posiciones = []
+    for r in range(renglones):
+        for c in range(columnas):
+            x = x0 + c * (ANCHO_MM + SEPARACION_MM)
+            y = y_arriba - ALTO_MM - r * (ALTO_MM + SEPARACION_MM)
+            posiciones.append((x * MM, y * MM))
+    return ancho_mm * MM, alto_mm * MM, posiciones
+
+
+def _marcas_corte(x, y, w, h):
+    """Operadores PDF de las 8 marcas de corte de un rectángulo."""
+    sep = MARCA_SEP_MM * MM
+    largo = MARCA_MM * MM
+    trazos = []
+    for cx, dx in ((x, -1), (x + w, 1)):
+        for cy, dy in ((y, -1), (y + h, 1)):
+            # horizontal y vertical, hacia afuera de la esquina
+            trazos.append(f"{cx + dx * sep:.2f} {cy:.2f} m {cx + dx * (sep + largo):.2f} {cy:.2f} l S")
+            trazos.append(f"{cx:.2f} {cy + dy * sep:.2f} m {cx:.2f} {cy + dy * (sep + largo):.2f} l S")
+    return trazos
+
+
+# =====================================
+# Escritor de PDF incremental
+# =====================================
+class _EscritorPdf:
+    """
+    Emite objetos PDF en orden y recuerda sus offsets para la tabla xref.
+    El catálogo (1) y el árbol de páginas (2) se reservan al inicio y se
+    escriben al final, cuando ya se conocen todas las páginas.
+    """
+
+    def __init__(self):
+        self.posicion = 0
+        self.offsets = {}
+        self.ultimo = 2
+        self.paginas = []
+
+    def _emitir(self, datos):
+        self.posicion += len(datos)
+        return datos
+
+    def nuevo_id(self):
+        self.ultimo += 1
+        return self.ultimo
+
+    def objeto(self, num, diccionario, stream=None):
+        self.offsets[num] = self.posicion
+        partes = [f"{num} 0 obj\n".encode(), diccionario.encode()]
+        if stream is not None:
+            partes += [b"\nstream\n", stream, b"\nendstream"]
+        partes.append(b"\nendobj\n")
+        return self._emitir(b"".join(partes))
+
+    def encabezado(self):
+        return self._emitir(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def imagen_jpeg(self, img):
+        """Incrusta una imagen RGB como JPEG; devuelve (id, bytes)."""
+        buffer = BytesIO()
+        img.convert("RGB").save(buffer, format="JPEG", quality=CALIDAD_JPEG)
+        datos = buffer.getvalue()
+        num = self.nuevo_id()
+        return num, self.objeto(num, (
+            f"<< /Type /XObject /Subtype /Image /Width {img.width} /Height {img.height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {len(datos)} >>"
+        ), datos)
+
+    def imagen_gris(self, img):
+        """
+        Incrusta una imagen en escala de grises sin pérdida (Flate) y sin
+        suavizado al escalar: para el QR a 1 px por módulo.
+        """
+        datos = zlib.compress(img.convert("L").tobytes())
+        num = self.nuevo_id()
+        return num, self.objeto(num, (
+            f"<< /Type /XObject /Subtype /Image /Width {img.width} /Height {img.height} "
+            f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Interpolate false "
+            f"/Filter /FlateDecode /Length {len(datos)} >>"
+        ), datos)
+
+    def pagina(self, ancho, alto, contenido, xobjects):
+        """Escribe el contenido y la página; xobjects es {nombre: id}."""
+        contenido = zlib.compress(contenido.encode())
+        id_contenido = self.nuevo_id()
+        id_pagina = self.nuevo_id()
+        self.paginas.append(id_pagina)
+        recursos = " ".join(f"/{nombre} {num} 0 R" for nombre, num in xobjects.items())
+        return (
+            self.objeto(id_contenido, f"<< /Filter /FlateDecode /Length {len(contenido)} >>", contenido)
+            + self.objeto(id_pagina, (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {ancho:.2f} {alto:.2f}] "
+                f"/Resources << /XObject << {recursos} >> >> /Contents {id_contenido} 0 R >>"
+            ))
+        )
+
+    def cierre(self):
+        kids = " ".join(f"{p} 0 R" for p in self.paginas)
+        salida = self.objeto(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.paginas)} >>")
+        salida += self.objeto(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+        inicio_xref = self.posicion
+        lineas = [f"xref\n0 {self.ultimo + 1}\n", "0000000000 65535 f \n"]
+        for num in range(1, self.ultimo + 1):
+            lineas.append(f"{self.offsets.get(num, 0):010d} 00000 n \n")
+        lineas.append(f"trailer\n<< /Size {self.ultimo + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n")
+        return salida + self._emitir("".join(lineas).encode())
+
+
+# =====================================
+# Generación
+# =====================================
+def _dibujar(nombre, x, y, w, h):
+    return f"q {w:.2f} 0 0 {h:.2f} {x:.2f} {y:.2f} cm /{nombre} Do Q"
+
+
+def generar_pdf(lista_datos, papel=PAPEL_DEFAULT, reverso=True, marcas=True, progreso=None):
+    """
+    Generador de bytes del PDF. `lista_datos` son datos_credencial (p. ej.
+    credenciales.datos_evento). Cada hoja sale en cuanto se arma.
+    """
+    pdf = _EscritorPdf()
+    ancho_pag, alto_pag, posiciones = rejilla(papel)
+    w, h = ANCHO_MM * MM, ALTO_MM * MM
+    por_hoja = len(posiciones)
+
+    frente = credenciales.plantilla(credenciales.PLANTILLA_FRENTE)
+    escala_x = w / frente.width
+    escala_y = h / frente.height
+
+    def rect_px(x, y, caja):
+        """Rectángulo en puntos de una caja (px de plantilla) dentro de la credencial en (x, y)."""
+        x0, y0, x1, y1 = caja
+        return x + x0 * escala_x, y + h - y1 * escala_y, (x1 - x0) * escala_x, (y1 - y0) * escala_y
+
+    # Plantillas: una sola vez para todo el documento
+    yield pdf.encabezado()
+    id_frente, datos_obj = pdf.imagen_jpeg(frente)
+    yield datos_obj
+    del frente
+    id_reverso = None
+    if reverso:
+        id_reverso, datos_obj = pdf.imagen_jpeg(credenciales.plantilla(credenciales.PLANTILLA_REVERSO))
+        yield datos_obj
+
+    def caja_qr(matriz):
+        """Mismo cuadro que ocupa el QR en el PNG (escala entera, centrado)."""
+        qx, qy = credenciales.QR_POSICION_REVERSO
+        lado = (credenciales.QR_LADO // matriz.width) * matriz.width or credenciales.QR_LADO
+        m = (credenciales.QR_LADO - lado) // 2
+        return qx + m, qy + m, qx + m + lado, qy + m + lado
+    hechas = 0
+
+    for inicio in range(0, len(lista_datos), por_hoja):
+        hoja = lista_datos[inicio:inicio + por_hoja]
+
+        # ---- Frentes ----
+        xobjects = {"TF": id_frente}
+        ops = []
+        for i, datos in enumerate(hoja):
+            x, y = posiciones[i]
+            num, datos_obj = pdf.imagen_jpeg(credenciales.render_zona_frente(datos))
+            yield datos_obj
+            xobjects[f"D{i}"] = num
+            ops.append(_dibujar("TF", x, y, w, h))
+            ops.append(_dibujar(f"D{i}", *rect_px(x, y, credenciales.ZONA_DATOS_FRENTE)))
+        if marcas:
+            ops.append("0 G 0.3 w")
+            for i in range(len(hoja)):
+                ops.extend(_marcas_corte(*posiciones[i], w, h))
+        yield pdf.pagina(ancho_pag, alto_pag, "\n".join(ops), xobjects)
+
+        # ---- Reversos (espejo horizontal para dúplex por el lado largo) ----
+        if reverso:
+            xobjects = {"TR": id_reverso}
+            ops = []
+            for i, datos in enumerate(hoja):
+                x, y = posiciones[i]
+                x = ancho_pag - x - w
+                # La matriz del QR (1 px por módulo): el PDF la escala sin perder nitidez
+                matriz = codigos_qr.matriz(credenciales.codigo_qr(datos["id_asistente"]))
+                num, datos_obj = pdf.imagen_gris(matriz)
+                yield datos_obj
+                xobjects[f"Q{i}"] = num
+                ops.append(_dibujar("TR", x, y, w, h))
+                ops.append(_dibujar(f"Q{i}", *rect_px(x, y, caja_qr(matriz))))
+            if marcas:
+                ops.append("0 G 0.3 w")
+                for i in range(len(hoja)):
+                    x, y = posiciones[i]
+                    ops.extend(_marcas_corte(ancho_pag - x - w, y, w, h))
+            yield pdf.pagina(ancho_pag, alto_pag, "\n".join(ops), xobjects)
+
+        hechas += len(hoja)
+        if progreso:
+            progreso(hechas, len(lista_datos))
+
+    yield pdf.cierre()
+
+
+def pdf_evento(id_evento, papel=PAPEL_DEFAULT, reverso=True, marcas=True, progreso=None):
+    """Job: escribe el PDF del evento en JOBS_DIR hoja por hoja."""
+    lista_datos = credenciales.datos_evento(id_evento)
+    nombre = f"credenciales_evento_{id_evento}_{uuid.uuid4().hex[:8]}.pdf"
+    with open(jobs.ruta_archivo(nombre), "wb") as f:
+        for bloque in generar_pdf(lista_datos, papel, reverso, marcas, progreso):
+            f.write(bloque)
+    if progreso and not lista_datos:
+        progreso(0, 0)
+    return {"archivo": nombre, "mimetype": "application/pdf", "credenciales": len(lista_datos)}
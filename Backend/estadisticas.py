@@ -0,0 +1,226 @@
+"""
+Contadores por evento (tabla evento_stats) y listado de eventos.
+
+Cada ruta que escribe registros / asistencia / invitados ULM actualiza
+evento_stats en su misma transacción:
+
+- Rutas de una persona (RSVP, qr_checkin, alta express, lote):
+  aplicar_deltas() con UPDATE ... SET campo = campo + n.
+- Rutas masivas (crear_evento, importación CSV): recalcular_eventos()
+  vuelve a contar el evento completo.
+
+Leer los conteos de un evento es un fetch por llave primaria; el listado
+de eventos es una sola consulta (página keyset de eventos + evento_stats).
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, case, delete, func, or_, select, update
+
+from models import (
+    db,
+    Evento,
+    EventoStats,
+    Registro,
+    Asistencia,
+    InvitadoULM,
+)
+
+MAX_LIMIT_EVENTOS = 200
+
+CAMPOS = (
+    "invitados",
+    "confirmados",
+    "rsvp_si",
+    "rsvp_no",
+    "rsvp_tal_vez",
+    "check_in",
+    "walk_in",
+)
+
+# registros.asistencia -> columna de evento_stats ('desconocido' no se cuenta)
+_CAMPO_RSVP = {"si": "rsvp_si", "no": "rsvp_no", "tal_vez": "rsvp_tal_vez"}
+
+
+# =====================================
+# Mantenimiento de los contadores
+# =====================================
+def delta_rsvp(antes, despues):
+    """
+    Diferencia de contadores entre dos estados de un registro.
+    `antes` / `despues` son (asistencia, confirmado); None si no existía.
+    """
+    delta = {}
+
+    def sumar(campo, n):
+        if campo:
+            delta[campo] = delta.get(campo, 0) + n
+
+    for estado, signo in ((antes, -1), (despues, 1)):
+        if estado is None:
+            continue
+        asistencia, confirmado = estado
+        sumar("invitados", signo)
+        sumar(_CAMPO_RSVP.get(asistencia), signo)
+        if confirmado is True:
+            sumar("confirmados", signo)
+
+    return {k: v for k, v in delta.items() if v}
+
+
+def aplicar_deltas(deltas):
+    """
+    deltas: {id_evento: {campo: n}}. Suma n a cada campo del evento.
+    Si el evento aún no tiene renglón en evento_stats se cuenta completo.
+    No hace commit: va en la transacción de quien llama, después del flush
+    de sus cambios.
+    """
+    tabla = EventoStats.__table__
+    for id_evento, delta in deltas.items():
+        delta = {k: v for k, v in delta.items() if v}
+        if not delta:
+            continue
+        res = db.session.execute(
+            update(tabla)
+            .where(tabla.c.id_evento == id_evento)
+            .values({campo: tabla.c[campo] + n for campo, n in delta.items()})
+        )
+        if res.rowcount == 0:
+            recalcular_eventos([id_evento])
+
+
+def _query_conteos():
+    """Conteos desde las tablas base, un renglón por evento."""
+    walk_in = (
+        select(func.count())
+        .select_from(InvitadoULM)
+        .where(InvitadoULM.id_evento == Evento.id_evento)
+        .scalar_subquery()
+    )
+
+    def contar_si(condicion):
+        return func.coalesce(func.sum(case((condicion, 1), else_=0)), 0)
+
+    return (
+        select(
+            Evento.id_evento,
+            func.count(Registro.id_registro),
+            contar_si(Registro.confirmado.is_(True)),
+            contar_si(Registro.asistencia == "si"),
+            contar_si(Registro.asistencia == "no"),
+            contar_si(Registro.asistencia == "tal_vez"),
+            func.count(Asistencia.hora_entrada),
+            walk_in,
+        )
+        .select_from(Evento)
+        .outerjoin(Registro, Registro.id_evento == Evento.id_evento)
+        .outerjoin(Asistencia, Asistencia.id_registro == Registro.id_registro)
+        .group_by(Evento.id_evento)
+    )
+
+
+def recalcular_eventos(ids_eventos=None):
+    """
+    Reconstruye evento_stats desde registros / asistencia / invitados ULM
+    para los eventos indicados (o todos). Devuelve cuántos renglones quedaron.
+    No hace commit.
+    """
+    tabla = EventoStats.__table__
+    conteos = _query_conteos()
+    borrar = delete(tabla)
+
+    if ids_eventos is not None:
+        ids_eventos = [int(i) for i in ids_eventos]
+        if not ids_eventos:
+            return 0
+        conteos = conteos.where(Evento.id_evento.in_(ids_eventos))
+        borrar = borrar.where(tabla.c.id_evento.in_(ids_eventos))
+
+    db.session.flush()
+    db.session.execute(borrar)
+    res = db.session.execute(
+        tabla.insert().from_select(["id_evento", *CAMPOS], conteos)
+    )
+    return res.rowcount
+
+
+# =====================================
+# Lectura
+# =====================================
+def stats_json(stats):
+    return {campo: int(getattr(stats, campo) or 0) for campo in CAMPOS}
+
+
+def obtener(id_evento):
+    """Contadores de un evento (fetch por llave primaria) o None."""
+    stats = db.session.get(EventoStats, id_evento)
+    return stats_json(stats) if stats else None
+
+
+def cursor_evento(fecha_inicio, id_evento):
+    return f"{fecha_inicio.isoformat()}|{id_evento}"
+
+
+def parse_cursor_evento(valor):
+    """'2025-11-20T19:00:00|12' -> (datetime, 12)."""
+    try:
+        fecha, id_evento = str(valor).rsplit("|", 1)
+        return datetime.fromisoformat(fecha), int(id_evento)
+    except ValueError:
+        raise ValueError("Cursor 'after' inválido.")
+
+
+def listar_eventos(limit=None, after=None):
+    """
+    Devuelve (eventos, siguiente), en una sola consulta.
+
+    La página de eventos va por keyset (fecha_inicio DESC, id_evento DESC,
+    sobre idx_eventos_fecha) y cada evento se une a su renglón de
+    evento_stats por llave primaria.
+
+    Sin `limit` regresa todos los eventos (compatibilidad con los selects
+    actuales). Con `limit`, `siguiente` es el cursor para pedir la página
+    que sigue con ?after=, o None si ya no hay más.
+    Lanza ValueError si el cursor no se entiende.
+    """
+    query = (
+        select(Evento, EventoStats)
+        .outerjoin(EventoStats, EventoStats.id_evento == Evento.id_evento)
+    )
+    if after:
+        fecha, id_evento = parse_cursor_evento(after)
+        query = query.where(or_(
+            Evento.fecha_inicio < fecha,
+            and_(Evento.fecha_inicio == fecha, Evento.id_evento < id_evento),
+        ))
+    query = query.order_by(Evento.fecha_inicio.desc(), Evento.id_evento.desc())
+    if limit:
+        # Uno de más para saber si hay otra página
+        query = query.limit(limit + 1)
+
+    filas = db.session.execute(query).all()
+
+    siguiente = None
+    if limit and len(filas) > limit:
+        filas = filas[:limit]
+        ultimo = filas[-1][0]
+        siguiente = cursor_evento(ultimo.fecha_inicio, ultimo.id_evento)
+
+    return [_evento_json(ev, stats) for ev, stats in filas], siguiente
+
+
+def _evento_json(ev, stats):
+    data = {
+        "id_evento": ev.id_evento,
+        "codigo": ev.codigo,
+        "nombre": ev.nombre,
+        "fecha": ev.fecha_inicio.strftime("%Y-%m-%d"),
+        "lugar": ev.sede,
+        "direccion": ev.direccion,
+        "ciudad": ev.ciudad,
+        "estado": ev.estado,
+        "pais": ev.pais,
+        "notas": ev.notas,
+    }
+    # Evento sin renglón en evento_stats (falta reconciliar): todo en 0
+    data.update(stats_json(stats) if stats else dict.fromkeys(CAMPOS, 0))
+    return data
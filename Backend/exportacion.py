@@ -0,0 +1,306 @@
+"""
+Exportación del pase de lista (uno o varios eventos) sin cargarlo en memoria.
+
+Las filas se leen con un cursor del lado del servidor (stream_results +
+yield_per) y se escriben en bloques conforme llegan, así la memoria no
+depende del número de filas y el primer byte sale de inmediato.
+
+El XLSX usa un Workbook de openpyxl en modo write_only (cada hoja se va
+escribiendo a disco), una hoja por evento. El .xlsx es un ZIP que sólo se
+puede cerrar al final, así que se arma en un archivo temporal y después
+se envía por bloques.
+
+Las rutas deben envolver el generador con stream_with_context para que la
+sesión de la base siga viva mientras se envía la respuesta.
+"""
+import csv
+import io
+import re
+import tempfile
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from sqlalchemy import select
+
+from models import (
+    db,
+    Persona,
+    Asistente,
+    Rol,
+    Evento,
+    Registro,
+    Asistencia,
+)
+
+# Filas que se piden al cursor por vuelta (y que se escriben por bloque)
+FILAS_POR_BLOQUE = 1000
+
+COLUMNAS = [
+    "id_evento",
+    "codigo_evento",
+    "nombre_evento",
+    "fecha_evento",
+    "id_registro",
+    "id_asistente",
+    "nombre",
+    "correo",
+    "empresa",
+    "rol",
+    "asistencia_estado",
+    "confirmado",
+    "invitados",
+    "comentarios",
+    "check_in",
+]
+
+
+MIMETYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Columnas del XLSX: (encabezado, ancho). Mismo orden que el CSV más la hora
+# de entrada; fechas, booleanos y conteos van con su tipo, no como texto.
+COLUMNAS_XLSX = [
+    ("id_evento", 10),
+    ("codigo_evento", 16),
+    ("nombre_evento", 30),
+    ("fecha_evento", 12),
+    ("id_registro", 11),
+    ("id_asistente", 12),
+    ("nombre", 32),
+    ("correo", 32),
+    ("empresa", 24),
+    ("rol", 14),
+    ("asistencia_estado", 17),
+    ("confirmado", 11),
+    ("invitados", 10),
+    ("comentarios", 40),
+    ("check_in", 10),
+    ("hora_check_in", 20),
+]
+
+# Bytes por chunk al enviar el archivo ya armado
+BLOQUE_ENVIO = 64 * 1024
+
+
+def parse_ids_eventos(args):
+    """
+    ?id_evento=1  /  ?id_evento=1,2,3  /  ?id_evento=1&id_evento=2
+    Devuelve la lista de ids (sin repetir, en el orden recibido).
+    Lanza ValueError si alguno no es número.
+    """
+    ids = []
+    for valor in args.getlist("id_evento"):
+        for parte in str(valor).split(","):
+            parte = parte.strip()
+            if not parte:
+                continue
+            try:
+                id_evento = int(parte)
+            except ValueError:
+                raise ValueError(f"id_evento inválido: {parte}")
+            if id_evento not in ids:
+                ids.append(id_evento)
+    return ids
+
+
+def buscar_eventos(ids_eventos):
+    """{id_evento: Evento} de los que existan, en una consulta."""
+    return {
+        ev.id_evento: ev
+        for ev in Evento.query.filter(Evento.id_evento.in_(ids_eventos))
+    }
+
+
+def nombre_archivo(ids_eventos, extension):
+    if len(ids_eventos) == 1:
+        return f"pase_lista_evento_{ids_eventos[0]}.{extension}"
+    return f"pase_lista_{len(ids_eventos)}_eventos.{extension}"
+
+
+def filas_export(ids_eventos):
+    """
+    Itera las filas del pase de lista de los eventos, en el orden de
+    ids_eventos y por nombre, leyendo con cursor del lado del servidor.
+    Sólo se piden las columnas que se exportan.
+    """
+    query = (
+        select(
+            Evento.id_evento,
+            Evento.codigo,
+            Evento.nombre,
+            Evento.fecha_inicio,
+            Registro.id_registro,
+            Asistente.id_asistente,
+            Persona.nombre_completo,
+            Persona.correo,
+            Persona.empresa,
+            Rol.nombre_rol,
+            Registro.asistencia,
+            Registro.confirmado,
+            Registro.invitados,
+            Registro.comentarios,
+            Asistencia.hora_entrada,
+        )
+        .select_from(Registro)
+        .join(Evento, Evento.id_evento == Registro.id_evento)
+        .join(Asistente, Registro.id_asistente == Asistente.id_asistente)
+        .join(Persona, Asistente.id_asistente == Persona.id_persona)
+        .join(Rol, Asistente.id_rol == Rol.id_rol)
+        .outerjoin(Asistencia, Asistencia.id_registro == Registro.id_registro)
+        .order_by(Persona.nombre_completo.asc())
+        .execution_options(stream_results=True, yield_per=FILAS_POR_BLOQUE)
+    )
+
+    # Un evento a la vez: respeta el orden pedido sin ordenar en memoria
+    for id_evento in ids_eventos:
+        yield from db.session.execute(query.where(Registro.id_evento == id_evento))
+
+
+def _fila_csv(f):
+    return [
+        f.id_evento,
+        f.codigo,
+        f.nombre,
+        f.fecha_inicio.strftime("%Y-%m-%d"),
+        f.id_registro,
+        f.id_asistente,
+        f.nombre_completo or "",
+        f.correo or "",
+        f.empresa or "",
+        f.nombre_rol or "",
+        f.asistencia or "",
+        "" if f.confirmado is None else ("1" if f.confirmado else "0"),
+        f.invitados or 0,
+        (f.comentarios or "").replace("\n", " ").replace("\r", " "),
+        "1" if f.hora_entrada else "0",
+    ]
+
+
+def generar_csv(ids_eventos):
+    """
+    Generador de bytes del CSV (UTF-8 con BOM para que Excel lo abra bien).
+    Cada bloque de FILAS_POR_BLOQUE filas sale como un chunk.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def vaciar():
+        datos = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return datos.encode("utf-8")
+
+    writer.writerow(COLUMNAS)
+    yield b"\xef\xbb\xbf" + vaciar()
+
+    pendientes = 0
+    try:
+        for fila in filas_export(ids_eventos):
+            writer.writerow(_fila_csv(fila))
+            pendientes += 1
+            if pendientes >= FILAS_POR_BLOQUE:
+                yield vaciar()
+                pendientes = 0
+    except Exception as e:
+        # Los encabezados ya salieron: sólo queda registrar y cortar
+        print(f"[WARN] Exportación CSV interrumpida ({ids_eventos}): {e}")
+        raise
+
+    if pendientes:
+        yield vaciar()
+
+
+# =====================================
+# XLSX
+# =====================================
+def _texto_xlsx(valor):
+    """Excel rechaza caracteres de control; se quitan en vez de fallar."""
+    if valor is None:
+        return None
+    return ILLEGAL_CHARACTERS_RE.sub("", valor)
+
+
+def _fila_xlsx(f):
+    return [
+        f.id_evento,
+        f.codigo,
+        _texto_xlsx(f.nombre),
+        f.fecha_inicio.date(),
+        f.id_registro,
+        f.id_asistente,
+        _texto_xlsx(f.nombre_completo),
+        f.correo,
+        _texto_xlsx(f.empresa),
+        f.nombre_rol,
+        f.asistencia,
+        f.confirmado,
+        f.invitados or 0,
+        _texto_xlsx(f.comentarios),
+        f.hora_entrada is not None,
+        f.hora_entrada,
+    ]
+
+
+def _nombre_hoja(evento, usados):
+    """Nombre de hoja válido (<= 31 caracteres, sin []:*?/\\) y sin repetir."""
+    base = re.sub(r"[\[\]:*?/\\\s]+", " ", f"{evento.codigo} {evento.nombre or ''}")
+    base = base.strip()[:31].strip()
+    nombre = base or f"Evento {evento.id_evento}"
+    n = 2
+    while nombre.lower() in usados:
+        sufijo = f" ({n})"
+        nombre = base[:31 - len(sufijo)].strip() + sufijo
+        n += 1
+    usados.add(nombre.lower())
+    return nombre
+
+
+def escribir_xlsx(ids_eventos, eventos, destino):
+    """
+    Escribe el XLSX en `destino` (ruta o archivo binario), una hoja por
+    evento en el orden de ids_eventos. `eventos` es {id_evento: Evento}
+    (lo que regresa buscar_eventos). Las filas van directo del cursor a la
+    hoja: nada se acumula en memoria.
+    """
+    wb = Workbook(write_only=True)
+    usados = set()
+    negrita = Font(bold=True)
+
+    for id_evento in ids_eventos:
+        ws = wb.create_sheet(title=_nombre_hoja(eventos[id_evento], usados))
+        ws.freeze_panes = "A2"
+        for i, (_, ancho) in enumerate(COLUMNAS_XLSX, start=1):
+            ws.column_dimensions[get_column_letter(i)].width = ancho
+
+        encabezado = []
+        for nombre, _ in COLUMNAS_XLSX:
+            celda = WriteOnlyCell(ws, value=nombre)
+            celda.font = negrita
+            encabezado.append(celda)
+        ws.append(encabezado)
+
+        for fila in filas_export([id_evento]):
+            ws.append(_fila_xlsx(fila))
+
+    wb.save(destino)
+
+
+def generar_xlsx(ids_eventos, eventos):
+    """
+    Generador de bytes del XLSX. Se arma en un temporal (el ZIP se cierra
+    al final) y se envía en bloques de BLOQUE_ENVIO.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        try:
+            escribir_xlsx(ids_eventos, eventos, tmp)
+        except Exception as e:
+            print(f"[WARN] Exportación XLSX fallida ({ids_eventos}): {e}")
+            raise
+        tmp.seek(0)
+        while True:
+            bloque = tmp.read(BLOQUE_ENVIO)
+            if not bloque:
+                break
+            yield bloque
@@ -0,0 +1,518 @@
+"""
+Importación del pase de lista desde CSV (compartida por admin y staff).
+
+El archivo no se decodifica completo en memoria: se lee como stream
+(io.TextIOWrapper sobre el archivo subido) y los renglones se procesan en
+lotes de IMPORT_BATCH_SIZE conforme salen del csv.DictReader. Con una
+muestra del inicio se adivinan la codificación (UTF-8, con o sin BOM, o
+el cp1252 que exporta Excel en Windows) y el separador (, ; tab |).
+
+Por cada lote, en vez de 3+ consultas por renglón:
+
+1) Los correos del lote se resuelven a id_asistente con una consulta IN.
+2) Los registros que ya existían se buscan igual.
+3) Se escribe con INSERT ... ON DUPLICATE KEY UPDATE y se hace commit.
+
+Se puede llamar desde la petición o desde un job en segundo plano
+(jobs.py); en ese caso `progreso(procesadas)` reporta el avance.
+"""
+import codecs
+import csv
+import io
+import itertools
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime
+
+from sqlalchemy import select
+
+from models import (
+    db,
+    Persona,
+    Asistente,
+    Registro,
+)
+from checkin import insert_upsert, on_conflict
+import broker
+import estadisticas
+import jobs
+import pase_lista
+import roster_cache
+
+# Renglones por INSERT ... ON DUPLICATE KEY UPDATE (y por commit)
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "500"))
+# Valores por consulta IN al resolver correos / registros
+IMPORT_IN_CHUNK = 1000
+
+ESTADOS_ASISTENCIA = ("si", "no", "tal_vez", "desconocido")
+
+# Bytes del inicio que se leen para adivinar codificación y separador
+MUESTRA_BYTES = 64 * 1024
+SEPARADORES = ",;\t|"
+# Si la muestra no es UTF-8 válido se asume export de Excel en Windows
+CODIFICACION_RESPALDO = "cp1252"
+
+
+# =====================================
+# Lectura del archivo (stream)
+# =====================================
+def _detectar_codificacion(muestra):
+    if muestra.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # Incremental: un carácter cortado al final de la muestra no es error
+        codecs.getincrementaldecoder("utf-8")().decode(muestra, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return CODIFICACION_RESPALDO
+
+
+def _detectar_separador(texto):
+    lineas = texto.splitlines()[:20]
+    if not lineas:
+        return ","
+    try:
+        return csv.Sniffer().sniff("\n".join(lineas), delimiters=SEPARADORES).delimiter
+    except csv.Error:
+        # Sniffer no se decide (p. ej. una sola columna): el que más aparezca en el encabezado
+        conteos = {sep: lineas[0].count(sep) for sep in SEPARADORES}
+        mejor = max(conteos, key=conteos.get)
+        return mejor if conteos[mejor] else ","
+
+
+def _normalizar_columnas(columnas):
+    return [(c or "").strip().lower() for c in columnas]
+
+
+def inspeccionar_csv(stream):
+    """
+    Lee sólo una muestra del inicio y regresa el stream a la posición 0.
+    Devuelve (codificacion, separador, columnas).
+    Lanza ValueError si el archivo está vacío o no trae la columna 'correo'.
+    """
+    muestra = stream.read(MUESTRA_BYTES)
+    stream.seek(0)
+    if not muestra:
+        raise ValueError("El archivo CSV está vacío.")
+
+    codificacion = _detectar_codificacion(muestra)
+    texto = muestra.decode(codificacion, errors="replace")
+    separador = _detectar_separador(texto)
+
+    encabezado = next(csv.reader(io.StringIO(texto), delimiter=separador), [])
+    columnas = _normalizar_columnas(encabezado)
+    if "correo" not in columnas:
+        raise ValueError("El CSV debe tener la columna 'correo'.")
+
+    return codificacion, separador, columnas
+
+
+def leer_csv(stream):
+    """
+    Iterador perezoso de renglones (dict con columnas en minúsculas) sobre
+    un archivo binario. Memoria acotada: sólo vive el renglón actual más
+    el buffer del TextIOWrapper.
+    """
+    if not stream.seekable():
+        copia = tempfile.SpooledTemporaryFile(max_size=MUESTRA_BYTES)
+        shutil.copyfileobj(stream, copia)
+        copia.seek(0)
+        stream = copia
+
+    codificacion, separador, _ = inspeccionar_csv(stream)
+    # errors="replace": un byte raro a media importación no debe tirar los
+    # lotes que ya se escribieron
+    texto = io.TextIOWrapper(stream, encoding=codificacion, errors="replace", newline="")
+    try:
+        reader = csv.DictReader(texto, delimiter=separador)
+        reader.fieldnames = _normalizar_columnas(reader.fieldnames or [])
+        yield from reader
+    finally:
+        # Sin cerrar el stream de quien llama
+        texto.detach()
+
+
+def guardar_para_job(file):
+    """Copia el archivo subido a JOBS_DIR para que lo lea un job; devuelve la ruta."""
+    ruta = jobs.ruta_archivo(f"importacion_{uuid.uuid4().hex}.csv")
+    file.stream.seek(0)
+    file.save(ruta)
+    return ruta
+
+
+# =====================================
+# Escritura
+# =====================================
+
+
+def parse_bool(val):
+    if val is None:
+        return None
+    s = str(val).strip().lower()
+    if s in ("1", "true", "t", "sí", "si", "yes", "y"):
+        return True
+    if s in ("0", "false", "f", "no", "n"):
+        return False
+    return None
+
+
+def _bloques(valores, tamano):
+    """Parte cualquier iterable en listas de `tamano` sin materializarlo."""
+    valores = iter(valores)
+    while True:
+        bloque = list(itertools.islice(valores, tamano))
+        if not bloque:
+            return
+        yield bloque
+
+
+def _resolver_correos(correos):
+    """{correo en minúsculas: id_asistente} con consultas IN por bloques."""
+    encontrados = {}
+    for bloque in _bloques(correos, IMPORT_IN_CHUNK):
+        filas = db.session.execute(
+            select(Persona.correo, Asistente.id_asistente)
+            .join(Asistente, Asistente.id_asistente == Persona.id_persona)
+            .where(Persona.correo.in_(bloque))
+        )
+        for correo, id_asistente in filas:
+            encontrados[correo.strip().lower()] = id_asistente
+    return encontrados
+
+
+def _registros_existentes(id_evento, ids_asistentes):
+    """id_asistente que ya tienen registro en el evento."""
+    existentes = set()
+    for bloque in _bloques(ids_asistentes, IMPORT_IN_CHUNK):
+        existentes.update(
+            row[0] for row in db.session.execute(
+                select(Registro.id_asistente)
+                .where(Registro.id_evento == id_evento, Registro.id_asistente.in_(bloque))
+            )
+        )
+    return existentes
+
+
+def _cambios_renglon(row, ahora):
+    """Sólo las columnas que el renglón trae con un valor válido."""
+    cambios = {}
+
+    asistencia_estado = (row.get("asistencia_estado") or row.get("asistencia") or "").strip().lower()
+    if asistencia_estado == "sí":
+        asistencia_estado = "si"
+    if asistencia_estado in ESTADOS_ASISTENCIA:
+        cambios["asistencia"] = asistencia_estado
+
+    confirmado_bool = parse_bool(row.get("confirmado") or "")
+    if confirmado_bool is not None:
+        cambios["confirmado"] = confirmado_bool
+        cambios["fecha_confirmacion"] = ahora
+
+    invitados_val = (row.get("invitados") or "").strip()
+    if invitados_val != "":
+        try:
+            invitados = int(invitados_val)
+            if invitados >= 0:
+                cambios["invitados"] = invitados
+        except ValueError:
+            pass
+
+    comentarios_val = row.get("comentarios") or ""
+    if comentarios_val:
+        cambios["comentarios"] = comentarios_val
+
+    return cambios
+
+
+def _escribir_lote(id_evento, lote, ahora):
+    """
+    Upsert de un lote {id_asistente: cambios}.
+    Los renglones se agrupan por las columnas que traen, para que cada
+    INSERT multi-fila tenga las mismas columnas y el UPDATE sólo toque
+    lo que venía en el CSV.
+    """
+    tabla = Registro.__table__
+    # Hora de escritura de ESTE lote (no la del inicio de la importación):
+    # cada lote hace commit por separado y el cursor ?since= se basa en ella
+    actualizado_en = pase_lista.marca_cambio()
+    grupos = {}
+    for id_asistente, cambios in lote.items():
+        grupos.setdefault(tuple(sorted(cambios)), []).append((id_asistente, cambios))
+
+    for columnas, filas in grupos.items():
+        valores = []
+        for id_asistente, cambios in filas:
+            fila = {
+                "id_evento": id_evento,
+                "id_asistente": id_asistente,
+                "asistencia": "desconocido",
+                "invitados": 0,
+                "confirmado": None,
+                "fecha_confirmacion": None,
+                "comentarios": None,
+                "creado_en": ahora,
+                "actualizado_en": actualizado_en,
+            }
+            fila.update(cambios)
+            valores.append(fila)
+
+        stmt = insert_upsert(tabla).values(valores)
+        stmt = on_conflict(stmt, ["id_evento", "id_asistente"], lambda nuevo: [
+            *[(col, getattr(nuevo, col)) for col in columnas],
+            ("actualizado_en", nuevo.actualizado_en),
+        ])
+        db.session.execute(stmt)
+
+
+def importar_pase_lista(id_evento, archivo, progreso=None):
+    """
+    Espera un CSV (archivo binario: el stream del upload o un archivo
+    abierto en 'rb') con al menos la columna 'correo'. Opcionalmente:
+    - asistencia_estado  (si / no / tal_vez / desconocido)
+    - confirmado         (1/0, true/false, sí/no)
+    - invitados          (entero)
+    - comentarios
+    Actualiza o crea registros en la tabla 'registros' para el evento,
+    con commit por lote, y devuelve el resumen.
+    Lanza ValueError si el archivo no trae la columna 'correo'.
+    """
+    ahora = datetime.utcnow()
+
+    total = 0
+    actualizados = 0
+    creados = 0
+    no_encontrados = []
+    vistos = set()   # id_asistente ya escritos en lotes anteriores
+
+    for filas in _bloques(leer_csv(archivo), IMPORT_BATCH_SIZE):
+        # ---- 1) Correo -> asistente y registros existentes del lote ----
+        correos = {(row.get("correo") or "").strip() for row in filas}
+        correos.discard("")
+        asistentes = _resolver_correos(correos)
+        existentes = _registros_existentes(id_evento, set(asistentes.values()) - vistos)
+
+        # ---- 2) Cambios por asistente (si se repite, gana el último valor) ----
+        cambios_por_asistente = {}   # id_asistente -> {columna: valor}
+        for row in filas:
+            total += 1
+            correo = (row.get("correo") or "").strip()
+
+            if not correo:
+                no_encontrados.append({"motivo": "sin_correo", "row": row})
+                continue
+
+            id_asistente = asistentes.get(correo.lower())
+            if id_asistente is None:
+                no_encontrados.append({"motivo": "persona_o_asistente_no_encontrado", "correo": correo})
+                continue
+
+            if id_asistente in existentes or id_asistente in vistos or id_asistente in cambios_por_asistente:
+                actualizados += 1
+            else:
+                creados += 1
+
+            cambios_por_asistente.setdefault(id_asistente, {}).update(_cambios_renglon(row, ahora))
+
+        # ---- 3) Upsert del lote y commit ----
+        if cambios_por_asistente:
+            _escribir_lote(id_evento, cambios_por_asistente, ahora)
+            db.session.commit()
+            vistos.update(cambios_por_asistente)
+        if progreso:
+            progreso(total)
+
+    # Muchas filas: se vuelve a contar el evento completo
+    estadisticas.recalcular_eventos([id_evento])
+    db.session.commit()
+    roster_cache.invalidar_evento(id_evento)
+    # Muchas filas a la vez: los paneles abiertos mejor piden el delta
+    broker.publicar(id_evento, {"tipo": "recargar", "id_evento": id_evento})
+
+    return {
+        "filas_totales": total,
+        "registros_creados": creados,
+        "registros_actualizados": actualizados,
+        "no_encontrados": no_encontrados
+    }
+
+
+def importar_pase_lista_archivo(id_evento, ruta, progreso=None):
+    """Versión para job: lee el CSV guardado por guardar_para_job y lo borra al final."""
+    try:
+        with open(ruta, "rb") as archivo:
+            resumen = importar_pase_lista(id_evento, archivo, progreso=progreso)
+    finally:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+    if progreso:
+        progreso(resumen["filas_totales"], resumen["filas_totales"])
+    return resumen
+
+
+# =====================================
+# Validación sin escribir (?dry_run=1)
+# =====================================
+# Renglones que se detallan en el reporte; los conteos siempre son completos
+DRY_RUN_MAX_FILAS = 2000
+
+# Columnas de registros que se comparan contra lo que ya hay en la base
+_COLUMNAS_DIFF = ("asistencia", "confirmado", "invitados", "comentarios")
+
+
+def pedido_dry_run(req):
+    """True si la petición pidió ?dry_run=1 (o el campo dry_run en el form)."""
+    return str(req.values.get("dry_run", "")).strip().lower() in ("1", "true", "si", "sí")
+
+
+def _estado_registros(id_evento, ids_asistentes):
+    """{id_asistente: {columna: valor}} de los registros que ya existen (IN por bloques)."""
+    estado = {}
+    for bloque in _bloques(ids_asistentes, IMPORT_IN_CHUNK):
+        filas = db.session.execute(
+            select(
+                Registro.id_asistente,
+                Registro.asistencia,
+                Registro.confirmado,
+                Registro.invitados,
+                Registro.comentarios,
+            )
+            .where(Registro.id_evento == id_evento, Registro.id_asistente.in_(bloque))
+        )
+        for f in filas:
+            estado[f.id_asistente] = {col: getattr(f, col) for col in _COLUMNAS_DIFF}
+    return estado
+
+
+def _avisos_renglon(row):
+    """Valores que la importación ignoraría en silencio."""
+    avisos = []
+
+    asistencia = (row.get("asistencia_estado") or row.get("asistencia") or "").strip().lower()
+    if asistencia and asistencia != "sí" and asistencia not in ESTADOS_ASISTENCIA:
+        avisos.append({"motivo": "asistencia_invalida", "valor": asistencia})
+
+    confirmado = (row.get("confirmado") or "").strip()
+    if confirmado and parse_bool(confirmado) is None:
+        avisos.append({"motivo": "confirmado_invalido", "valor": confirmado})
+
+    invitados = (row.get("invitados") or "").strip()
+    if invitados:
+        try:
+            if int(invitados) < 0:
+                raise ValueError
+        except ValueError:
+            avisos.append({"motivo": "invitados_invalido", "valor": invitados})
+
+    return avisos
+
+
+def validar_pase_lista(id_evento, archivo):
+    """
+    Misma lectura que importar_pase_lista() pero sin escribir nada.
+    Por cada lote se hacen sólo dos consultas IN (correos y registros
+    existentes); la comparación se hace contra diccionarios en memoria.
+
+    Devuelve conteos y, por renglón con algo que reportar (hasta
+    DRY_RUN_MAX_FILAS), la acción y el diff:
+    - accion: nuevo / actualizar / sin_cambios / omitido
+    - cambios: {columna: {"antes": ..., "despues": ...}}
+    - avisos: correo_no_encontrado, sin_correo, duplicado, asistencia_invalida,
+      confirmado_invalido, invitados_invalido
+    'fila' es el número de renglón en el archivo (el encabezado es la 1).
+    Lanza ValueError si el archivo no trae la columna 'correo'.
+    """
+    ahora = datetime.utcnow()
+    conteos = {
+        "filas_totales": 0,
+        "registros_nuevos": 0,
+        "registros_con_cambios": 0,
+        "sin_cambios": 0,
+        "omitidas": 0,
+        "duplicadas": 0,
+        "con_avisos": 0,
+    }
+    filas_reporte = []
+    reportables = 0
+    primera_fila = {}   # id_asistente -> primer renglón donde apareció
+    proyectado = {}     # id_asistente -> cómo quedaría el registro tras los renglones ya vistos
+
+    numero = 1
+    for filas in _bloques(leer_csv(archivo), IMPORT_BATCH_SIZE):
+        correos = {(row.get("correo") or "").strip() for row in filas}
+        correos.discard("")
+        asistentes = _resolver_correos(correos)
+        pendientes = set(asistentes.values()) - set(proyectado)
+        existentes = _estado_registros(id_evento, pendientes)
+
+        for row in filas:
+            numero += 1
+            conteos["filas_totales"] += 1
+            correo = (row.get("correo") or "").strip()
+            avisos = _avisos_renglon(row)
+            detalle = {"fila": numero, "correo": correo}
+
+            id_asistente = asistentes.get(correo.lower()) if correo else None
+            if id_asistente is None:
+                avisos.insert(0, {"motivo": "correo_no_encontrado" if correo else "sin_correo"})
+                detalle["accion"] = "omitido"
+                conteos["omitidas"] += 1
+            else:
+                if id_asistente in primera_fila:
+                    avisos.append({"motivo": "duplicado", "fila_anterior": primera_fila[id_asistente]})
+                    conteos["duplicadas"] += 1
+                else:
+                    primera_fila[id_asistente] = numero
+
+                nuevo = id_asistente not in proyectado and id_asistente not in existentes
+                antes = proyectado.get(id_asistente) or existentes.get(id_asistente) or {
+                    "asistencia": "desconocido",
+                    "invitados": 0,
+                    "confirmado": None,
+                    "comentarios": None,
+                }
+                despues = dict(antes)
+                despues.update({
+                    col: val for col, val in _cambios_renglon(row, ahora).items()
+                    if col in _COLUMNAS_DIFF
+                })
+                proyectado[id_asistente] = despues
+
+                cambios = {
+                    col: {"antes": antes[col], "despues": despues[col]}
+                    for col in _COLUMNAS_DIFF if antes[col] != despues[col]
+                }
+                if nuevo:
+                    detalle["accion"] = "nuevo"
+                    conteos["registros_nuevos"] += 1
+                elif cambios:
+                    detalle["accion"] = "actualizar"
+                    conteos["registros_con_cambios"] += 1
+                else:
+                    detalle["accion"] = "sin_cambios"
+                    conteos["sin_cambios"] += 1
+                detalle["id_asistente"] = id_asistente
+                detalle["cambios"] = cambios
+
+            if avisos:
+                conteos["con_avisos"] += 1
+                detalle["avisos"] = avisos
+
+            # Los renglones sin nada que decir sólo cuentan
+            if detalle["accion"] != "sin_cambios" or avisos:
+                reportables += 1
+                if len(filas_reporte) < DRY_RUN_MAX_FILAS:
+                    filas_reporte.append(detalle)
+
+    # Nada se escribió, pero se suelta cualquier lock / snapshot de las lecturas
+    db.session.rollback()
+
+    return {
+        "dry_run": True,
+        **conteos,
+        "filas": filas_reporte,
+        "filas_truncadas": reportables > len(filas_reporte),
+    }
@@ -0,0 +1,99 @@
+"""
+Fan-out de registros al crear un evento.
+
+Antes se cargaban todos los Asistentes como objetos ORM y se creaba un
+Registro por cada uno. Aquí es un solo
+    INSERT INTO registros (...) SELECT ... FROM asistentes WHERE ...
+dentro de la base: no se hidrata ningún objeto y la memoria no depende
+del número de socios.
+"""
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, Integer, String, literal, select
+
+from models import db, Asistente, Registro
+import estadisticas
+import pase_lista
+import roles_cache
+
+
+def resolver_roles(roles):
+    """
+    Convierte una lista de roles (nombre_rol o id_rol) a ids.
+    Lanza ValueError si alguno no existe.
+    """
+    ids = set()
+    nombres = set()
+    for r in roles:
+        # bool es subclase de int: True no debe convertirse en el rol 1
+        if isinstance(r, bool):
+            raise ValueError(f"Rol no válido: {r!r}")
+        if isinstance(r, int) or (isinstance(r, str) and r.strip().isdigit()):
+            ids.add(int(r))
+        elif isinstance(r, str) and r.strip():
+            nombres.add(r.strip())
+        else:
+            raise ValueError(f"Rol no válido: {r!r}")
+
+    # Del catálogo en memoria (roles_cache), sin ir a la base
+    encontrados = {}
+    faltan = []
+    for valor, rol in [(i, roles_cache.por_id(i)) for i in ids] + \
+                      [(n, roles_cache.por_nombre(n)) for n in nombres]:
+        if rol is None:
+            faltan.append(str(valor))
+        else:
+            encontrados[rol.id_rol] = rol
+    if faltan:
+        raise ValueError(f"Rol no válido: {', '.join(sorted(faltan))}")
+
+    return sorted(encontrados)
+
+
+def invitar_asistentes(id_evento, solo_activos=False, ids_roles=None, ahora=None):
+    """
+    Crea un Registro ('desconocido', sin confirmar) por cada asistente que
+    cumpla los filtros. Devuelve cuántos se insertaron. No hace commit.
+
+    - solo_activos: omite asistentes con activo = 0
+    - ids_roles:    sólo esos roles (None = todos)
+    """
+    ahora = ahora or datetime.utcnow()
+
+    origen = select(
+        literal(int(id_evento), Integer),
+        Asistente.id_asistente,
+        literal("desconocido", String),
+        literal(0, Integer),
+        literal(None, Boolean),
+        literal(ahora, DateTime),
+        literal(pase_lista.marca_cambio(), DateTime),
+    )
+    if solo_activos:
+        origen = origen.where(Asistente.activo.is_(True))
+    if ids_roles is not None:
+        origen = origen.where(Asistente.id_rol.in_(ids_roles))
+
+    db.session.flush()
+    res = db.session.execute(
+        Registro.__table__.insert().from_select(
+            ["id_evento", "id_asistente", "asistencia", "invitados",
+             "confirmado", "creado_en", "actualizado_en"],
+            origen
+        )
+    )
+    return res.rowcount
+
+
+def invitar_y_contar(id_evento, solo_activos=False, ids_roles=None, progreso=None):
+    """
+    Fan-out de un evento ya guardado + su renglón de evento_stats, con commit.
+    Es lo que corre como job cuando crear_evento se pide con ?async=1.
+    """
+    creados = invitar_asistentes(id_evento, solo_activos=solo_activos, ids_roles=ids_roles)
+    estadisticas.recalcular_eventos([id_evento])
+    db.session.commit()
+
+    if progreso:
+        progreso(creados, creados)
+    return {"id_evento": id_evento, "registros_creados": creados}
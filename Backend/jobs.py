@@ -0,0 +1,149 @@
+"""
+Jobs en segundo plano para operaciones largas de admin (fan-out de un
+evento, importación de CSV, generación de credenciales...).
+
+- Corren en un ThreadPoolExecutor del propio proceso: no hace falta
+  broker externo.
+- Cada job queda en la tabla `jobs` (estado, avance, resultado o error),
+  así /admin/jobs/<id> responde desde cualquier worker.
+- La función del job recibe `progreso(procesados, total)`; el avance se
+  escribe en una transacción aparte para no hacer commit del trabajo a
+  medias.
+
+Si el proceso se reinicia, los jobs que estaban corriendo se quedan en
+'en_proceso': hay que volver a lanzarlos.
+"""
+import json
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app, jsonify
+from sqlalchemy import update
+
+from models import db, Job
+
+JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", "2"))
+# Carpeta para resultados que son archivos (ZIP / PDF de credenciales, etc.)
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(tempfile.gettempdir(), "agfi_jobs"))
+
+# Cada cuánto se escribe el avance en la base, como mínimo (segundos)
+_INTERVALO_PROGRESO = 1.0
+
+_executor = ThreadPoolExecutor(max_workers=JOBS_WORKERS, thread_name_prefix="agfi-job")
+
+
+def _actualizar(id_job, **valores):
+    """UPDATE del job en su propia transacción (no toca db.session)."""
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(Job.__table__)
+            .where(Job.__table__.c.id_job == id_job)
+            .values(**valores)
+        )
+
+
+class _Progreso:
+    def __init__(self, id_job):
+        self.id_job = id_job
+        self._ultimo = 0.0
+
+    def __call__(self, procesados, total=None):
+        ahora = time.monotonic()
+        if ahora - self._ultimo < _INTERVALO_PROGRESO and procesados != total:
+            return
+        self._ultimo = ahora
+        valores = {"procesados": int(procesados)}
+        if total is not None:
+            valores["total"] = int(total)
+        _actualizar(self.id_job, **valores)
+
+
+def _ejecutar(app, id_job, funcion, args, kwargs):
+    with app.app_context():
+        _actualizar(id_job, estado="en_proceso", iniciado_en=datetime.utcnow())
+        try:
+            resultado = funcion(*args, progreso=_Progreso(id_job), **kwargs)
+            _actualizar(
+                id_job,
+                estado="terminado",
+                resultado=json.dumps(resultado, default=str),
+                terminado_en=datetime.utcnow()
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"[WARN] El job {id_job} falló: {e}")
+            _actualizar(id_job, estado="error", error=str(e), terminado_en=datetime.utcnow())
+        finally:
+            db.session.remove()
+
+
+# =====================================
+# API pública
+# =====================================
+def encolar(tipo, funcion, *args, creado_por=None, **kwargs):
+    """
+    Registra el job y lo manda al pool. Devuelve el id_job.
+    `funcion(*args, progreso=..., **kwargs)` corre con su propio app context
+    y debe devolver algo serializable a JSON.
+    """
+    app = current_app._get_current_object()
+
+    job = Job(
+        id_job=str(uuid.uuid4()),
+        tipo=tipo,
+        estado="pendiente",
+        procesados=0,
+        creado_por=creado_por,
+        creado_en=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _executor.submit(_ejecutar, app, job.id_job, funcion, args, kwargs)
+    return job.id_job
+
+
+def obtener(id_job):
+    return db.session.get(Job, id_job)
+
+
+def ruta_archivo(nombre):
+    """Ruta dentro de JOBS_DIR para que un job deje un archivo de resultado."""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    return os.path.join(JOBS_DIR, os.path.basename(nombre))
+
+
+def job_json(job):
+    return {
+        "id_job": job.id_job,
+        "tipo": job.tipo,
+        "estado": job.estado,
+        "procesados": job.procesados,
+        "total": job.total,
+        "resultado": json.loads(job.resultado) if job.resultado else None,
+        "error": job.error,
+        "creado_por": job.creado_por,
+        "creado_en": job.creado_en.isoformat() if job.creado_en else None,
+        "iniciado_en": job.iniciado_en.isoformat() if job.iniciado_en else None,
+        "terminado_en": job.terminado_en.isoformat() if job.terminado_en else None,
+    }
+
+
+def respuesta_job(id_job, message, **extra):
+    """202 Accepted con el id del job y dónde consultar su avance."""
+    url = f"/admin/jobs/{id_job}"
+    body = {"ok": True, "message": message, "id_job": id_job, "estado_url": url}
+    body.update(extra)
+    resp = jsonify(body)
+    resp.status_code = 202
+    resp.headers["Location"] = url
+    return resp
+
+
+def pedido_async(req):
+    """True si la petición pidió ?async=1 (o el campo async en el form)."""
+    return str(req.values.get("async", "")).strip().lower() in ("1", "true", "si", "sí")
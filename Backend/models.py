@@ -1,7 +1,12 @@
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+# BIGINT en MySQL; en SQLite (pruebas) sólo INTEGER PRIMARY KEY se autoincrementa
+ID_AUTOINCREMENTAL = db.BigInteger().with_variant(db.Integer, "sqlite")
+
 
 # ===============================================================
 # 1) ROLES
@@ -24,7 +29,7 @@ class Rol(db.Model):
 class Persona(db.Model):
     __tablename__ = "personas"
 
-    id_persona = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    id_persona = db.Column(ID_AUTOINCREMENTAL, primary_key=True, autoincrement=True)
     nombre_completo = db.Column(db.String(200), nullable=False)
     correo = db.Column(db.String(190), unique=True)
     password_hash = db.Column(db.String(255))
@@ -33,7 +38,7 @@ class Persona(db.Model):
     puesto = db.Column(db.String(120))
     carrera = db.Column(db.String(120))
     creado_en = db.Column(db.DateTime, nullable=False)
-    actualizado_en = db.Column(db.DateTime)
+    actualizado_en = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
     asistente = db.relationship("Asistente", back_populates="persona", uselist=False)
     invitado_ulm = db.relationship("InvitadoULM", back_populates="persona", uselist=False)
@@ -98,7 +103,7 @@ class InvitadoULM(db.Model):
 class Evento(db.Model):
     __tablename__ = "eventos"
 
-    id_evento = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    id_evento = db.Column(ID_AUTOINCREMENTAL, primary_key=True, autoincrement=True)
     codigo = db.Column(db.String(50), nullable=False, unique=True)
     nombre = db.Column(db.String(200), nullable=False)
     fecha_inicio = db.Column(db.DateTime, nullable=False)
@@ -115,13 +120,39 @@ class Evento(db.Model):
     logs = db.relationship("Log", back_populates="evento")
 
 
+# ===============================================================
+# 5.1) ESTADÍSTICAS POR EVENTO
+#      Contadores mantenidos en las mismas transacciones que escriben
+#      registros / asistencia / invitados ULM (ver estadisticas.py).
+# ===============================================================
+class EventoStats(db.Model):
+    __tablename__ = "evento_stats"
+
+    id_evento = db.Column(
+        db.BigInteger,
+        db.ForeignKey("eventos.id_evento", ondelete="CASCADE"),
+        primary_key=True
+    )
+    invitados = db.Column(db.Integer, nullable=False, default=0)
+    confirmados = db.Column(db.Integer, nullable=False, default=0)
+    rsvp_si = db.Column(db.Integer, nullable=False, default=0)
+    rsvp_no = db.Column(db.Integer, nullable=False, default=0)
+    rsvp_tal_vez = db.Column(db.Integer, nullable=False, default=0)
+    check_in = db.Column(db.Integer, nullable=False, default=0)
+    walk_in = db.Column(db.Integer, nullable=False, default=0)
+    actualizado_en = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 # ===============================================================
 # 6) REGISTROS (RSVP)
 # ===============================================================
 class Registro(db.Model):
     __tablename__ = "registros"
+    __table_args__ = (
+        db.UniqueConstraint("id_evento", "id_asistente", name="uq_reg_evento_asistente"),
+    )
 
-    id_registro = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    id_registro = db.Column(ID_AUTOINCREMENTAL, primary_key=True, autoincrement=True)
     id_evento = db.Column(db.BigInteger, db.ForeignKey("eventos.id_evento"), nullable=False)
     id_asistente = db.Column(db.BigInteger, db.ForeignKey("asistentes.id_asistente"), nullable=False)
 
@@ -134,6 +165,8 @@ class Registro(db.Model):
     fecha_confirmacion = db.Column(db.DateTime)
     comentarios = db.Column(db.Text)
     creado_en = db.Column(db.DateTime, nullable=False)
+    # Cursor del pase de lista en modo delta (?since=)
+    actualizado_en = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     evento = db.relationship("Evento", back_populates="registros")
     asistente = db.relationship("Asistente", back_populates="registros")
@@ -147,18 +180,36 @@ class Registro(db.Model):
 # ===============================================================
 class Asistencia(db.Model):
     __tablename__ = "asistencia"
+    __table_args__ = (
+        db.UniqueConstraint("id_registro", name="uq_asistencia_registro"),
+    )
 
-    id_asistencia = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    id_asistencia = db.Column(ID_AUTOINCREMENTAL, primary_key=True, autoincrement=True)
     id_registro = db.Column(db.BigInteger, db.ForeignKey("registros.id_registro"), nullable=False)
     hora_entrada = db.Column(db.DateTime)
     numero_mesa = db.Column(db.String(10))
     numero_asiento = db.Column(db.String(10))
     codigo_gafete = db.Column(db.String(64))
+    escaneos = db.Column(db.Integer, nullable=False, default=1)   # veces que se escaneó el QR
     creado_en = db.Column(db.DateTime, nullable=False)
+    actualizado_en = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     registro = db.relationship("Registro", back_populates="asistencia_registro")
 
 
+# ===============================================================
+# 7.1) REGISTROS ELIMINADOS (tombstones para el pase de lista delta)
+#      Los llena el trigger trg_registros_eliminados en MySQL.
+# ===============================================================
+class RegistroEliminado(db.Model):
+    __tablename__ = "registros_eliminados"
+
+    id_registro = db.Column(db.BigInteger, primary_key=True)
+    id_evento = db.Column(db.BigInteger, nullable=False)
+    id_asistente = db.Column(db.BigInteger, nullable=False)
+    eliminado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
 # ===============================================================
 # 8) INDICACIONES MÉDICAS
 # ===============================================================
@@ -186,12 +237,28 @@ class AsistenteMedico(db.Model):
 # ===============================================================
 class Log(db.Model):
     __tablename__ = "logs"
+    # Un índice (<filtro>, creado_en, id_log) por filtro de /admin/logs (ver consulta_logs.py)
+    __table_args__ = (
+        db.Index("idx_logs_creado", "creado_en", "id_log"),
+        db.Index("idx_logs_evento_creado", "id_evento", "creado_en", "id_log"),
+        db.Index("idx_logs_asistente_creado", "id_asistente", "creado_en", "id_log"),
+        db.Index("idx_logs_correo_creado", "actor", "creado_en", "id_log"),
+        db.Index("idx_logs_codigo_creado", "codigo_accion", "creado_en"),
+        db.Index("idx_logs_ip_creado", "ip", "creado_en"),
+        db.Index("idx_logs_actor_creado", "id_actor", "creado_en"),
+    )
 
-    id_log = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    id_log = db.Column(ID_AUTOINCREMENTAL, primary_key=True, autoincrement=True)
     actor = db.Column(db.String(150))
     accion = db.Column(db.String(100), nullable=False)
     descripcion = db.Column(db.Text)
 
+    # Campos estructurados (migración 005): para agrupar y filtrar por índice
+    codigo_accion = db.Column(db.String(40))      # bitacora.ACCIONES
+    ip = db.Column(db.String(45))                 # cabe IPv6
+    user_agent = db.Column(db.String(255))
+    id_actor = db.Column(db.BigInteger)           # personas.id_persona (sin FK: la bitácora sobrevive a la persona)
+
     id_evento = db.Column(db.BigInteger, db.ForeignKey("eventos.id_evento"))
     id_asistente = db.Column(db.BigInteger, db.ForeignKey("asistentes.id_asistente"))
     id_registro = db.Column(db.BigInteger, db.ForeignKey("registros.id_registro"))
@@ -204,6 +271,28 @@ class Log(db.Model):
     registro = db.relationship("Registro", back_populates="logs")
     invitado_ulm = db.relationship("InvitadoULM", back_populates="logs")
 
+# ===============================================================
+# 10) JOBS EN SEGUNDO PLANO (ver jobs.py)
+# ===============================================================
+class Job(db.Model):
+    __tablename__ = "jobs"
+
+    id_job = db.Column(db.String(36), primary_key=True)          # uuid4
+    tipo = db.Column(db.String(50), nullable=False)              # crear_evento, importar_pase_lista, ...
+    estado = db.Column(
+        db.Enum('pendiente', 'en_proceso', 'terminado', 'error'),
+        nullable=False,
+        default='pendiente'
+    )
+    procesados = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    resultado = db.Column(db.Text)       # JSON
+    error = db.Column(db.Text)
+    creado_por = db.Column(db.String(150))
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    iniciado_en = db.Column(db.DateTime)
+    terminado_en = db.Column(db.DateTime)
+
 # ===============================================================
 # BUZÓN DE SUGERENCIAS
 # ===============================================================
@@ -0,0 +1,156 @@
+"""
+Pase de lista por evento, completo o en modo delta (?since=<cursor>).
+
+En modo delta sólo se devuelven los registros que cambiaron desde el
+cursor del cliente (registros.actualizado_en, asistencia.actualizado_en o
+personas.actualizado_en) y los id_registro que se borraron
+(registros_eliminados). Cada refresco cuesta lo que cambió, no el tamaño
+del evento.
+
+Invariante del cursor: una fila con actualizado_en = T debe estar
+confirmada (commit) antes de T + MARGEN_CURSOR; si no, un cliente que
+recibió un cursor posterior nunca la verá. Por eso:
+- Quien escribe actualizado_en a mano lo toma con marca_cambio() justo
+  antes de su sentencia, nunca al inicio de un proceso largo.
+- Esas transacciones se mantienen cortas (lotes) y MARGEN_CURSOR cubre
+  la más larga; si alguna se pasa, se avisa al hacer commit para subir
+  PASE_LISTA_MARGEN_CURSOR.
+"""
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, union
+from sqlalchemy.orm import Session
+
+from models import (
+    db,
+    Persona,
+    Asistente,
+    Rol,
+    Registro,
+    Asistencia,
+    RegistroEliminado,
+)
+
+# El cursor se entrega un poco hacia atrás para no perder transacciones que
+# tomaron su hora antes de la consulta pero hicieron commit después.
+# El cliente puede recibir la misma fila dos veces; debe aplicarla por id_registro.
+MARGEN_CURSOR = timedelta(seconds=float(os.environ.get("PASE_LISTA_MARGEN_CURSOR", "5")))
+
+_MARCA = "pase_lista_marca_cambio"
+
+
+def marca_cambio():
+    """
+    Hora para actualizado_en, tomada en el momento de escribir.
+    Se recuerda la primera de la transacción para revisarla al commit.
+    """
+    ahora = datetime.utcnow()
+    db.session.info.setdefault(_MARCA, ahora)
+    return ahora
+
+
+@event.listens_for(Session, "before_commit")
+def _revisar_marca(session):
+    marca = session.info.pop(_MARCA, None)
+    if marca is None:
+        return
+    tardanza = datetime.utcnow() - marca
+    if tardanza > MARGEN_CURSOR:
+        print(
+            f"[WARN] Commit {tardanza.total_seconds():.1f} s después de marcar actualizado_en "
+            f"(margen del cursor: {MARGEN_CURSOR.total_seconds():.0f} s); "
+            f"un ?since= pudo perder estas filas. Subir PASE_LISTA_MARGEN_CURSOR."
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_marca(session):
+    session.info.pop(_MARCA, None)
+
+
+def parse_cursor(valor):
+    """Cursor opaco para el cliente; internamente es un ISO 8601 en UTC."""
+    try:
+        return datetime.fromisoformat(str(valor).strip())
+    except ValueError:
+        raise ValueError("Cursor 'since' inválido.")
+
+
+def query_pase_lista():
+    """Registro + asistente + persona + rol + asistencia física (si existe)."""
+    return (
+        db.session.query(Registro, Asistente, Persona, Rol, Asistencia)
+        .join(Asistente, Registro.id_asistente == Asistente.id_asistente)
+        .join(Persona, Asistente.id_asistente == Persona.id_persona)
+        .join(Rol, Asistente.id_rol == Rol.id_rol)
+        .outerjoin(Asistencia, Asistencia.id_registro == Registro.id_registro)
+    )
+
+
+def fila_json(reg, asist, persona, rol, asistencia_fisica):
+    return {
+        "id_registro": reg.id_registro,
+        "id_asistente": asist.id_asistente,
+        "nombre": persona.nombre_completo,
+        "correo": persona.correo,
+        "empresa": persona.empresa,
+        "rol": rol.nombre_rol,
+        "asistencia_estado": reg.asistencia,          # si / no / tal_vez / desconocido
+        "confirmado": reg.confirmado,                 # True / False / None
+        "invitados": reg.invitados,
+        "comentarios": reg.comentarios,
+        "check_in": True if asistencia_fisica and asistencia_fisica.hora_entrada else False
+    }
+
+
+def _ids_cambiados(id_evento, since):
+    """
+    id_registro del evento que cambiaron desde `since`.
+    Cada rama es un rango sobre su índice de actualizado_en.
+    """
+    return union(
+        select(Registro.id_registro)
+        .where(Registro.id_evento == id_evento, Registro.actualizado_en >= since),
+
+        select(Asistencia.id_registro)
+        .join(Registro, Registro.id_registro == Asistencia.id_registro)
+        .where(Registro.id_evento == id_evento, Asistencia.actualizado_en >= since),
+
+        select(Registro.id_registro)
+        .join(Persona, Persona.id_persona == Registro.id_asistente)
+        .where(Registro.id_evento == id_evento, Persona.actualizado_en >= since),
+    )
+
+
+def obtener(id_evento, since=None):
+    """
+    Devuelve {"registros", "eliminados", "cursor", "delta"}.
+    Sin `since` es el pase de lista completo; con `since` sólo los cambios.
+    Lanza ValueError si el cursor no se entiende.
+    """
+    cursor = (datetime.utcnow() - MARGEN_CURSOR).isoformat()
+
+    query = query_pase_lista().filter(Registro.id_evento == id_evento)
+    eliminados = []
+
+    if since:
+        desde = parse_cursor(since)
+        query = query.filter(Registro.id_registro.in_(_ids_cambiados(id_evento, desde)))
+        eliminados = [
+            row[0] for row in
+            db.session.query(RegistroEliminado.id_registro)
+            .filter(
+                RegistroEliminado.id_evento == id_evento,
+                RegistroEliminado.eliminado_en >= desde
+            )
+        ]
+
+    registros = query.order_by(Persona.nombre_completo.asc()).all()
+
+    return {
+        "registros": [fila_json(*fila) for fila in registros],
+        "eliminados": eliminados,
+        "cursor": cursor,
+        "delta": bool(since),
+    }
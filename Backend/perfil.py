@@ -1,8 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-from auth import registrar_log  # reutilizamos tu logger de auth
-from models import db, Persona, Asistente, AsistenteMedico, Rol, BuzonComentario,Registro, Evento
+from auth import registrar_log, datos_cliente  # reutilizamos tu logger de auth
+from models import db, Persona, Asistente, AsistenteMedico, BuzonComentario,Registro, Evento
+import broker
+import estadisticas
+import roles_cache
+import roster_cache
 
 
 perfil_bp = Blueprint("perfil", __name__, url_prefix="/perfil")
@@ -23,7 +27,7 @@ def obtener_perfil():
 
     asistente = persona.asistente
     medico = asistente.datos_medicos if asistente else None
-    rol = asistente.rol if asistente and asistente.id_rol else None
+    rol = roles_cache.por_id(asistente.id_rol) if asistente else None
 
     perfil = {
         "id_persona": int(persona.id_persona),
@@ -122,13 +126,19 @@ def actualizar_perfil():
         db.session.rollback()
         return jsonify({"ok": False, "message": "Error al guardar", "error": str(e)}), 500
 
+    if asistente:
+        roster_cache.invalidar_asistente(asistente.id_asistente)
+
     # Log
     id_asistente_log = asistente.id_asistente if asistente else None
     registrar_log(
         id_asistente=id_asistente_log,
         accion="Actualización de datos personales",
         descripcion=f"Usuario {persona.correo} actualizó su perfil desde vista usuario.",
-        actor=persona.correo
+        actor=persona.correo,
+        codigo="perfil_datos",
+        id_actor=persona.id_persona,
+        **datos_cliente()
     )
 
     return jsonify({"ok": True, "message": "Datos personales actualizados correctamente."}), 200
@@ -184,11 +194,16 @@ def actualizar_medico():
         db.session.rollback()
         return jsonify({"ok": False, "message": "Error al guardar datos médicos", "error": str(e)}), 500
 
+    roster_cache.invalidar_asistente(asistente.id_asistente)
+
     registrar_log(
         id_asistente=asistente.id_asistente,
         accion="Actualización de datos médicos",
         descripcion=f"Usuario {persona.correo} actualizó sus consideraciones médicas.",
-        actor=persona.correo
+        actor=persona.correo,
+        codigo="perfil_medico",
+        id_actor=persona.id_persona,
+        **datos_cliente()
     )
 
     return jsonify({"ok": True, "message": "Consideraciones médicas actualizadas correctamente."}), 200
@@ -299,7 +314,8 @@ def actualizar_rsvp(id_registro):
 
     asistente = persona.asistente
 
-    registro = Registro.query.get(id_registro)
+    # FOR UPDATE: el estado "antes" de evento_stats no debe cambiar bajo nosotros
+    registro = db.session.get(Registro, id_registro, with_for_update=True)
     if not registro:
         return jsonify({"ok": False, "message": "Registro no encontrado"}), 404
 
@@ -314,6 +330,8 @@ def actualizar_rsvp(id_registro):
     if nueva_asistencia not in ("si", "no", "tal_vez", "desconocido"):
         return jsonify({"ok": False, "message": "Valor de asistencia inválido"}), 400
 
+    antes = (registro.asistencia, registro.confirmado)
+
     registro.asistencia = nueva_asistencia
     # Confirmado = True cuando responde algo distinto de "desconocido"
     registro.confirmado = True if nueva_asistencia in ("si", "no", "tal_vez") else None
@@ -322,6 +340,12 @@ def actualizar_rsvp(id_registro):
         registro.comentarios = comentarios.strip() or None
 
     try:
+        db.session.flush()
+        estadisticas.aplicar_deltas({
+            registro.id_evento: estadisticas.delta_rsvp(
+                antes, (registro.asistencia, registro.confirmado)
+            )
+        })
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -331,13 +355,28 @@ def actualizar_rsvp(id_registro):
             "error": str(e)
         }), 500
 
+    roster_cache.invalidar_asistente(asistente.id_asistente, registro.id_evento)
+    broker.publicar(registro.id_evento, {
+        "tipo": "rsvp",
+        "id_evento": registro.id_evento,
+        "id_registro": registro.id_registro,
+        "id_asistente": asistente.id_asistente,
+        "asistencia_estado": registro.asistencia,
+        "confirmado": registro.confirmado,
+        "comentarios": registro.comentarios
+    })
+
     # Log de acción
     registrar_log(
         id_asistente=asistente.id_asistente,
         id_registro=registro.id_registro,
+        id_evento=registro.id_evento,
         accion="Actualización de RSVP",
         descripcion=f"Usuario {persona.correo} marcó asistencia='{nueva_asistencia}' para el evento {registro.evento.codigo}.",
-        actor=persona.correo
+        actor=persona.correo,
+        codigo="rsvp",
+        id_actor=persona.id_persona,
+        **datos_cliente()
     )
 
     return jsonify({
@@ -391,7 +430,8 @@ def enviar_buzon():
         id_asistente=None,
         accion="Buzón de comentarios (anónimo)",
         descripcion=f"Se recibió comentario anónimo. Asunto: {asunto[:80]}",
-        actor="anonimo"
+        actor="anonimo",
+        codigo="buzon"   # sin id_actor / ip / user_agent, a propósito
     )
 
     return jsonify({
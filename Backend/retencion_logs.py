@@ -0,0 +1,343 @@
+"""
+Retención de la bitácora: la tabla `logs` sólo guarda los últimos
+LOGS_MESES_VIVOS meses; lo anterior se archiva por mes en archivos
+comprimidos (JSONL o CSV, gzip) en LOGS_ARCHIVO_DIR.
+
+- En MySQL `logs` está particionada por mes sobre creado_en (migración
+  006). Archivar un mes = exportarlo y DROP PARTITION, que es inmediato
+  y no deja huecos en los índices. `asegurar_particiones` (comando
+  logs-particiones) va creando las particiones de los meses siguientes.
+- Sin particiones (SQLite en pruebas, o antes de la migración) se borra
+  el mes por lotes de id_log; el resultado es el mismo, sólo más lento.
+- leer_mes() lee un mes igual si sigue en la tabla o si ya está
+  archivado, para que /admin/logs/mes/<YYYY-MM> no tenga que saberlo.
+
+Antes de borrar se compara cuántos renglones se escribieron al archivo
+con cuántos hay en la tabla para ese mes; si no coinciden no se borra.
+"""
+import csv
+import glob
+import gzip
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, text
+
+from models import db, Log
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Debe ser un volumen persistente en producción
+LOGS_ARCHIVO_DIR = os.environ.get("LOGS_ARCHIVO_DIR", os.path.join(BASE_DIR, "archivo_logs"))
+LOGS_MESES_VIVOS = int(os.environ.get("LOGS_MESES_VIVOS", "6"))
+
+FORMATOS = ("jsonl", "csv")
+# Renglones por DELETE cuando no hay particiones
+BLOQUE_BORRADO = 5000
+
+_COLUMNAS = [c.name for c in Log.__table__.columns]
+_COLUMNAS_ENTERAS = {c.name for c in Log.__table__.columns if c.name.startswith("id_")}
+
+
+# =====================================
+# Meses
+# =====================================
+def parse_mes(valor):
+    """'YYYY-MM' -> (anio, mes). Lanza ValueError si no es válido."""
+    try:
+        fecha = datetime.strptime((valor or "").strip(), "%Y-%m")
+    except ValueError:
+        raise ValueError(f"Mes no válido: {valor}. Usa YYYY-MM.")
+    return fecha.year, fecha.month
+
+
+def _siguiente(anio, mes):
+    return (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+def _rango(anio, mes):
+    """[inicio, fin) del mes como datetime."""
+    return datetime(anio, mes, 1), datetime(*_siguiente(anio, mes), 1)
+
+
+def _restar_meses(anio, mes, n):
+    total = anio * 12 + (mes - 1) - n
+    return total // 12, total % 12 + 1
+
+
+def mes_corte(meses_vivos=None, hoy=None):
+    """Primer mes que se queda en la tabla: todo lo anterior se puede archivar."""
+    hoy = hoy or datetime.utcnow()
+    vivos = LOGS_MESES_VIVOS if meses_vivos is None else meses_vivos
+    return _restar_meses(hoy.year, hoy.month, max(vivos - 1, 0))
+
+
+def _texto_mes(anio, mes):
+    return f"{anio:04d}-{mes:02d}"
+
+
+# =====================================
+# Particiones (MySQL)
+# =====================================
+def _es_mysql():
+    return db.engine.dialect.name == "mysql"
+
+
+def nombre_particion(anio, mes):
+    return f"p{anio:04d}{mes:02d}"
+
+
+def particiones():
+    """Nombres de las particiones de `logs` (vacío si no está particionada)."""
+    if not _es_mysql():
+        return []
+    filas = db.session.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'logs' "
+        "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"
+    )).scalars().all()
+    return list(filas)
+
+
+def asegurar_particiones(meses_adelante=3, hoy=None):
+    """
+    Parte `pmax` en particiones mensuales desde el mes más viejo con datos
+    (o el actual) hasta hoy + meses_adelante. Devuelve las creadas.
+    Se corre al aplicar la migración 006 y luego cada mes (cron).
+    """
+    existentes = particiones()
+    if not existentes:
+        return []
+
+    hoy = hoy or datetime.utcnow()
+    mensuales = sorted(p for p in existentes if p != "pmax")
+    if mensuales:
+        anio, mes = int(mensuales[-1][1:5]), int(mensuales[-1][5:7])
+        anio, mes = _siguiente(anio, mes)
+    else:
+        # Primera vez: desde el log más viejo que haya
+        minimo = db.session.execute(select(func.min(Log.creado_en))).scalar()
+        inicio = minimo or hoy
+        anio, mes = inicio.year, inicio.month
+
+    hasta = _restar_meses(hoy.year, hoy.month, -meses_adelante)
+    nuevas = []
+    while (anio, mes) <= hasta:
+        _, fin = _rango(anio, mes)
+        nuevas.append((nombre_particion(anio, mes), fin))
+        anio, mes = _siguiente(anio, mes)
+    if not nuevas:
+        return []
+
+    definiciones = ", ".join(
+        f"PARTITION {nombre} VALUES LESS THAN ('{fin:%Y-%m-%d}')" for nombre, fin in nuevas
+    )
+    db.session.execute(text(
+        f"ALTER TABLE logs REORGANIZE PARTITION pmax INTO "
+        f"({definiciones}, PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+    ))
+    db.session.commit()
+    return [nombre for nombre, _ in nuevas]
+
+
+# =====================================
+# Archivo
+# =====================================
+def _rutas_archivo(anio, mes):
+    patron = os.path.join(LOGS_ARCHIVO_DIR, f"logs_{anio:04d}_{mes:02d}*.gz")
+    return sorted(glob.glob(patron))
+
+
+def _ruta_nueva(anio, mes, formato):
+    """logs_YYYY_MM.<fmt>.gz; si ya hay uno (re-archivo), .2, .3, ..."""
+    os.makedirs(LOGS_ARCHIVO_DIR, exist_ok=True)
+    base = os.path.join(LOGS_ARCHIVO_DIR, f"logs_{anio:04d}_{mes:02d}")
+    ruta = f"{base}.{formato}.gz"
+    n = 2
+    while os.path.exists(ruta):
+        ruta = f"{base}.{n}.{formato}.gz"
+        n += 1
+    return ruta
+
+
+def _a_texto(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def _escribir(ruta, filas, formato):
+    """Escribe el .gz (atómico) y devuelve cuántos renglones quedaron."""
+    tmp = f"{ruta}.tmp"
+    n = 0
+    with gzip.open(tmp, "wt", encoding="utf-8", newline="") as f:
+        if formato == "csv":
+            escritor = csv.writer(f)
+            escritor.writerow(_COLUMNAS)
+        for fila in filas:
+            if formato == "csv":
+                escritor.writerow(["" if fila[c] is None else _a_texto(fila[c]) for c in _COLUMNAS])
+            else:
+                f.write(json.dumps({c: _a_texto(fila[c]) for c in _COLUMNAS}, ensure_ascii=False))
+                f.write("\n")
+            n += 1
+    os.replace(tmp, ruta)
+    return n
+
+
+def _leer_archivo(ruta):
+    """Renglones (dict) de un archivo archivado, con los tipos de la tabla."""
+    with gzip.open(ruta, "rt", encoding="utf-8", newline="") as f:
+        if ".csv." in os.path.basename(ruta):
+            for fila in csv.DictReader(f):
+                yield {
+                    c: (None if fila.get(c, "") == "" else
+                        int(fila[c]) if c in _COLUMNAS_ENTERAS else fila[c])
+                    for c in _COLUMNAS
+                }
+        else:
+            for linea in f:
+                if linea.strip():
+                    yield json.loads(linea)
+
+
+def _filas_mes(anio, mes):
+    inicio, fin = _rango(anio, mes)
+    consulta = (
+        select(Log.__table__)
+        .where(Log.creado_en >= inicio, Log.creado_en < fin)
+        .order_by(Log.id_log)
+    )
+    # stream_results: el mes no se carga completo en memoria
+    resultado = db.session.execute(consulta.execution_options(stream_results=True, yield_per=2000))
+    for fila in resultado.mappings():
+        yield dict(fila)
+
+
+def _contar_mes(anio, mes):
+    inicio, fin = _rango(anio, mes)
+    return db.session.execute(
+        select(func.count()).select_from(Log.__table__)
+        .where(Log.creado_en >= inicio, Log.creado_en < fin)
+    ).scalar() or 0
+
+
+def _borrar_mes(anio, mes):
+    """DROP PARTITION si el mes tiene la suya; si no, DELETE por lotes."""
+    nombre = nombre_particion(anio, mes)
+    if nombre in particiones():
+        db.session.execute(text(f"ALTER TABLE logs DROP PARTITION {nombre}"))
+        db.session.commit()
+        return "particion"
+
+    inicio, fin = _rango(anio, mes)
+    while True:
+        ids = db.session.execute(
+            select(Log.id_log)
+            .where(Log.creado_en >= inicio, Log.creado_en < fin)
+            .limit(BLOQUE_BORRADO)
+        ).scalars().all()
+        if not ids:
+            break
+        db.session.execute(delete(Log.__table__).where(Log.id_log.in_(ids)))
+        db.session.commit()
+    return "delete"
+
+
+def archivar_mes(anio, mes, formato="jsonl"):
+    """Exporta un mes de `logs` a LOGS_ARCHIVO_DIR y lo quita de la tabla."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no válido: {formato}. Usa {', '.join(FORMATOS)}.")
+
+    esperados = _contar_mes(anio, mes)
+    if not esperados:
+        # Partición vacía: se quita igual para que no se acumulen
+        metodo = _borrar_mes(anio, mes) if nombre_particion(anio, mes) in particiones() else None
+        return {"mes": _texto_mes(anio, mes), "renglones": 0, "archivo": None, "metodo": metodo}
+
+    ruta = _ruta_nueva(anio, mes, formato)
+    escritos = _escribir(ruta, _filas_mes(anio, mes), formato)
+    db.session.commit()   # cierra la lectura antes del ALTER / DELETE
+
+    if escritos != esperados or _contar_mes(anio, mes) != escritos:
+        # Entró algo al mes mientras se exportaba: no se borra nada
+        os.remove(ruta)
+        raise RuntimeError(
+            f"El mes {_texto_mes(anio, mes)} cambió mientras se archivaba "
+            f"({escritos} escritos, {esperados} esperados); vuelve a intentar."
+        )
+
+    metodo = _borrar_mes(anio, mes)
+    return {
+        "mes": _texto_mes(anio, mes),
+        "renglones": escritos,
+        "archivo": os.path.basename(ruta),
+        "bytes": os.path.getsize(ruta),
+        "metodo": metodo,
+    }
+
+
+def meses_por_archivar(meses_vivos=None, hoy=None):
+    """Meses con renglones en la tabla anteriores al corte, del más viejo al más nuevo."""
+    corte = mes_corte(meses_vivos, hoy)
+    existentes = particiones()
+    mensuales = [p for p in existentes if p != "pmax"]
+    if mensuales:
+        meses = [(int(p[1:5]), int(p[5:7])) for p in mensuales]
+        return [m for m in meses if m < corte]
+
+    minimo = db.session.execute(select(func.min(Log.creado_en))).scalar()
+    if minimo is None:
+        return []
+    meses = []
+    anio, mes = minimo.year, minimo.month
+    while (anio, mes) < corte:
+        if _contar_mes(anio, mes):
+            meses.append((anio, mes))
+        anio, mes = _siguiente(anio, mes)
+    return meses
+
+
+def archivar(meses_vivos=None, formato="jsonl", hoy=None):
+    """Archiva todos los meses anteriores al corte. Devuelve un resumen por mes."""
+    return [archivar_mes(anio, mes, formato) for anio, mes in meses_por_archivar(meses_vivos, hoy)]
+
+
+# =====================================
+# Lectura transparente (tabla + archivo)
+# =====================================
+def meses_archivados():
+    """['YYYY-MM', ...] que tienen al menos un archivo."""
+    meses = set()
+    for ruta in glob.glob(os.path.join(LOGS_ARCHIVO_DIR, "logs_*_*.gz")):
+        partes = os.path.basename(ruta).split(".")[0].split("_")
+        if len(partes) == 3 and partes[1].isdigit() and partes[2].isdigit():
+            meses.add(f"{partes[1]}-{partes[2]}")
+    return sorted(meses)
+
+
+def _coincide(fila, filtros):
+    return all(fila.get(campo) == valor for campo, valor in filtros.items())
+
+
+def leer_mes(anio, mes, filtros=None):
+    """
+    Renglones (dict, por id_log) de un mes, vengan de la tabla o de sus
+    archivos. `filtros` es {columna: valor} por igualdad.
+    """
+    filtros = {c: v for c, v in (filtros or {}).items() if v is not None}
+
+    for ruta in _rutas_archivo(anio, mes):
+        for fila in _leer_archivo(ruta):
+            if _coincide(fila, filtros):
+                yield fila
+
+    inicio, fin = _rango(anio, mes)
+    consulta = (
+        select(Log.__table__)
+        .where(Log.creado_en >= inicio, Log.creado_en < fin)
+        .order_by(Log.id_log)
+    )
+    for campo, valor in filtros.items():
+        consulta = consulta.where(Log.__table__.c[campo] == valor)
+    for fila in db.session.execute(consulta).mappings():
+        yield {c: _a_texto(v) for c, v in fila.items()}
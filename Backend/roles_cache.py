@@ -0,0 +1,118 @@
+"""
+Caché de la tabla `roles` (catálogo de 5 renglones).
+
+Antes cada login hacía Rol.query.get y cada alta de asistente, alta
+express, edición de perfil o invitación por rol hacía
+Rol.query.filter_by(nombre_rol=...): una ida a la base por algo que casi
+nunca cambia. Aquí se carga la tabla completa una vez por proceso (al
+arrancar, ver app.py) y se resuelve por nombre o id con un diccionario.
+
+- Los renglones son tuplas (RolInfo), no objetos del ORM: no dependen
+  de la sesión y se pueden compartir entre hilos.
+- Se recarga sola cada ROLES_CACHE_TTL segundos y cuando se busca un
+  nombre / id que no está (p. ej. un rol agregado a mano en la base),
+  como mucho una vez cada _RECARGA_MIN segundos para que un nombre
+  inválido repetido no pegue a la base en cada petición.
+- Quien modifique `roles` debe llamar invalidar() después del commit.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from models import db, Rol
+
+ROLES_CACHE_TTL = int(os.environ.get("ROLES_CACHE_TTL", "300"))   # segundos
+_RECARGA_MIN = 5.0
+
+RolInfo = namedtuple("RolInfo", ["id_rol", "nombre_rol", "costo_evento"])
+
+# nombre_rol -> rol que va en el JWT (el resto son "user")
+ROLES_SESION = {
+    "administrador": "admin",
+    "staff": "staff",
+}
+
+_lock = threading.Lock()
+_por_id = {}
+_por_nombre = {}
+_cargado_en = None
+
+
+def _cargar():
+    global _por_id, _por_nombre, _cargado_en
+    filas = db.session.execute(
+        select(Rol.id_rol, Rol.nombre_rol, Rol.costo_evento)
+    ).all()
+    roles = [RolInfo(int(f.id_rol), f.nombre_rol, f.costo_evento) for f in filas]
+    # Se reemplazan los dicts completos: los lectores nunca ven uno a medias
+    _por_id = {r.id_rol: r for r in roles}
+    _por_nombre = {r.nombre_rol: r for r in roles}
+    _cargado_en = time.monotonic()
+
+
+def _vigente():
+    if _cargado_en is None or time.monotonic() - _cargado_en > ROLES_CACHE_TTL:
+        with _lock:
+            if _cargado_en is None or time.monotonic() - _cargado_en > ROLES_CACHE_TTL:
+                _cargar()
+
+
+def _recargar_si_falta():
+    """Un rol que no está puede ser nuevo: recargar (con límite de frecuencia)."""
+    if _cargado_en is not None and time.monotonic() - _cargado_en < _RECARGA_MIN:
+        return False
+    with _lock:
+        _cargar()
+    return True
+
+
+# =====================================
+# API pública
+# =====================================
+def precargar():
+    """Carga la tabla (al arrancar la app)."""
+    with _lock:
+        _cargar()
+
+
+def invalidar():
+    """Fuerza recargar en la siguiente consulta (llamar después del commit)."""
+    global _cargado_en
+    with _lock:
+        _cargado_en = None
+
+
+def por_nombre(nombre_rol):
+    """RolInfo del nombre ('ingeniero', 'staff', ...) o None."""
+    if not nombre_rol:
+        return None
+    _vigente()
+    rol = _por_nombre.get(nombre_rol)
+    if rol is None and _recargar_si_falta():
+        rol = _por_nombre.get(nombre_rol)
+    return rol
+
+
+def por_id(id_rol):
+    """RolInfo del id o None."""
+    if id_rol is None:
+        return None
+    _vigente()
+    rol = _por_id.get(int(id_rol))
+    if rol is None and _recargar_si_falta():
+        rol = _por_id.get(int(id_rol))
+    return rol
+
+
+def todos():
+    _vigente()
+    return sorted(_por_id.values())
+
+
+def rol_sesion(id_rol):
+    """'admin' / 'staff' / 'user' para el JWT según el id_rol del asistente."""
+    rol = por_id(id_rol)
+    return ROLES_SESION.get(rol.nombre_rol, "user") if rol else "user"
@@ -0,0 +1,343 @@
+"""
+Caché del roster por evento para qr_lookup.
+
+Antes y durante un evento, cada escaneo de QR pedía Asistente, Persona,
+Rol, AsistenteMedico, Registro y Asistencia por separado. Aquí se carga
+el roster completo del evento con una sola consulta y se guarda indexado
+por id_asistente, de modo que el lookup sea un acceso a diccionario.
+
+- Sin REDIS_URL se guarda en memoria del proceso.
+- Con REDIS_URL (y el paquete redis instalado) se comparte entre workers.
+
+Las rutas que escriben (qr_checkin, alta_express, perfil, importación CSV)
+deben llamar a invalidar_asistente / invalidar_evento DESPUÉS del commit.
+"""
+import json
+import os
+import threading
+import time
+
+from models import (
+    db,
+    Persona,
+    Asistente,
+    Rol,
+    AsistenteMedico,
+    Registro,
+    Asistencia,
+)
+
+ROSTER_CACHE_TTL = int(os.environ.get("ROSTER_CACHE_TTL", "900"))   # segundos
+REDIS_URL = os.environ.get("REDIS_URL")
+
+
+# =====================================
+# Serialización de una fila del roster
+# =====================================
+def _entrada(asistente, persona, rol, medico, registro, asistencia_fisica):
+    id_asistente = int(asistente.id_asistente)
+
+    asist_json = {
+        "id_asistente": id_asistente,
+        "codigo_qr": f"AGFI-{id_asistente}",
+        "nombre": persona.nombre_completo,
+        "correo": persona.correo,
+        "empresa": persona.empresa,
+        "telefono": persona.telefono,
+        "carrera": persona.carrera,
+        "generacion": asistente.generacion,
+        "rol": rol.nombre_rol if rol else None,
+    }
+
+    if medico:
+        asist_json.update({
+            "tipo_sangre": medico.tipo_sangre,
+            "alergias": medico.alergias,
+            "medicamentos_actuales": medico.medicamentos_actuales,
+            "padecimientos": medico.padecimientos,
+            "contacto_emergencia_nombre": medico.contacto_emergencia_nombre,
+            "contacto_emergencia_telefono": medico.contacto_emergencia_telefono,
+        })
+
+    entrada = {
+        "asistente": asist_json,
+        "registro": None,
+        "asistencia": None
+    }
+
+    if registro:
+        entrada["registro"] = {
+            "id_registro": registro.id_registro,
+            "asistencia_estado": registro.asistencia,
+            "confirmado": registro.confirmado,
+            "invitados": registro.invitados,
+            "comentarios": registro.comentarios,
+        }
+
+    if asistencia_fisica:
+        entrada["asistencia"] = {
+            "id_asistencia": asistencia_fisica.id_asistencia,
+            "hora_entrada": (
+                asistencia_fisica.hora_entrada.isoformat()
+                if asistencia_fisica.hora_entrada else None
+            ),
+            "numero_mesa": asistencia_fisica.numero_mesa,
+            "numero_asiento": asistencia_fisica.numero_asiento,
+            "codigo_gafete": asistencia_fisica.codigo_gafete,
+        }
+
+    return entrada
+
+
+def _query_roster():
+    return (
+        db.session.query(Asistente, Persona, Rol, AsistenteMedico, Registro, Asistencia)
+        .join(Persona, Asistente.id_asistente == Persona.id_persona)
+        .outerjoin(Rol, Asistente.id_rol == Rol.id_rol)
+        .outerjoin(AsistenteMedico, AsistenteMedico.id_asistente == Asistente.id_asistente)
+    )
+
+
+def _cargar_evento(id_evento):
+    """Roster completo del evento en una sola consulta."""
+    filas = (
+        _query_roster()
+        .join(Registro, Registro.id_asistente == Asistente.id_asistente)
+        .outerjoin(Asistencia, Asistencia.id_registro == Registro.id_registro)
+        .filter(Registro.id_evento == id_evento)
+        .all()
+    )
+    return {int(f[0].id_asistente): _entrada(*f) for f in filas}
+
+
+def _cargar_asistente(id_evento, id_asistente):
+    """Una sola persona (p. ej. alguien que no tiene registro en el evento)."""
+    fila = (
+        _query_roster()
+        .outerjoin(Registro, (Registro.id_asistente == Asistente.id_asistente)
+                   & (Registro.id_evento == id_evento))
+        .outerjoin(Asistencia, Asistencia.id_registro == Registro.id_registro)
+        .filter(Asistente.id_asistente == id_asistente)
+        .first()
+    )
+    return _entrada(*fila) if fila else None
+
+
+# =====================================
+# Backends
+# =====================================
+class _MemoriaBackend:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._eventos = {}       # id_evento -> (expira_en, {id_asistente: entrada})
+        self._generaciones = {}  # id_evento -> int, sube con cada invalidación del evento
+
+    def generacion(self, id_evento):
+        with self._lock:
+            return self._generaciones.setdefault(id_evento, 0)
+
+    def _subir(self, id_evento):
+        self._generaciones[id_evento] = self._generaciones.get(id_evento, 0) + 1
+
+    def obtener(self, id_evento, id_asistente):
+        """Devuelve (cargado, entrada)."""
+        with self._lock:
+            item = self._eventos.get(id_evento)
+            if not item or item[0] < time.monotonic():
+                return False, None
+            return True, item[1].get(id_asistente)
+
+    def guardar_evento(self, id_evento, roster, generacion):
+        with self._lock:
+            # Si hubo una invalidación del evento mientras se consultaba, no guardamos datos viejos
+            if generacion != self._generaciones.get(id_evento, 0):
+                return
+            self._eventos[id_evento] = (time.monotonic() + self.ttl, roster)
+
+    def guardar_asistente(self, id_evento, id_asistente, entrada, generacion):
+        with self._lock:
+            if generacion != self._generaciones.get(id_evento, 0):
+                return
+            item = self._eventos.get(id_evento)
+            if item:
+                item[1][id_asistente] = entrada
+
+    def invalidar_asistente(self, id_asistente, id_evento=None):
+        with self._lock:
+            # Sin evento se sube la generación de todos los eventos consultados,
+            # incluidos los que se están cargando en este momento
+            eventos = [id_evento] if id_evento is not None else list(self._generaciones)
+            for ev in eventos:
+                self._subir(ev)
+                item = self._eventos.get(ev)
+                if item:
+                    item[1].pop(id_asistente, None)
+
+    def invalidar_evento(self, id_evento):
+        with self._lock:
+            self._subir(id_evento)
+            self._eventos.pop(id_evento, None)
+
+
+class _RedisBackend:
+    """
+    Cada evento tiene un hash con su roster y una clave de versión que sube
+    (INCR) con cada invalidación. Las escrituras son scripts Lua que comparan
+    esa versión con la leída antes de consultar la base, de modo que una carga
+    que empezó antes de un check-in no pisa la invalidación.
+    """
+    PREFIJO = "agfi:roster"
+    CARGADO = "_cargado"
+
+    # KEYS: hash, versión | ARGV: versión esperada, ttl, campo1, valor1, ...
+    _LUA_GUARDAR_EVENTO = """
+        if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+            return 0
+        end
+        redis.call('DEL', KEYS[1])
+        for i = 3, #ARGV, 2 do
+            redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+        end
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+        return 1
+    """
+
+    # KEYS: hash, versión | ARGV: versión esperada, campo de cargado, campo, valor
+    _LUA_GUARDAR_ASISTENTE = """
+        if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+            return 0
+        end
+        if redis.call('HEXISTS', KEYS[1], ARGV[2]) == 0 then
+            return 0
+        end
+        redis.call('HSET', KEYS[1], ARGV[3], ARGV[4])
+        return 1
+    """
+
+    def __init__(self, url, ttl):
+        import redis
+        self.ttl = ttl
+        self.r = redis.Redis.from_url(url)
+        self._lua_guardar_evento = self.r.register_script(self._LUA_GUARDAR_EVENTO)
+        self._lua_guardar_asistente = self.r.register_script(self._LUA_GUARDAR_ASISTENTE)
+
+    def _key(self, id_evento):
+        return f"{self.PREFIJO}:{id_evento}"
+
+    def _key_version(self, id_evento):
+        return f"{self.PREFIJO}:{id_evento}:version"
+
+    def _key_eventos(self):
+        return f"{self.PREFIJO}:eventos"
+
+    def generacion(self, id_evento):
+        # El evento queda registrado para que una invalidación sin evento
+        # también alcance a las cargas en curso
+        pipe = self.r.pipeline()
+        pipe.sadd(self._key_eventos(), id_evento)
+        pipe.get(self._key_version(id_evento))
+        _, version = pipe.execute()
+        return int(version or 0)
+
+    def obtener(self, id_evento, id_asistente):
+        cargado, valor = self.r.hmget(self._key(id_evento), self.CARGADO, str(id_asistente))
+        if not cargado:
+            return False, None
+        return True, json.loads(valor) if valor else None
+
+    def guardar_evento(self, id_evento, roster, generacion):
+        args = [str(generacion), self.ttl, self.CARGADO, "1"]
+        for k, v in roster.items():
+            args.extend((str(k), json.dumps(v)))
+        self._lua_guardar_evento(
+            keys=[self._key(id_evento), self._key_version(id_evento)],
+            args=args,
+        )
+
+    def guardar_asistente(self, id_evento, id_asistente, entrada, generacion):
+        self._lua_guardar_asistente(
+            keys=[self._key(id_evento), self._key_version(id_evento)],
+            args=[str(generacion), self.CARGADO, str(id_asistente), json.dumps(entrada)],
+        )
+
+    def invalidar_asistente(self, id_asistente, id_evento=None):
+        if id_evento is not None:
+            eventos = [id_evento]
+        else:
+            eventos = [int(e) for e in self.r.smembers(self._key_eventos())]
+        pipe = self.r.pipeline()
+        for ev in eventos:
+            pipe.incr(self._key_version(ev))
+            pipe.hdel(self._key(ev), str(id_asistente))
+        pipe.execute()
+
+    def invalidar_evento(self, id_evento):
+        pipe = self.r.pipeline()
+        pipe.incr(self._key_version(id_evento))
+        pipe.delete(self._key(id_evento))
+        pipe.execute()
+
+
+def _crear_backend():
+    if REDIS_URL:
+        try:
+            return _RedisBackend(REDIS_URL, ROSTER_CACHE_TTL)
+        except Exception as e:
+            print(f"[WARN] No se pudo usar Redis para el roster, se usa memoria: {e}")
+    return _MemoriaBackend(ROSTER_CACHE_TTL)
+
+
+_backend = _crear_backend()
+
+
+# =====================================
+# API pública
+# =====================================
+def obtener(id_evento, id_asistente):
+    """
+    Devuelve {"asistente", "registro", "asistencia"} para el QR escaneado
+    o None si el asistente no existe.
+    La primera consulta de un evento carga todo su roster.
+    """
+    try:
+        cargado, entrada = _backend.obtener(id_evento, id_asistente)
+        if entrada is not None:
+            return entrada
+
+        generacion = _backend.generacion(id_evento)
+        if not cargado:
+            roster = _cargar_evento(id_evento)
+            _backend.guardar_evento(id_evento, roster, generacion)
+            entrada = roster.get(id_asistente)
+            if entrada is not None:
+                return entrada
+
+        # No está en el roster del evento (sin registro): se busca suelto
+        entrada = _cargar_asistente(id_evento, id_asistente)
+        if entrada is not None:
+            _backend.guardar_asistente(id_evento, id_asistente, entrada, generacion)
+        return entrada
+
+    except Exception as e:
+        # Si la caché falla (p. ej. Redis caído) seguimos directo a la base
+        if isinstance(_backend, _RedisBackend):
+            print(f"[WARN] Caché de roster no disponible: {e}")
+            return _cargar_asistente(id_evento, id_asistente)
+        raise
+
+
+def invalidar_asistente(id_asistente, id_evento=None):
+    """Quita a un asistente del roster de un evento (o de todos)."""
+    try:
+        _backend.invalidar_asistente(int(id_asistente), id_evento)
+    except Exception as e:
+        print(f"[WARN] No se pudo invalidar el roster del asistente {id_asistente}: {e}")
+
+
+def invalidar_evento(id_evento):
+    """Descarta el roster completo de un evento."""
+    try:
+        _backend.invalidar_evento(int(id_evento))
+    except Exception as e:
+        print(f"[WARN] No se pudo invalidar el roster del evento {id_evento}: {e}")
@@ -1,49 +1,51 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, current_app, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-import csv
-import io
+import json
+import time
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
 
 from models import (
     db,
     Persona,
     Asistente,
-    Rol,
     AsistenteMedico,
     Evento,
-    Registro,
-    Asistencia,
     InvitadoULM,
 )
+from checkin import (
+    MAX_SCANS_LOTE,
+    parse_qr_code_to_id_asistente as _parse_qr_code_to_id_asistente,
+    registrar_checkins,
+    registrar_checkins_lote,
+    publicar_checkins,
+)
+import broker
+import estadisticas
+import exportacion
+from importacion import (
+    guardar_para_job,
+    importar_pase_lista,
+    importar_pase_lista_archivo,
+    inspeccionar_csv,
+    pedido_dry_run,
+    validar_pase_lista,
+)
+import jobs
+import pase_lista
+import roles_cache
+import roster_cache
 
 staff_bp = Blueprint("staff", __name__, url_prefix="/staff")
 
-
-# =====================================
-# Helper: parsear código de QR
-# =====================================
-def _parse_qr_code_to_id_asistente(code: str):
-    """
-    Recibe el texto leído del QR o lo que se tecleó.
-    Soporta:
-    - 'AGFI-123'
-    - 'agfi-123'
-    - '123' (solo número)
-    Devuelve id_asistente (int) o None si no se puede parsear.
-    """
-    if not code:
-        return None
-    s = str(code).strip()
-    if not s:
-        return None
-
-    if s.upper().startswith("AGFI-"):
-        s = s.split("-", 1)[1].strip()
-
-    try:
-        return int(s)
-    except ValueError:
-        return None
+# Stream SSE: comentario cada N segundos para que nginx / el navegador
+# no cierren la conexión, y reconexión forzada cada 15 minutos. Cada panel
+# abierto ocupa un hilo del servidor mientras dure la conexión (ver
+# broker.py); el navegador reconecta solo y se pone al día con ?since=.
+SSE_KEEPALIVE_SEGUNDOS = 15
+SSE_DURACION_MAX = 900
+SSE_TOKEN_SEGUNDOS = 60     # vigencia del token de ?token= para abrir el stream
 
 
 # =====================================
@@ -78,32 +80,19 @@ def listar_eventos_staff():
     if identidad.get("rol") not in ("staff", "admin"):
         return jsonify({"ok": False, "message": "No autorizado."}), 403
 
-    eventos = Evento.query.order_by(Evento.fecha_inicio.desc()).all()
-    total_oficiales = Asistente.query.count()
-
-    data = []
-    for ev in eventos:
-        confirmados = Registro.query.filter_by(
-            id_evento=ev.id_evento,
-            confirmado=True
-        ).count()
-
-        data.append({
-            "id_evento": ev.id_evento,
-            "codigo": ev.codigo,
-            "nombre": ev.nombre,
-            "fecha": ev.fecha_inicio.strftime("%Y-%m-%d"),
-            "lugar": ev.sede,
-            "direccion": ev.direccion,
-            "ciudad": ev.ciudad,
-            "estado": ev.estado,
-            "pais": ev.pais,
-            "notas": ev.notas,
-            "invitados": total_oficiales,
-            "confirmados": confirmados
-        })
-
-    return jsonify({"ok": True, "eventos": data}), 200
+    # Sin ?limit= regresa todos; con ?limit= pagina con ?after=<siguiente>
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit < 1:
+        return jsonify({"ok": False, "message": "limit debe ser mayor que 0."}), 400
+    if limit:
+        limit = min(limit, estadisticas.MAX_LIMIT_EVENTOS)
+
+    try:
+        data, siguiente = estadisticas.listar_eventos(limit, request.args.get("after"))
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+
+    return jsonify({"ok": True, "eventos": data, "siguiente": siguiente}), 200
 
 
 # =====================================
@@ -124,32 +113,11 @@ def pase_lista_evento_staff():
     if not evento:
         return jsonify({"ok": False, "message": "Evento no encontrado"}), 404
 
-    registros = (
-        db.session.query(Registro, Asistente, Persona, Rol, Asistencia)
-        .join(Asistente, Registro.id_asistente == Asistente.id_asistente)
-        .join(Persona, Asistente.id_asistente == Persona.id_persona)
-        .join(Rol, Asistente.id_rol == Rol.id_rol)
-        .outerjoin(Asistencia, Asistencia.id_registro == Registro.id_registro)
-        .filter(Registro.id_evento == id_evento)
-        .order_by(Persona.nombre_completo.asc())
-        .all()
-    )
-
-    data = []
-    for reg, asist, persona, rol, asistencia_fisica in registros:
-        data.append({
-            "id_registro": reg.id_registro,
-            "id_asistente": asist.id_asistente,
-            "nombre": persona.nombre_completo,
-            "correo": persona.correo,
-            "empresa": persona.empresa,
-            "rol": rol.nombre_rol,
-            "asistencia_estado": reg.asistencia,
-            "confirmado": reg.confirmado,
-            "invitados": reg.invitados,
-            "comentarios": reg.comentarios,
-            "check_in": True if asistencia_fisica and asistencia_fisica.hora_entrada else False
-        })
+    # Completo, o sólo lo que cambió desde el cursor del cliente (?since=)
+    try:
+        lista = pase_lista.obtener(id_evento, request.args.get("since"))
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
 
     return jsonify({
         "ok": True,
@@ -158,88 +126,63 @@ def pase_lista_evento_staff():
             "nombre": evento.nombre,
             "fecha": evento.fecha_inicio.strftime("%Y-%m-%d"),
         },
-        "registros": data
+        "registros": lista["registros"],
+        "eliminados": lista["eliminados"],
+        "cursor": lista["cursor"],
+        "delta": lista["delta"]
     }), 200
 
 
 # =====================================
-# 4) Exportar pase de lista a CSV
+# 4) Exportar pase de lista a CSV / XLSX
 # =====================================
-@staff_bp.route("/pase_lista_csv", methods=["GET"])
-@jwt_required()
-def exportar_pase_lista_csv_staff():
+def _exportar_pase_lista(formato):
     identidad = get_jwt_identity() or {}
     if identidad.get("rol") not in ("staff", "admin"):
         return jsonify({"ok": False, "message": "No autorizado."}), 403
 
-    id_evento = request.args.get("id_evento", type=int)
-    if not id_evento:
+    try:
+        ids_eventos = exportacion.parse_ids_eventos(request.args)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    if not ids_eventos:
         return jsonify({"ok": False, "message": "id_evento es requerido"}), 400
 
-    evento = Evento.query.get(id_evento)
-    if not evento:
-        return jsonify({"ok": False, "message": "Evento no encontrado"}), 404
-
-    registros = (
-        db.session.query(Registro, Asistente, Persona, Rol, Asistencia)
-        .join(Asistente, Registro.id_asistente == Asistente.id_asistente)
-        .join(Persona, Asistente.id_asistente == Persona.id_persona)
-        .join(Rol, Asistente.id_rol == Rol.id_rol)
-        .outerjoin(Asistencia, Asistencia.id_registro == Registro.id_registro)
-        .filter(Registro.id_evento == id_evento)
-        .order_by(Persona.nombre_completo.asc())
-        .all()
+    eventos = exportacion.buscar_eventos(ids_eventos)
+    faltan = [i for i in ids_eventos if i not in eventos]
+    if faltan:
+        return jsonify({
+            "ok": False,
+            "message": f"Evento no encontrado: {', '.join(str(i) for i in faltan)}"
+        }), 404
+
+    filename = exportacion.nombre_archivo(ids_eventos, formato)
+    if formato == "xlsx":
+        # Una hoja por evento, escrita desde el cursor en modo write_only
+        generador = exportacion.generar_xlsx(ids_eventos, eventos)
+        mimetype = exportacion.MIMETYPE_XLSX
+    else:
+        # Se escribe conforme se lee del cursor: memoria plana y primer byte inmediato
+        generador = exportacion.generar_csv(ids_eventos)
+        mimetype = "text/csv"
+
+    return Response(
+        stream_with_context(generador),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    writer.writerow([
-        "id_evento",
-        "codigo_evento",
-        "nombre_evento",
-        "fecha_evento",
-        "id_registro",
-        "id_asistente",
-        "nombre",
-        "correo",
-        "empresa",
-        "rol",
-        "asistencia_estado",
-        "confirmado",
-        "invitados",
-        "comentarios",
-        "check_in",
-    ])
-
-    for reg, asist, persona, rol, asistencia_fisica in registros:
-        writer.writerow([
-            evento.id_evento,
-            evento.codigo,
-            evento.nombre,
-            evento.fecha_inicio.strftime("%Y-%m-%d"),
-            reg.id_registro,
-            asist.id_asistente,
-            persona.nombre_completo or "",
-            persona.correo or "",
-            persona.empresa or "",
-            rol.nombre_rol or "",
-            reg.asistencia or "",
-            "" if reg.confirmado is None else ("1" if reg.confirmado else "0"),
-            reg.invitados or 0,
-            (reg.comentarios or "").replace("\n", " ").replace("\r", " "),
-            "1" if (asistencia_fisica and asistencia_fisica.hora_entrada) else "0",
-        ])
-
-    output.seek(0)
-    filename = f"pase_lista_evento_{evento.id_evento}.csv"
-
-    return send_file(
-        io.BytesIO(output.getvalue().encode("utf-8-sig")),
-        mimetype="text/csv",
-        as_attachment=True,
-        download_name=filename
-    )
+
+@staff_bp.route("/pase_lista_csv", methods=["GET"])
+@jwt_required()
+def exportar_pase_lista_csv_staff():
+    return _exportar_pase_lista("csv")
+
+
+@staff_bp.route("/pase_lista_xlsx", methods=["GET"])
+@jwt_required()
+def exportar_pase_lista_xlsx_staff():
+    return _exportar_pase_lista("xlsx")
 
 
 # =====================================
@@ -267,102 +210,38 @@ def importar_pase_lista_csv_staff():
     if file.filename == "":
         return jsonify({"ok": False, "message": "Nombre de archivo vacío"}), 400
 
+    # Sólo una muestra: codificación, separador y que venga 'correo'
     try:
-        content = file.read().decode("utf-8-sig")
-    except Exception:
-        return jsonify({"ok": False, "message": "No se pudo leer el archivo como UTF-8"}), 400
-
-    reader = csv.DictReader(io.StringIO(content))
-
-    total = 0
-    actualizados = 0
-    creados = 0
-    no_encontrados = []
-
-    def parse_bool(val):
-        if val is None:
-            return None
-        s = str(val).strip().lower()
-        if s in ("1", "true", "t", "sí", "si", "yes", "y"):
-            return True
-        if s in ("0", "false", "f", "no", "n"):
-            return False
-        return None
+        inspeccionar_csv(file.stream)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
 
-    ahora = datetime.utcnow()
-
-    for row in reader:
-        total += 1
-        correo = (row.get("correo") or "").strip()
-
-        if not correo:
-            no_encontrados.append({"motivo": "sin_correo", "row": row})
-            continue
-
-        persona = Persona.query.filter_by(correo=correo).first()
-        if not persona or not persona.asistente:
-            no_encontrados.append({
-                "motivo": "persona_o_asistente_no_encontrado",
-                "correo": correo
-            })
-            continue
-
-        asistente = persona.asistente
-
-        reg = Registro.query.filter_by(
-            id_evento=id_evento,
-            id_asistente=asistente.id_asistente
-        ).first()
-
-        if not reg:
-            reg = Registro(
-                id_evento=id_evento,
-                id_asistente=asistente.id_asistente,
-                asistencia="desconocido",
-                invitados=0,
-                confirmado=None,
-                fecha_confirmacion=None,
-                comentarios=None,
-                creado_en=ahora
-            )
-            db.session.add(reg)
-            creados += 1
-        else:
-            actualizados += 1
-
-        asistencia_estado = (row.get("asistencia_estado") or
-                             row.get("asistencia") or "").strip().lower()
-        if asistencia_estado in ("si", "sí", "no", "tal_vez", "desconocido"):
-            reg.asistencia = asistencia_estado
-
-        confirmado_val = row.get("confirmado") or ""
-        confirmado_bool = parse_bool(confirmado_val)
-        if confirmado_bool is not None:
-            reg.confirmado = confirmado_bool
-            reg.fecha_confirmacion = ahora
-
-        invitados_val = row.get("invitados") or ""
-        try:
-            if invitados_val != "":
-                reg.invitados = int(invitados_val)
-        except ValueError:
-            pass
-
-        comentarios_val = row.get("comentarios") or ""
-        if comentarios_val:
-            reg.comentarios = comentarios_val
+    # ?dry_run=1: sólo reporta qué cambiaría, no escribe nada
+    if pedido_dry_run(request):
+        reporte = validar_pase_lista(id_evento, file.stream)
+        return jsonify({
+            "ok": True,
+            "message": "Validación completada; no se guardó ningún cambio.",
+            "resumen": reporte
+        }), 200
+
+    # ?async=1: responde 202 y la importación corre como job
+    if jobs.pedido_async(request):
+        id_job = jobs.encolar(
+            "importar_pase_lista",
+            importar_pase_lista_archivo,
+            id_evento,
+            guardar_para_job(file),
+            creado_por=identidad.get("correo")
+        )
+        return jobs.respuesta_job(id_job, "Importación en proceso.")
 
-    db.session.commit()
+    resumen = importar_pase_lista(id_evento, file.stream)
 
     return jsonify({
         "ok": True,
         "message": "Importación completada.",
-        "resumen": {
-            "filas_totales": total,
-            "registros_creados": creados,
-            "registros_actualizados": actualizados,
-            "no_encontrados": no_encontrados
-        }
+        "resumen": resumen
     }), 200
 
 
@@ -386,73 +265,17 @@ def qr_lookup_staff():
     if not id_asistente:
         return jsonify({"ok": False, "message": "Código QR inválido."}), 400
 
-    asistente = Asistente.query.get(id_asistente)
-    if not asistente or not asistente.persona:
+    # Roster del evento en caché: sin SQL una vez que el evento está "caliente"
+    entrada = roster_cache.obtener(id_evento, id_asistente)
+    if not entrada:
         return jsonify({"ok": False, "message": "Asistente no encontrado."}), 404
 
-    persona = asistente.persona
-    rol = asistente.rol
-
-    medico = AsistenteMedico.query.get(id_asistente)
-
-    registro = Registro.query.filter_by(
-        id_evento=id_evento,
-        id_asistente=id_asistente
-    ).first()
-
-    asistencia_fisica = registro.asistencia_registro if registro else None
-
-    asist_json = {
-        "id_asistente": id_asistente,
-        "codigo_qr": f"AGFI-{id_asistente}",
-        "nombre": persona.nombre_completo,
-        "correo": persona.correo,
-        "empresa": persona.empresa,
-        "telefono": persona.telefono,
-        "carrera": persona.carrera,
-        "generacion": asistente.generacion,
-        "rol": rol.nombre_rol if rol else None,
-    }
-
-    if medico:
-        asist_json.update({
-            "tipo_sangre": medico.tipo_sangre,
-            "alergias": medico.alergias,
-            "medicamentos_actuales": medico.medicamentos_actuales,
-            "padecimientos": medico.padecimientos,
-            "contacto_emergencia_nombre": medico.contacto_emergencia_nombre,
-            "contacto_emergencia_telefono": medico.contacto_emergencia_telefono,
-        })
-
-    response = {
+    return jsonify({
         "ok": True,
-        "asistente": asist_json,
-        "registro": None,
-        "asistencia": None
-    }
-
-    if registro:
-        response["registro"] = {
-            "id_registro": registro.id_registro,
-            "asistencia_estado": registro.asistencia,
-            "confirmado": registro.confirmado,
-            "invitados": registro.invitados,
-            "comentarios": registro.comentarios,
-        }
-
-    if asistencia_fisica:
-        response["asistencia"] = {
-            "id_asistencia": asistencia_fisica.id_asistencia,
-            "hora_entrada": (
-                asistencia_fisica.hora_entrada.isoformat()
-                if asistencia_fisica.hora_entrada else None
-            ),
-            "numero_mesa": asistencia_fisica.numero_mesa,
-            "numero_asiento": asistencia_fisica.numero_asiento,
-            "codigo_gafete": asistencia_fisica.codigo_gafete,
-        }
-
-    return jsonify(response), 200
+        "asistente": entrada["asistente"],
+        "registro": entrada["registro"],
+        "asistencia": entrada["asistencia"]
+    }), 200
 
 
 # =====================================
@@ -535,7 +358,7 @@ def qr_checkin_staff():
         persona.carrera = carrera.strip() if isinstance(carrera, str) else carrera
 
     if rol_front:
-        rol_obj = Rol.query.filter_by(nombre_rol=rol_front).first()
+        rol_obj = roles_cache.por_nombre(rol_front)
         if not rol_obj:
             return jsonify({"ok": False, "message": "Rol de asistente no válido."}), 400
         asistente.id_rol = rol_obj.id_rol
@@ -563,49 +386,25 @@ def qr_checkin_staff():
     if contacto_emergencia_telefono is not None:
         medico.contacto_emergencia_telefono = contacto_emergencia_telefono
 
+    # Registro + asistencia física (upsert idempotente)
     ahora = datetime.utcnow()
-    registro = Registro.query.filter_by(
-        id_evento=id_evento,
-        id_asistente=id_asistente
-    ).first()
-
-    creado_registro = False
-    if not registro:
-        registro = Registro(
-            id_evento=id_evento,
-            id_asistente=id_asistente,
-            asistencia="desconocido",
-            invitados=0,
-            confirmado=None,
-            fecha_confirmacion=None,
-            comentarios=None,
-            creado_en=ahora
-        )
-        db.session.add(registro)
-        creado_registro = True
-
-    registro.asistencia = "si"
-    if registro.confirmado is None:
-        registro.confirmado = True
-        registro.fecha_confirmacion = ahora
-
-    asistencia_obj = Asistencia.query.filter_by(id_registro=registro.id_registro).first()
-    created_asistencia = False
-
-    if not asistencia_obj:
-        asistencia_obj = Asistencia(
-            id_registro=registro.id_registro,
-            hora_entrada=ahora,
-            codigo_gafete=f"AGFI-{id_asistente}",
-            creado_en=ahora
-        )
-        db.session.add(asistencia_obj)
-        created_asistencia = True
-    else:
-        if not asistencia_obj.hora_entrada:
-            asistencia_obj.hora_entrada = ahora
-
-    db.session.commit()
+    try:
+        det = registrar_checkins([(id_evento, id_asistente, ahora)], ahora)[(id_evento, id_asistente)]
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "ok": False,
+            "message": "Error al registrar asistencia",
+            "error": str(e)
+        }), 500
+
+    roster_cache.invalidar_asistente(id_asistente)
+    publicar_checkins(
+        {(id_evento, id_asistente): det},
+        origen="qr",
+        nombre=persona.nombre_completo
+    )
 
     return jsonify({
         "ok": True,
@@ -613,14 +412,11 @@ def qr_checkin_staff():
         "detalles": {
             "id_asistente": id_asistente,
             "id_evento": id_evento,
-            "id_registro": registro.id_registro,
-            "id_asistencia": asistencia_obj.id_asistencia,
-            "hora_entrada": (
-                asistencia_obj.hora_entrada.isoformat()
-                if asistencia_obj.hora_entrada else None
-            ),
-            "registro_creado": creado_registro,
-            "asistencia_creada": created_asistencia
+            "id_registro": det["id_registro"],
+            "id_asistencia": det["id_asistencia"],
+            "hora_entrada": det["hora_entrada"].isoformat() if det["hora_entrada"] else None,
+            "registro_creado": det["registro_creado"],
+            "asistencia_creada": det["asistencia_creada"]
         }
     }), 200
 
@@ -662,7 +458,7 @@ def alta_express_staff():
     if not evento:
         return jsonify({"ok": False, "message": "Evento no encontrado."}), 404
 
-    rol_obj = Rol.query.filter_by(nombre_rol=rol_front).first()
+    rol_obj = roles_cache.por_nombre(rol_front)
     if not rol_obj:
         return jsonify({"ok": False, "message": "Rol de asistente no válido."}), 400
 
@@ -729,54 +525,32 @@ def alta_express_staff():
         db.session.add(invitado_ulm)
         invitado_creado = True
 
-    # 3) Registro (relación con evento)
-    registro = Registro.query.filter_by(
-        id_evento=id_evento,
-        id_asistente=asistente.id_asistente
-    ).first()
-    registro_creado = False
-
-    if not registro:
-        registro = Registro(
-            id_evento=id_evento,
-            id_asistente=asistente.id_asistente,
-            asistencia="si",       # ya está presente
-            invitados=0,
-            confirmado=True,
-            fecha_confirmacion=ahora,
-            comentarios="Alta express (invitado último momento).",
-            creado_en=ahora
-        )
-        db.session.add(registro)
-        registro_creado = True
-    else:
-        registro.asistencia = "si"
-        if registro.confirmado is None:
-            registro.confirmado = True
-            registro.fecha_confirmacion = ahora
-
-    # 4) Asistencia física (check-in)
-    asistencia_obj = Asistencia.query.filter_by(
-        id_registro=registro.id_registro
-    ).first()
-    asistencia_creada = False
-
-    if not asistencia_obj:
-        asistencia_obj = Asistencia(
-            id_registro=registro.id_registro,
-            hora_entrada=ahora,
-            codigo_gafete=f"AGFI-{asistente.id_asistente}",
-            creado_en=ahora
-        )
-        db.session.add(asistencia_obj)
-        asistencia_creada = True
-    else:
-        if not asistencia_obj.hora_entrada:
-            asistencia_obj.hora_entrada = ahora
-        if not asistencia_obj.codigo_gafete:
-            asistencia_obj.codigo_gafete = f"AGFI-{asistente.id_asistente}"
-
-    db.session.commit()
+    # 4) Registro + asistencia física (upsert idempotente)
+    try:
+        det = registrar_checkins(
+            [(id_evento, asistente.id_asistente, ahora)],
+            ahora,
+            comentarios="Alta express (invitado último momento)."
+        )[(id_evento, asistente.id_asistente)]
+        if invitado_creado:
+            estadisticas.aplicar_deltas({id_evento: {"walk_in": 1}})
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "ok": False,
+            "message": "Error al registrar asistencia",
+            "error": str(e)
+        }), 500
+
+    roster_cache.invalidar_asistente(asistente.id_asistente)
+    publicar_checkins(
+        {(id_evento, asistente.id_asistente): det},
+        origen="alta_express",
+        nombre=persona.nombre_completo,
+        empresa=persona.empresa,
+        rol=rol_obj.nombre_rol
+    )
 
     return jsonify({
         "ok": True,
@@ -785,13 +559,148 @@ def alta_express_staff():
             "id_persona": persona.id_persona,
             "id_asistente": asistente.id_asistente,
             "id_evento": evento.id_evento,
-            "id_registro": registro.id_registro,
-            "id_asistencia": asistencia_obj.id_asistencia,
+            "id_registro": det["id_registro"],
+            "id_asistencia": det["id_asistencia"],
             "codigo_qr": f"AGFI-{asistente.id_asistente}",
             "persona_creada": persona_creada,
             "asistente_creado": asistente_creado,
             "invitado_ulm_creado": invitado_creado,
-            "registro_creado": registro_creado,
-            "asistencia_creada": asistencia_creada
+            "registro_creado": det["registro_creado"],
+            "asistencia_creada": det["asistencia_creada"]
+        }
+    }), 200
+
+
+# =====================================
+# 9) Check-in en lote (escáneres que estuvieron sin red)
+# =====================================
+@staff_bp.route("/qr_checkin_lote", methods=["POST"])
+@jwt_required()
+def qr_checkin_lote_staff():
+    """
+    Recibe los escaneos que un teléfono acumuló sin conexión y los
+    registra en una sola transacción.
+
+    Espera JSON con:
+    - scans: lista de {"id_evento": 1, "code": "AGFI-123", "ts": "2025-11-20T19:05:00Z"}
+
+    Devuelve un resultado por escaneo (mismo orden) y un resumen.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("staff", "admin"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    data = request.get_json() or {}
+    scans = data.get("scans")
+
+    if not isinstance(scans, list) or not scans:
+        return jsonify({"ok": False, "message": "scans debe ser una lista con al menos un escaneo."}), 400
+
+    if len(scans) > MAX_SCANS_LOTE:
+        return jsonify({
+            "ok": False,
+            "message": f"Máximo {MAX_SCANS_LOTE} escaneos por lote."
+        }), 413
+
+    try:
+        lote = registrar_checkins_lote(scans)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            "ok": False,
+            "message": "Error al registrar el lote de asistencias",
+            "error": str(e)
+        }), 500
+
+    return jsonify({
+        "ok": True,
+        "message": "Lote procesado.",
+        "resumen": lote["resumen"],
+        "resultados": lote["resultados"]
+    }), 200
+
+
+# =====================================
+# 10) Avisos en vivo del evento (Server-Sent Events)
+# =====================================
+def _serializador_stream():
+    return URLSafeTimedSerializer(current_app.config["JWT_SECRET_KEY"], salt="agfi-sse-stream")
+
+
+@staff_bp.route("/eventos/<int:id_evento>/stream_token", methods=["POST"])
+@jwt_required()
+def stream_token_staff(id_evento):
+    """
+    Token corto (SSE_TOKEN_SEGUNDOS) que sólo sirve para abrir el stream de
+    ESTE evento. EventSource no permite mandar encabezados, así que el token
+    va en la URL; por eso no se usa el JWT de la sesión, que quedaría en los
+    logs de nginx y en el historial con 8 horas de privilegios completos.
+    """
+    identidad = get_jwt_identity() or {}
+    if identidad.get("rol") not in ("staff", "admin"):
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    token = _serializador_stream().dumps({
+        "id_evento": id_evento,
+        "id_persona": identidad.get("id_persona"),
+    })
+    return jsonify({"ok": True, "token": token, "expira_en": SSE_TOKEN_SEGUNDOS}), 200
+
+
+@staff_bp.route("/eventos/<int:id_evento>/stream", methods=["GET"])
+def stream_evento_staff(id_evento):
+    """
+    Mantiene abierta la conexión y envía un mensaje por cada check-in,
+    alta express o RSVP del evento (ver broker.py). El panel aplica el
+    mensaje a su tabla sin volver a pedir pase_lista.
+
+    Se abre con ?token=<token> de POST /eventos/<id_evento>/stream_token.
+    El token sólo se revisa al conectar; si vence, el panel pide otro
+    antes de reconectar.
+
+    Tipos de mensaje (campo "event" de SSE):
+    - check_in:  id_registro, id_asistente, hora_entrada, origen, ...
+    - rsvp:      id_registro, asistencia_estado, confirmado, comentarios
+    - recargar:  hubo muchos cambios (importación); pedir pase_lista?since=
+    """
+    try:
+        datos = _serializador_stream().loads(
+            request.args.get("token") or "", max_age=SSE_TOKEN_SEGUNDOS
+        )
+    except SignatureExpired:
+        return jsonify({"ok": False, "message": "Token del stream vencido."}), 401
+    except BadSignature:
+        return jsonify({"ok": False, "message": "Token del stream inválido."}), 401
+
+    if datos.get("id_evento") != id_evento:
+        return jsonify({"ok": False, "message": "No autorizado."}), 403
+
+    evento = Evento.query.get(id_evento)
+    if not evento:
+        return jsonify({"ok": False, "message": "Evento no encontrado"}), 404
+
+    suscripcion = broker.suscribir(id_evento)
+
+    # Sin stream_with_context a propósito: la sesión de la base se libera al
+    # terminar la petición y la conexión abierta no retiene ninguna del pool.
+    def generar():
+        limite = time.monotonic() + SSE_DURACION_MAX
+        try:
+            yield "retry: 3000\n\n"
+            while time.monotonic() < limite:
+                mensaje = suscripcion.siguiente(SSE_KEEPALIVE_SEGUNDOS)
+                if mensaje is None:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {mensaje.get('tipo', 'message')}\ndata: {json.dumps(mensaje)}\n\n"
+        finally:
+            suscripcion.cerrar()
+
+    return Response(
+        generar(),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",   # que nginx no acumule los mensajes
         }
-    }), 200
\ No newline at end of file
+    )
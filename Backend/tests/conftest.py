@@ -0,0 +1,38 @@
+"""
+Las pruebas corren sobre SQLite en memoria (db.create_all), sin MySQL.
+Se prueba la lógica de los módulos, no las rutas: no hace falta JWT ni CORS.
+"""
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from models import db, Rol, Persona, Asistente, Evento
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def evento(app):
+    """Un evento con dos socios (id_asistente 1 y 2), aún sin registros."""
+    ahora = datetime.utcnow()
+    db.session.add(Rol(id_rol=1, nombre_rol="ingeniero", costo_evento=0))
+    for i in (1, 2):
+        db.session.add(Persona(id_persona=i, nombre_completo=f"Socio {i}",
+                               correo=f"socio{i}@agfi.test", creado_en=ahora))
+        db.session.add(Asistente(id_asistente=i, id_rol=1))
+    ev = Evento(codigo="EV-1", nombre="Cena anual", fecha_inicio=ahora, creado_en=ahora)
+    db.session.add(ev)
+    db.session.commit()
+    return ev
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from models import db, Registro, Asistencia, EventoStats
+import checkin
+import estadisticas
+
+
+def _stats(id_evento):
+    db.session.expire_all()
+    return estadisticas.stats_json(db.session.get(EventoStats, id_evento))
+
+
+def test_doble_escaneo_es_idempotente(evento):
+    primero = checkin.registrar_checkins([(evento.id_evento, 1, None)])[(evento.id_evento, 1)]
+    db.session.commit()
+    segundo = checkin.registrar_checkins([(evento.id_evento, 1, None)])[(evento.id_evento, 1)]
+    db.session.commit()
+
+    assert primero["registro_creado"] and primero["asistencia_creada"]
+    assert not segundo["registro_creado"] and not segundo["asistencia_creada"]
+    assert segundo["id_registro"] == primero["id_registro"]
+    assert segundo["hora_entrada"] == primero["hora_entrada"]
+    assert segundo["escaneos"] == 2
+    assert Registro.query.count() == 1
+    assert Asistencia.query.count() == 1
+
+
+def test_contadores_de_conflicto(evento):
+    antes = checkin.contadores_upsert()
+    checkin.registrar_checkins([(evento.id_evento, 1, None)])
+    checkin.registrar_checkins([(evento.id_evento, 1, None)])
+    db.session.commit()
+    despues = checkin.contadores_upsert()
+
+    cambio = {k: despues[k] - antes[k] for k in antes}
+    assert cambio == {
+        "registros_insertados": 1,
+        "registros_conflicto": 1,
+        "asistencias_insertadas": 1,
+        "asistencias_conflicto": 1,
+    }
+
+
+def test_deltas_de_evento_stats(evento):
+    # Socio 1 invitado sin contestar; socio 2 llega sin registro (alta en la puerta)
+    db.session.add(Registro(id_evento=evento.id_evento, id_asistente=1,
+                            asistencia="desconocido", creado_en=datetime.utcnow()))
+    db.session.flush()
+    estadisticas.recalcular_eventos([evento.id_evento])
+    db.session.commit()
+    assert _stats(evento.id_evento)["invitados"] == 1
+
+    checkin.registrar_checkins([(evento.id_evento, 1, None), (evento.id_evento, 2, None)])
+    db.session.commit()
+    checkin.registrar_checkins([(evento.id_evento, 1, None)])   # re-escaneo: no cuenta
+    db.session.commit()
+
+    stats = _stats(evento.id_evento)
+    assert stats["invitados"] == 2
+    assert stats["rsvp_si"] == 2
+    assert stats["confirmados"] == 2
+    assert stats["check_in"] == 2
+
+    # Los contadores incrementales coinciden con el recálculo completo
+    estadisticas.recalcular_eventos([evento.id_evento])
+    db.session.commit()
+    assert _stats(evento.id_evento) == stats
+
+
+def test_lote_ignora_ts_booleano(evento):
+    ahora = datetime.utcnow().replace(microsecond=0)
+    res = checkin.registrar_checkins_lote(
+        [{"id_evento": evento.id_evento, "code": "AGFI-1", "ts": True}], ahora
+    )
+    assert res["resultados"][0]["estado"] == "registrado"
+    assert res["resultados"][0]["hora_entrada"] == ahora.isoformat()
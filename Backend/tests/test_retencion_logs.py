@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from models import db, Log
+import bitacora
+import retencion_logs
+
+
+def _log(accion, creado_en, **extra):
+    fila = {"accion": accion, "creado_en": creado_en}
+    fila.update(extra)
+    bitacora.registrar(fila)
+
+
+def test_archivar_mes_a_jsonl_gz_y_leerlo(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(bitacora, "LOG_ASINCRONO", False)
+    monkeypatch.setattr(retencion_logs, "LOGS_ARCHIVO_DIR", str(tmp_path))
+
+    _log("Login EXITOSO", datetime(2026, 3, 5, 12, 0), codigo_accion="login_ok", ip="10.0.0.1")
+    _log("Login FALLIDO", datetime(2026, 3, 20, 8, 30), codigo_accion="login_fallido", ip="10.0.0.2")
+    _log("Login EXITOSO", datetime(2026, 4, 1, 9, 0), codigo_accion="login_ok")
+    assert Log.query.count() == 3
+
+    resumen = retencion_logs.archivar_mes(2026, 3, "jsonl")
+
+    assert resumen["renglones"] == 2
+    assert resumen["archivo"] == "logs_2026_03.jsonl.gz"
+    assert resumen["metodo"] == "delete"
+    assert (tmp_path / "logs_2026_03.jsonl.gz").exists()
+    # Sólo se quitó marzo de la tabla
+    db.session.expire_all()
+    assert [l.creado_en.month for l in Log.query.all()] == [4]
+    assert retencion_logs.meses_archivados() == ["2026-03"]
+
+    filas = list(retencion_logs.leer_mes(2026, 3))
+    assert [f["accion"] for f in filas] == ["Login EXITOSO", "Login FALLIDO"]
+    assert filas[0]["ip"] == "10.0.0.1"
+    assert filas[1]["creado_en"] == "2026-03-20T08:30:00"
+
+    filtradas = list(retencion_logs.leer_mes(2026, 3, {"codigo_accion": "login_fallido"}))
+    assert [f["ip"] for f in filtradas] == ["10.0.0.2"]
@@ -45,7 +45,8 @@ CREATE TABLE personas (
                         ON UPDATE CURRENT_TIMESTAMP,
   CONSTRAINT uq_personas_correo UNIQUE KEY (correo),
   INDEX idx_personas_nombre (nombre_completo),
-  INDEX idx_personas_tel (telefono)
+  INDEX idx_personas_tel (telefono),
+  INDEX idx_personas_actualizado (actualizado_en)
 );
 
 # ===============================================================
@@ -129,6 +130,31 @@ CREATE INDEX idx_ulm_evento ON invitados_ultimo_momento (id_evento);
 CREATE UNIQUE INDEX uq_ulm_evento_persona
   ON invitados_ultimo_momento (id_evento, id_invitado_ulm);
 
+# ===============================================================
+# 5.1) ESTADÍSTICAS POR EVENTO (contadores mantenidos por el backend)
+#    - Se actualizan en la misma transacción que RSVP / check-in / alta
+#      express / importación / creación de evento.
+#    - Se reconstruyen con: flask --app app reconciliar-stats
+# ===============================================================
+
+CREATE TABLE evento_stats (
+  id_evento       BIGINT UNSIGNED PRIMARY KEY,
+  invitados       INT NOT NULL DEFAULT 0,   -- registros del evento
+  confirmados     INT NOT NULL DEFAULT 0,
+  rsvp_si         INT NOT NULL DEFAULT 0,
+  rsvp_no         INT NOT NULL DEFAULT 0,
+  rsvp_tal_vez    INT NOT NULL DEFAULT 0,
+  check_in        INT NOT NULL DEFAULT 0,   -- asistencia con hora_entrada
+  walk_in         INT NOT NULL DEFAULT 0,   -- invitados_ultimo_momento
+  actualizado_en  DATETIME(6) NULL DEFAULT CURRENT_TIMESTAMP(6)
+                    ON UPDATE CURRENT_TIMESTAMP(6),
+
+  CONSTRAINT fk_stats_evento
+    FOREIGN KEY (id_evento)
+    REFERENCES eventos(id_evento)
+    ON DELETE CASCADE
+);
+
 # ===============================================================
 # 6) REGISTROS (RSVP / confirmación por evento)
 #    - Ata a un ASISTENTE (no a cualquier persona)
@@ -145,6 +171,8 @@ CREATE TABLE registros (
   fecha_confirmacion DATETIME NULL,
   comentarios     TEXT NULL,
   creado_en       TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  actualizado_en  DATETIME(6) NULL DEFAULT CURRENT_TIMESTAMP(6)
+                        ON UPDATE CURRENT_TIMESTAMP(6),
 
   UNIQUE KEY uq_reg_evento_asistente (id_evento, id_asistente),
 
@@ -158,7 +186,8 @@ CREATE TABLE registros (
 
   INDEX idx_reg_evento (id_evento),
   INDEX idx_reg_asistente (id_asistente),
-  INDEX idx_reg_evento_asistencia (id_evento, asistencia)
+  INDEX idx_reg_evento_asistencia (id_evento, asistencia),
+  INDEX idx_reg_evento_actualizado (id_evento, actualizado_en)
 );
 
 # ===============================================================
@@ -173,7 +202,10 @@ CREATE TABLE asistencia (
   numero_mesa     VARCHAR(10) NULL,
   numero_asiento  VARCHAR(10) NULL,
   codigo_gafete   VARCHAR(64) NULL,
+  escaneos        INT UNSIGNED NOT NULL DEFAULT 1,   -- veces que se escaneó el QR
   creado_en       TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  actualizado_en  DATETIME(6) NULL DEFAULT CURRENT_TIMESTAMP(6)
+                        ON UPDATE CURRENT_TIMESTAMP(6),
 
   UNIQUE KEY uq_asistencia_registro (id_registro),
 
@@ -181,9 +213,39 @@ CREATE TABLE asistencia (
     FOREIGN KEY (id_registro)
     REFERENCES registros(id_registro),
 
-  INDEX idx_asistencia_entrada (hora_entrada)
+  INDEX idx_asistencia_entrada (hora_entrada),
+  INDEX idx_asistencia_actualizado (actualizado_en)
 );
 
+# ===============================================================
+# 7.1) REGISTROS ELIMINADOS (tombstones)
+#    - El pase de lista en modo delta (?since=) los usa para avisar
+#      a los clientes qué id_registro ya no existen.
+# ===============================================================
+
+CREATE TABLE registros_eliminados (
+  id_registro     BIGINT UNSIGNED PRIMARY KEY,
+  id_evento       BIGINT UNSIGNED NOT NULL,
+  id_asistente    BIGINT UNSIGNED NOT NULL,
+  eliminado_en    DATETIME(6) NOT NULL,
+
+  INDEX idx_reg_elim_evento (id_evento, eliminado_en)
+);
+
+CREATE TRIGGER trg_registros_eliminados
+  AFTER DELETE ON registros
+  FOR EACH ROW
+  INSERT INTO registros_eliminados (id_registro, id_evento, id_asistente, eliminado_en)
+  VALUES (OLD.id_registro, OLD.id_evento, OLD.id_asistente, UTC_TIMESTAMP(6));
+
+# Si se borra un check-in, el registro cambia (check_in pasa a false)
+CREATE TRIGGER trg_asistencia_eliminada
+  AFTER DELETE ON asistencia
+  FOR EACH ROW
+  UPDATE registros
+     SET actualizado_en = UTC_TIMESTAMP(6)
+   WHERE id_registro = OLD.id_registro;
+
 # ===============================================================
 # 8) INDICACIONES MÉDICAS / PREFERENCIAS ALIMENTICIAS
 #    - Se asocian a asistentes (o sea a la persona cuando ya es asistente formal)
@@ -209,12 +271,20 @@ CREATE TABLE asistente_medico (
 # 9) LOGS (auditoría)
 #    - Para saber quién hizo qué
 #    - Guardamos llaves a evento / asistente / invitado ULM / registro
+#      (sin FK: MySQL no las permite en tablas particionadas)
+#    - Particionada por mes sobre creado_en; los meses viejos se
+#      archivan con flask --app app archivar-logs (retencion_logs.py)
+#      y las particiones nuevas con flask --app app logs-particiones
 # ===============================================================
 
 CREATE TABLE logs (
-  id_log           BIGINT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
+  id_log           BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
   actor            VARCHAR(150) NULL,
-  accion           VARCHAR(100) NOT NULL,
+  id_actor         BIGINT UNSIGNED NULL,      -- personas.id_persona (sin FK: la bitácora sobrevive a la persona)
+  accion           VARCHAR(100) NOT NULL,     -- texto para leer
+  codigo_accion    VARCHAR(40) NULL,          -- para agrupar (Backend/bitacora.py ACCIONES)
+  ip               VARCHAR(45) NULL,
+  user_agent       VARCHAR(255) NULL,
   descripcion      TEXT NULL,
 
   id_evento        BIGINT UNSIGNED NULL,
@@ -222,29 +292,25 @@ CREATE TABLE logs (
   id_registro      BIGINT UNSIGNED NULL,
   id_invitado_ulm  BIGINT UNSIGNED NULL,
 
-  creado_en        TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  creado_en        DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
 
-  INDEX idx_logs_evento (id_evento),
-  INDEX idx_logs_asistente (id_asistente),
+  -- La columna de partición tiene que ir en la llave primaria
+  PRIMARY KEY (id_log, creado_en),
+
+  -- Uno por filtro de /admin/logs; InnoDB agrega la PK (id_log) al
+  -- final de cada índice, así todos siguen el orden (creado_en, id_log)
+  INDEX idx_logs_creado (creado_en, id_log),
+  INDEX idx_logs_evento_creado (id_evento, creado_en, id_log),
+  INDEX idx_logs_asistente_creado (id_asistente, creado_en, id_log),
+  INDEX idx_logs_correo_creado (actor, creado_en, id_log),
   INDEX idx_logs_registro (id_registro),
   INDEX idx_logs_invitado (id_invitado_ulm),
-  INDEX idx_logs_accion (accion),
-
-  CONSTRAINT fk_logs_evento
-    FOREIGN KEY (id_evento)
-    REFERENCES eventos(id_evento),
-
-  CONSTRAINT fk_logs_asistente
-    FOREIGN KEY (id_asistente)
-    REFERENCES asistentes(id_asistente),
-
-  CONSTRAINT fk_logs_registro
-    FOREIGN KEY (id_registro)
-    REFERENCES registros(id_registro),
-
-  CONSTRAINT fk_logs_invitado
-    FOREIGN KEY (id_invitado_ulm)
-    REFERENCES invitados_ultimo_momento(id_invitado_ulm)
+  INDEX idx_logs_codigo_creado (codigo_accion, creado_en),
+  INDEX idx_logs_ip_creado (ip, creado_en),
+  INDEX idx_logs_actor_creado (id_actor, creado_en)
+)
+PARTITION BY RANGE COLUMNS (creado_en) (
+  PARTITION pmax VALUES LESS THAN (MAXVALUE)
 );
 
 # ===============================================================
@@ -296,6 +362,26 @@ JOIN personas  p    ON p.id_persona   = a.id_asistente
 LEFT JOIN roles rl  ON rl.id_rol      = a.id_rol
 JOIN eventos e      ON e.id_evento    = r.id_evento;
 
+# ===============================================================
+# 10) JOBS EN SEGUNDO PLANO (fan-out, importaciones, credenciales)
+# ===============================================================
+
+CREATE TABLE jobs (
+  id_job        CHAR(36)     PRIMARY KEY,          -- uuid4
+  tipo          VARCHAR(50)  NOT NULL,
+  estado        ENUM('pendiente','en_proceso','terminado','error') NOT NULL DEFAULT 'pendiente',
+  procesados    INT          NOT NULL DEFAULT 0,
+  total         INT          NULL,
+  resultado     LONGTEXT     NULL,                 -- JSON
+  error         TEXT         NULL,
+  creado_por    VARCHAR(150) NULL,
+  creado_en     DATETIME     NOT NULL,
+  iniciado_en   DATETIME     NULL,
+  terminado_en  DATETIME     NULL,
+
+  INDEX idx_jobs_creado (creado_en)
+);
+
 # ===========================================================
 #Buzon de sugerencias
 CREATE TABLE buzon_comentarios (
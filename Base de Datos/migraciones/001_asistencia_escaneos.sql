@@ -0,0 +1,13 @@
+# ===============================================================
+# Migración 001: asistencia.escaneos
+#   - Cuenta cuántas veces se escaneó el QR para un mismo check-in.
+#   - El upsert de check-in la usa para distinguir la fila recién
+#     insertada (escaneos = 1) de un escaneo repetido.
+#   Aplicar sobre bases creadas con una versión anterior de
+#   agfi_mysql_schema.sql (las nuevas ya traen la columna).
+# ===============================================================
+
+USE Sistema_AGFI;
+
+ALTER TABLE asistencia
+  ADD COLUMN escaneos INT UNSIGNED NOT NULL DEFAULT 1 AFTER codigo_gafete;
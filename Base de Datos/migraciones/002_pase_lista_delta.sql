@@ -0,0 +1,44 @@
+# ===============================================================
+# Migración 002: pase de lista en modo delta (?since=)
+#   - actualizado_en en registros y asistencia (+ índices)
+#   - índice en personas.actualizado_en
+#   - tabla registros_eliminados + triggers para los borrados
+#   Las horas se guardan en UTC, igual que datetime.utcnow() en el backend.
+# ===============================================================
+
+USE Sistema_AGFI;
+
+ALTER TABLE registros
+  ADD COLUMN actualizado_en DATETIME(6) NULL DEFAULT CURRENT_TIMESTAMP(6)
+        ON UPDATE CURRENT_TIMESTAMP(6) AFTER creado_en,
+  ADD INDEX idx_reg_evento_actualizado (id_evento, actualizado_en);
+
+ALTER TABLE asistencia
+  ADD COLUMN actualizado_en DATETIME(6) NULL DEFAULT CURRENT_TIMESTAMP(6)
+        ON UPDATE CURRENT_TIMESTAMP(6) AFTER creado_en,
+  ADD INDEX idx_asistencia_actualizado (actualizado_en);
+
+ALTER TABLE personas
+  ADD INDEX idx_personas_actualizado (actualizado_en);
+
+CREATE TABLE registros_eliminados (
+  id_registro     BIGINT UNSIGNED PRIMARY KEY,
+  id_evento       BIGINT UNSIGNED NOT NULL,
+  id_asistente    BIGINT UNSIGNED NOT NULL,
+  eliminado_en    DATETIME(6) NOT NULL,
+
+  INDEX idx_reg_elim_evento (id_evento, eliminado_en)
+);
+
+CREATE TRIGGER trg_registros_eliminados
+  AFTER DELETE ON registros
+  FOR EACH ROW
+  INSERT INTO registros_eliminados (id_registro, id_evento, id_asistente, eliminado_en)
+  VALUES (OLD.id_registro, OLD.id_evento, OLD.id_asistente, UTC_TIMESTAMP(6));
+
+CREATE TRIGGER trg_asistencia_eliminada
+  AFTER DELETE ON asistencia
+  FOR EACH ROW
+  UPDATE registros
+     SET actualizado_en = UTC_TIMESTAMP(6)
+   WHERE id_registro = OLD.id_registro;
@@ -0,0 +1,42 @@
+# ===============================================================
+# Migración 003: contadores por evento (evento_stats)
+#   - Tabla con un renglón por evento, mantenida por el backend.
+#   - Se llena aquí con los datos actuales; después se puede volver
+#     a reconstruir con: flask --app app reconciliar-stats
+# ===============================================================
+
+USE Sistema_AGFI;
+
+CREATE TABLE evento_stats (
+  id_evento       BIGINT UNSIGNED PRIMARY KEY,
+  invitados       INT NOT NULL DEFAULT 0,
+  confirmados     INT NOT NULL DEFAULT 0,
+  rsvp_si         INT NOT NULL DEFAULT 0,
+  rsvp_no         INT NOT NULL DEFAULT 0,
+  rsvp_tal_vez    INT NOT NULL DEFAULT 0,
+  check_in        INT NOT NULL DEFAULT 0,
+  walk_in         INT NOT NULL DEFAULT 0,
+  actualizado_en  DATETIME(6) NULL DEFAULT CURRENT_TIMESTAMP(6)
+                    ON UPDATE CURRENT_TIMESTAMP(6),
+
+  CONSTRAINT fk_stats_evento
+    FOREIGN KEY (id_evento)
+    REFERENCES eventos(id_evento)
+    ON DELETE CASCADE
+);
+
+INSERT INTO evento_stats
+  (id_evento, invitados, confirmados, rsvp_si, rsvp_no, rsvp_tal_vez, check_in, walk_in)
+SELECT
+  e.id_evento,
+  COUNT(r.id_registro),
+  COALESCE(SUM(r.confirmado = 1), 0),
+  COALESCE(SUM(r.asistencia = 'si'), 0),
+  COALESCE(SUM(r.asistencia = 'no'), 0),
+  COALESCE(SUM(r.asistencia = 'tal_vez'), 0),
+  COUNT(a.hora_entrada),
+  (SELECT COUNT(*) FROM invitados_ultimo_momento u WHERE u.id_evento = e.id_evento)
+FROM eventos e
+LEFT JOIN registros r  ON r.id_evento = e.id_evento
+LEFT JOIN asistencia a ON a.id_registro = r.id_registro
+GROUP BY e.id_evento;
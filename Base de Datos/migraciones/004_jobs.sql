@@ -0,0 +1,23 @@
+# ===============================================================
+# Migración 004: jobs en segundo plano
+#   - Estado, avance y resultado de las operaciones largas de admin
+#     lanzadas con ?async=1 (ver Backend/jobs.py).
+# ===============================================================
+
+USE Sistema_AGFI;
+
+CREATE TABLE jobs (
+  id_job        CHAR(36)     PRIMARY KEY,          -- uuid4
+  tipo          VARCHAR(50)  NOT NULL,
+  estado        ENUM('pendiente','en_proceso','terminado','error') NOT NULL DEFAULT 'pendiente',
+  procesados    INT          NOT NULL DEFAULT 0,
+  total         INT          NULL,
+  resultado     LONGTEXT     NULL,                 -- JSON
+  error         TEXT         NULL,
+  creado_por    VARCHAR(150) NULL,
+  creado_en     DATETIME     NOT NULL,
+  iniciado_en   DATETIME     NULL,
+  terminado_en  DATETIME     NULL,
+
+  INDEX idx_jobs_creado (creado_en)
+);
@@ -0,0 +1,77 @@
+# ===============================================================
+# Migración 005: bitácora estructurada
+#   - codigo_accion, ip, user_agent e id_actor en logs, para que los
+#     reportes ("logins por hora", "acciones por IP") sean búsquedas por
+#     rango de índice y no LIKE sobre `accion`.
+#   - Índices compuestos (<campo>, creado_en).
+#   - Se quita idx_logs_accion: `accion` es casi único por renglón (trae
+#     la IP y el correo), el índice no servía y encarecía cada INSERT.
+#   - Relleno de los logs existentes a partir del texto.
+#   Los códigos están en Backend/bitacora.py (ACCIONES).
+# ===============================================================
+
+USE Sistema_AGFI;
+
+ALTER TABLE logs
+  ADD COLUMN codigo_accion  VARCHAR(40)     NULL AFTER accion,
+  ADD COLUMN ip             VARCHAR(45)     NULL AFTER codigo_accion,
+  ADD COLUMN user_agent     VARCHAR(255)    NULL AFTER ip,
+  ADD COLUMN id_actor       BIGINT UNSIGNED NULL AFTER actor,   -- personas.id_persona (sin FK a propósito)
+  DROP INDEX idx_logs_accion;
+
+# ---------------------------------------------------------------
+# Relleno desde el texto libre
+#   "Login EXITOSO desde IP <ip>. Usuario: <correo>, Rol: <rol>"
+#   "Logout EXITOSO desde IP <ip>. Usuario: <correo>"
+#   descripcion = "User-Agent: <ua>"
+# ---------------------------------------------------------------
+UPDATE logs
+   SET codigo_accion = 'login_ok',
+       ip = LEFT(TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(
+              SUBSTRING_INDEX(accion, 'desde IP ', -1), '. Usuario', 1), ',', 1)), 45),
+       user_agent = NULLIF(LEFT(TRIM(SUBSTRING(descripcion, LENGTH('User-Agent: ') + 1)), 255), '')
+ WHERE codigo_accion IS NULL
+   AND accion LIKE 'Login EXITOSO%';
+
+UPDATE logs
+   SET codigo_accion = 'logout',
+       ip = LEFT(TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(
+              SUBSTRING_INDEX(accion, 'desde IP ', -1), '. Usuario', 1), ',', 1)), 45),
+       user_agent = NULLIF(LEFT(TRIM(SUBSTRING(descripcion, LENGTH('User-Agent: ') + 1)), 255), '')
+ WHERE codigo_accion IS NULL
+   AND accion LIKE 'Logout EXITOSO%';
+
+UPDATE logs SET codigo_accion = 'perfil_datos'
+ WHERE codigo_accion IS NULL AND accion = 'Actualización de datos personales';
+
+UPDATE logs SET codigo_accion = 'perfil_medico'
+ WHERE codigo_accion IS NULL AND accion = 'Actualización de datos médicos';
+
+UPDATE logs SET codigo_accion = 'rsvp'
+ WHERE codigo_accion IS NULL AND accion = 'Actualización de RSVP';
+
+UPDATE logs SET codigo_accion = 'buzon'
+ WHERE codigo_accion IS NULL AND accion LIKE 'Buzón de comentarios%';
+
+UPDATE logs SET codigo_accion = 'otro'
+ WHERE codigo_accion IS NULL;
+
+-- RSVP: el evento sale del registro
+UPDATE logs l
+  JOIN registros r ON r.id_registro = l.id_registro
+   SET l.id_evento = r.id_evento
+ WHERE l.codigo_accion = 'rsvp'
+   AND l.id_evento IS NULL;
+
+-- El actor se guardaba como correo; el buzón se queda anónimo
+UPDATE logs l
+  JOIN personas p ON p.correo = l.actor
+   SET l.id_actor = p.id_persona
+ WHERE l.id_actor IS NULL
+   AND l.codigo_accion <> 'buzon';
+
+# Los índices van después del relleno (una sola construcción)
+ALTER TABLE logs
+  ADD INDEX idx_logs_codigo_creado (codigo_accion, creado_en),
+  ADD INDEX idx_logs_ip_creado (ip, creado_en),
+  ADD INDEX idx_logs_actor_creado (id_actor, creado_en);
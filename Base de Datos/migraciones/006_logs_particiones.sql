@@ -0,0 +1,35 @@
+# ===============================================================
+# Migración 006: logs particionada por mes (retención)
+#   - La tabla sólo guarda los últimos LOGS_MESES_VIVOS meses; lo
+#     anterior se exporta a archivos .gz y se quita con DROP PARTITION
+#     (ver Backend/retencion_logs.py).
+#   - MySQL no permite llaves foráneas en tablas particionadas: se quitan
+#     las de logs (es bitácora; las columnas y sus índices se quedan).
+#   - La llave primaria tiene que incluir la columna de partición:
+#     (id_log, creado_en). id_log sigue siendo AUTO_INCREMENT y único.
+#   - creado_en pasa de TIMESTAMP a DATETIME (RANGE COLUMNS no acepta
+#     TIMESTAMP). El backend ya guarda UTC; con el servidor en UTC los
+#     valores no cambian.
+#
+#   Después de aplicarla, partir pmax en meses con:
+#     flask --app app logs-particiones
+#   y dejar ese comando + archivar-logs en un cron mensual.
+# ===============================================================
+
+USE Sistema_AGFI;
+
+ALTER TABLE logs
+  DROP FOREIGN KEY fk_logs_evento,
+  DROP FOREIGN KEY fk_logs_asistente,
+  DROP FOREIGN KEY fk_logs_registro,
+  DROP FOREIGN KEY fk_logs_invitado;
+
+ALTER TABLE logs
+  MODIFY creado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (id_log, creado_en);
+
+ALTER TABLE logs
+  PARTITION BY RANGE COLUMNS (creado_en) (
+    PARTITION pmax VALUES LESS THAN (MAXVALUE)
+  );
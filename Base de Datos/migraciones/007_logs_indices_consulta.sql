@@ -0,0 +1,20 @@
+# ===============================================================
+# Migración 007: índices para /admin/logs
+#   - La consulta pagina por keyset sobre (creado_en DESC, id_log DESC)
+#     y cada filtro usa un índice (<filtro>, creado_en, id_log): cada
+#     página es una búsqueda por rango, sin ordenar ni recorrer la tabla
+#     (ver Backend/consulta_logs.py).
+#   - idx_logs_evento / idx_logs_asistente (sólo la columna) se cambian
+#     por sus versiones con creado_en; codigo_accion, ip e id_actor ya
+#     quedaron así en la migración 005 (InnoDB agrega id_log al final).
+# ===============================================================
+
+USE Sistema_AGFI;
+
+ALTER TABLE logs
+  ADD INDEX idx_logs_creado (creado_en, id_log),
+  ADD INDEX idx_logs_evento_creado (id_evento, creado_en, id_log),
+  ADD INDEX idx_logs_asistente_creado (id_asistente, creado_en, id_log),
+  ADD INDEX idx_logs_correo_creado (actor, creado_en, id_log),
+  DROP INDEX idx_logs_evento,
+  DROP INDEX idx_logs_asistente;